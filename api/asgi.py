@@ -0,0 +1,314 @@
+"""ASGI entrypoint: the chat API on an event loop.
+
+The Flask app in `api.index` pins a worker for the whole multi-second turn,
+most of it spent waiting on OpenAI and Astra. Here each turn is a coroutine
+(`answer_question_async`), so one process holds as many chats in flight as
+the upstream APIs will take. Run it with any ASGI server:
+
+    pip install -r requirements-asgi.txt
+    uvicorn api.asgi:app --port 5328
+
+Same routes, payloads and failure shapes as the Flask app. The stream route
+runs the synchronous `stream_answer` on a worker thread and relays its
+events; a client that hangs up stops the generation. Written against the
+bare ASGI interface so it adds no framework to the serving bundle.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import uuid
+from contextlib import closing
+
+from pydantic import ValidationError
+
+from api import metrics
+from api.config import PREWARM
+from api.schema import VOICE_FAILURE, Query, failure_payload
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 64 * 1024
+
+# Ends of a relayed stream, as the worker thread reports them.
+_END, _FAILED, _GONE = object(), object(), object()
+
+
+async def _read_body(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise ValueError("request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _respond(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _query(receive, send, request_id: str) -> Query | None:
+    """The validated request body, or None once a 400 has been sent."""
+    try:
+        with metrics.stage("validate"):
+            raw = await _read_body(receive)
+            return Query.model_validate(json.loads(raw or b"{}"))
+    except (ValueError, ValidationError) as exc:
+        logger.warning("[%s] Invalid request: %s", request_id, exc)
+        details = (
+            exc.errors(include_url=False, include_context=False, include_input=False)
+            if isinstance(exc, ValidationError)
+            else str(exc)
+        )
+        await _respond(
+            send,
+            400,
+            {"error": "Invalid request", "details": details, "request_id": request_id},
+        )
+        metrics.finish_request("invalid")
+        return None
+
+
+async def _chat(receive, send) -> None:
+    request_id = uuid.uuid4().hex[:12]
+    metrics.start_request(request_id, "chat")
+    query = await _query(receive, send, request_id)
+    if query is None:
+        return
+
+    logger.info("[%s] Question: %.120s", request_id, query.prompt)
+
+    try:
+        from api.routes.chat import answer_question_async
+
+        payload = await answer_question_async(
+            query.prompt, [turn.model_dump() for turn in query.history]
+        )
+    except Exception:
+        logger.exception("[%s] Failed to answer", request_id)
+        await _respond(send, 500, failure_payload(request_id))
+        metrics.finish_request("error")
+        return
+
+    metrics.finish_request("ok")
+    logger.info(
+        "[%s] Answered with %d source(s), %d term(s)",
+        request_id,
+        len(payload["sources"]),
+        len(payload["terms"]),
+    )
+    payload["request_id"] = request_id
+    await _respond(send, 200, payload)
+
+
+def _sse(event: str, data) -> bytes:
+    text = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return text.encode("utf-8")
+
+
+async def _chat_stream(receive, send) -> None:
+    """`/chat` as Server-Sent Events; the same events as the Flask route."""
+    request_id = uuid.uuid4().hex[:12]
+    metrics.start_request(request_id, "chat_stream")
+    query = await _query(receive, send, request_id)
+    if query is None:
+        return
+
+    logger.info("[%s] Question (stream): %.120s", request_id, query.prompt)
+    history = [turn.model_dump() for turn in query.history]
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def relay() -> None:
+        # One thread for the whole generator; to_thread gives it a copy of
+        # this context, so its stages land in the request's trace.
+        end = _END
+        try:
+            from api.routes.chat import stream_answer
+
+            with closing(stream_answer(query.prompt, history)) as stream:
+                for item in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(events.put_nowait, item)
+        except Exception:
+            logger.exception("[%s] Failed to answer", request_id)
+            end = _FAILED
+        loop.call_soon_threadsafe(events.put_nowait, end)
+
+    async def watch() -> None:
+        # The body is read, so the next message is the client hanging up.
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        stop.set()
+        events.put_nowait(_GONE)
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    watcher = asyncio.create_task(watch())
+    worker = asyncio.create_task(asyncio.to_thread(relay))
+    counts = {}
+    try:
+        while True:
+            item = await events.get()
+            if item is _GONE:
+                logger.info("[%s] Client disconnected", request_id)
+                metrics.finish_request("disconnected")
+                return
+            if item is _FAILED:
+                failure = {
+                    "answer": VOICE_FAILURE,
+                    "error": "Answer generation failed",
+                    "request_id": request_id,
+                }
+                await send(
+                    {"type": "http.response.body", "body": _sse("error", failure)}
+                )
+                metrics.finish_request("error")
+                break
+            if item is _END:
+                metrics.finish_request("ok")
+                logger.info(
+                    "[%s] Streamed with %d source(s), %d term(s)",
+                    request_id,
+                    counts.get("sources", 0),
+                    counts.get("terms", 0),
+                )
+                done = _sse("done", {"request_id": request_id})
+                await send({"type": "http.response.body", "body": done})
+                break
+            event, data = item
+            if isinstance(data, list):
+                counts[event] = len(data)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": _sse(event, data),
+                    "more_body": True,
+                }
+            )
+    finally:
+        stop.set()
+        watcher.cancel()
+        await worker
+
+
+async def _metrics(send) -> None:
+    body = metrics.render().encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", metrics.CONTENT_TYPE.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _health(send) -> None:
+    try:
+        from api.config import (
+            COLLECTION_NAME,
+            embedding_cache_stats,
+            get_answer_cache,
+        )
+        from api.warmup import probe_index
+
+        has_documents = await asyncio.to_thread(probe_index)
+        cache = get_answer_cache()
+        await _respond(
+            send,
+            200,
+            {
+                "status": "ok",
+                "collection": COLLECTION_NAME,
+                "index_reachable": True,
+                "index_has_documents": has_documents,
+                "answer_cache": cache.stats() if cache else None,
+                "embedding_cache": embedding_cache_stats(),
+            },
+        )
+    except Exception as exc:
+        logger.exception("Health check failed")
+        await _respond(send, 500, {"status": "error", "details": str(exc)})
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if PREWARM:
+                    from api.warmup import prewarm
+
+                    await asyncio.to_thread(prewarm)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    # Both prefixes, as in the Flask app.
+    path = scope["path"].removeprefix("/api")
+    method = scope["method"]
+    if path == "/chat" and method == "POST":
+        await _chat(receive, send)
+    elif path == "/chat/stream" and method == "POST":
+        await _chat_stream(receive, send)
+    elif path == "/health" and method == "GET":
+        await _health(send)
+    elif path == "/metrics" and method == "GET":
+        await _metrics(send)
+    elif path in ("/chat", "/chat/stream", "/health", "/metrics"):
+        await _respond(
+            send,
+            405,
+            {
+                "error": "Method not allowed",
+                "details": f"{method} is not allowed for {scope['path']}",
+            },
+        )
+    else:
+        await _respond(send, 404, {"error": "Not found", "path": scope["path"]})
@@ -0,0 +1,231 @@
+"""Prompt token budget for a chat turn.
+
+A turn sends SYSTEM_PROMPT, up to six turns of history and every retrieved
+passage, whole. Nothing bounds that. A `--no-llm` corpus chunk or a long
+Wikipedia passage runs to 900 tokens on its own, and input tokens are both
+the bill and most of the model's time to first token. `_compose` now fits
+the turn into PROMPT_TOKEN_BUDGET, in this order:
+
+    system + question   sent as they are, always
+    history             the last HISTORY_VERBATIM_TURNS verbatim, older
+                        turns summarized into one line each, all within
+                        HISTORY_TOKENS
+    passages            what is left, best-ranked first: each capped at
+                        PASSAGE_TOKENS, cut at a sentence boundary; one
+                        that no longer fits is truncated if at least
+                        MIN_PASSAGE_TOKENS of it would go in, else skipped
+
+The history summary is extractive, with no extra model call on the request
+path. For an old question it keeps the first sentence; for an old answer it
+keeps the first sentence of the answer itself. That is the gist, which is
+all a follow-up question leans on.
+
+Tokens are counted with tiktoken for CHAT_MODEL, and estimated at four
+UTF-8 bytes each until its encoding is loaded. Loading it may download the
+vocabulary, with no timeout, so a chat turn never waits for it: the first
+request starts the load in a background thread, and `prewarm` loads it at
+startup. Ingestion asks with `wait=True`. If the encoding cannot be loaded
+(offline, and not under TIKTOKEN_CACHE_DIR), estimates stay. Exact counts of
+repeated texts, such as SYSTEM_PROMPT and popular passages, are cached.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable
+
+from api.config import (
+    CHAT_MODEL,
+    HISTORY_TOKENS,
+    HISTORY_VERBATIM_TURNS,
+    PASSAGE_TOKENS,
+    PROMPT_TOKEN_BUDGET,
+)
+
+logger = logging.getLogger(__name__)
+
+MIN_PASSAGE_TOKENS = 60
+# Per old turn in the history summary.
+SUMMARY_TOKENS = 40
+ELLIPSIS = " …"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+@lru_cache(maxsize=4)
+def _load(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        # Cached, so an offline machine does not retry the download per call.
+        logger.warning("No tokenizer for %s (%s); estimating", model, exc)
+        return None
+
+
+_loaded: dict[str, Any] = {}
+_loading: set[str] = set()
+_lock = threading.Lock()
+
+
+def _load_into(model: str) -> Any:
+    tokenizer = _load(model)
+    _loaded[model] = tokenizer
+    return tokenizer
+
+
+def encoding(model: str, wait: bool = False):
+    """tiktoken's encoding for `model`, or None while unavailable.
+
+    Without `wait`, an encoding not loaded yet is loaded in the background
+    and None is returned meanwhile.
+    """
+    if model in _loaded:
+        return _loaded[model]
+    if wait:
+        return _load_into(model)
+    with _lock:
+        if model in _loading:
+            return None
+        _loading.add(model)
+    threading.Thread(target=_load_into, args=(model,), daemon=True).start()
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _exact(text: str, model: str) -> int:
+    return len(_loaded[model].encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str, model: str = CHAT_MODEL, wait: bool = False) -> int:
+    """Tokens of `text` for `model`; about four UTF-8 bytes each without tiktoken."""
+    if encoding(model, wait) is None:
+        return len(text.encode("utf-8")) // 4
+    return _exact(text, model)
+
+
+def truncate(text: str, tokens: int, model: str = CHAT_MODEL) -> str:
+    """`text` cut to about `tokens`, at a sentence end where one is near."""
+    tokenizer = encoding(model)
+    if count_tokens(text, model) <= tokens:
+        return text
+    if tokenizer is None:
+        cut = text.encode("utf-8")[: max(tokens, 0) * 4].decode("utf-8", "ignore")
+    else:
+        ids = tokenizer.encode(text, disallowed_special=())
+        cut = tokenizer.decode(ids[: max(tokens - 1, 0)])
+    ends = [match.start() for match in _SENTENCE_END.finditer(cut)]
+    # Back off to a sentence end only when that keeps most of the cut.
+    if ends and ends[-1] >= len(cut) // 2:
+        return cut[: ends[-1]].rstrip() + ELLIPSIS
+    return cut.rsplit(" ", 1)[0].rstrip() + ELLIPSIS
+
+
+def first_sentence(text: str, tokens: int = SUMMARY_TOKENS) -> str:
+    text = " ".join(text.split())
+    head = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return truncate(head, tokens)
+
+
+@dataclass
+class Usage:
+    """Where a turn's prompt tokens went, for the request's log line."""
+
+    parts: dict[str, int] = field(default_factory=dict)
+    passages: int = 0
+    truncated: int = 0
+    dropped: int = 0
+    summarized: int = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.parts.values())
+
+    def describe(self) -> str:
+        parts = " ".join(f"{name}={count}" for name, count in self.parts.items())
+        return (
+            f"{self.total} ({parts}; {self.passages} passages, "
+            f"{self.truncated} truncated, {self.dropped} dropped, "
+            f"{self.summarized} turns summarized)"
+        )
+
+
+def fit_history(
+    turns: list[tuple[str, str]],
+    usage: Usage,
+    verbatim: int = HISTORY_VERBATIM_TURNS,
+    budget: int = HISTORY_TOKENS,
+) -> list[tuple[str, str]]:
+    """Recent turns as they are, older ones summarized, within `budget`."""
+    older, recent = turns[: max(len(turns) - verbatim, 0)], turns[-verbatim:]
+    if verbatim <= 0:
+        older, recent = turns, []
+
+    messages: list[tuple[str, str]] = []
+    if older:
+        lines = [
+            f"- {'You said' if role == 'assistant' else 'Asked'}: "
+            f"{first_sentence(content)}"
+            for role, content in older
+        ]
+        summary = "Earlier in this conversation:\n" + "\n".join(lines)
+        messages.append(("system", summary))
+        usage.summarized = len(older)
+
+    spent = sum(count_tokens(content) for _, content in messages)
+    # Newest first, so a long pasted turn squeezes the older ones, not itself.
+    kept: list[tuple[str, str]] = []
+    for role, content in reversed(recent):
+        room = budget - spent
+        if room < MIN_PASSAGE_TOKENS:
+            break
+        content = truncate(content, room)
+        spent += count_tokens(content)
+        kept.append((role, content))
+    usage.parts["history"] = spent
+    return messages + kept[::-1]
+
+
+def fit_passages(
+    documents: list,
+    budget: int,
+    header: Callable[[int, Any], str],
+    usage: Usage,
+    per_passage: int = PASSAGE_TOKENS,
+) -> list:
+    """The passages that fit `budget`, in rank order, long ones truncated.
+
+    `header(n, document)` is the label the n-th passage is sent under; its
+    tokens count against the budget too. Truncated passages are copies, so
+    the retrieved documents are never changed.
+    """
+    kept, spent = [], 0
+    for document in documents:
+        head = count_tokens(header(len(kept) + 1, document)) + 1
+        room = min(per_passage, budget - spent - head)
+        if room < MIN_PASSAGE_TOKENS:
+            usage.dropped += 1
+            continue
+        content = document.page_content or ""
+        if count_tokens(content) > room:
+            content = truncate(content, room)
+            document = document.model_copy(update={"page_content": content})
+            usage.truncated += 1
+        spent += head + count_tokens(content)
+        kept.append(document)
+    usage.parts["passages"] = spent
+    usage.passages = len(kept)
+    return kept
+
+
+def passage_budget(usage: Usage, budget: int = PROMPT_TOKEN_BUDGET) -> int:
+    """Tokens left for passages once everything else is counted."""
+    return budget - usage.total
@@ -0,0 +1,240 @@
+"""Answer cache for the serving path.
+
+Traffic is dominated by a handful of questions — the starters, and the first
+thing everyone asks about ọjị or Nri — and each one otherwise costs an
+embedding, a vector search and a full generation. A hit here skips all three.
+
+Keys are the normalized prompt, namespaced by chat model and collection so a
+persisted cache cannot serve answers composed against a different corpus.
+Entries expire after a TTL and the store is LRU-bounded.
+
+Two backends share one interface: an in-process dict (per warm function
+instance) and a local SQLite file (survives restarts; shareable between
+workers on one host). Optionally, a miss on the exact key falls back to the
+nearest cached question by embedding similarity, for near-duplicates like
+"what is oji" / "what is ọjị?".
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Sequence
+
+logger = logging.getLogger(__name__)
+
+_TRAILING = re.compile(r"[\s?!.…]+$")
+
+
+def normalize_prompt(text: str) -> str:
+    """Canonical form of a question for cache lookups.
+
+    Diacritics are kept — in Igbo they distinguish words — but case,
+    whitespace and closing punctuation are not meaningful.
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = " ".join(text.split())
+    return _TRAILING.sub("", text)
+
+
+def _unit(vector: Sequence[float]):
+    import numpy as np
+
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+
+class MemoryBackend:
+    """LRU + TTL over an OrderedDict, local to this process."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires_at, value, unit vector or None)
+        self._items: OrderedDict[str, tuple[float, str, Any]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: str, vector: Any = None) -> None:
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, value, vector)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def vectors(self) -> list[tuple[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                (key, vector)
+                for key, (expires, _value, vector) in self._items.items()
+                if vector is not None and expires >= now
+            ]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SQLiteBackend:
+    """LRU + TTL in a local SQLite file, so a restart keeps its answers."""
+
+    def __init__(self, path: str | Path, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " vector BLOB,"
+            " expires REAL NOT NULL,"
+            " used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_used ON answers (used)")
+        self._db.commit()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE answers SET used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, vector: Any = None) -> None:
+        now = time.time()
+        blob = vector.tobytes() if vector is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, value, vector, expires, used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, blob, now + self.ttl, now),
+            )
+            self._db.execute("DELETE FROM answers WHERE expires < ?", (now,))
+            self._db.execute(
+                "DELETE FROM answers WHERE key IN ("
+                " SELECT key FROM answers ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def vectors(self) -> list[tuple[str, Any]]:
+        import numpy as np
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, vector FROM answers"
+                " WHERE vector IS NOT NULL AND expires >= ?",
+                (time.time(),),
+            ).fetchall()
+        return [(key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """Exact-then-semantic lookup over a backend, with hit/miss counters.
+
+    `similarity` is the cosine threshold for a near-duplicate hit; 0 turns
+    the semantic fallback off, and then no embedding is ever needed here.
+    """
+
+    def __init__(
+        self,
+        backend: MemoryBackend | SQLiteBackend,
+        namespace: str,
+        similarity: float = 0.0,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.similarity = similarity
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity > 0
+
+    def _key(self, prompt: str) -> str:
+        text = f"{self.namespace}\n{normalize_prompt(prompt)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def _nearest(self, vector: Sequence[float]) -> str | None:
+        import numpy as np
+
+        candidates = self.backend.vectors()
+        if not candidates:
+            return None
+        keys = [key for key, _ in candidates]
+        matrix = np.stack([v for _, v in candidates])
+        scores = matrix @ _unit(vector)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return keys[best]
+
+    def get(self, prompt: str, vector: Sequence[float] | None = None) -> dict | None:
+        value = self.backend.get(self._key(prompt))
+        if value is None and vector is not None and self.semantic:
+            key = self._nearest(vector)
+            value = self.backend.get(key) if key else None
+            if value is not None:
+                self.semantic_hits += 1
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Decoded fresh on every hit: callers decorate the payload they get
+        # back, and that must never leak into the stored entry.
+        return json.loads(value)
+
+    def set(
+        self, prompt: str, payload: dict, vector: Sequence[float] | None = None
+    ) -> None:
+        unit = _unit(vector) if vector is not None and self.semantic else None
+        self.backend.set(
+            self._key(prompt), json.dumps(payload, ensure_ascii=False), unit
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -11,14 +11,16 @@ Flask app cannot even start to report a configuration error.
 
 from __future__ import annotations
 
+import logging
 import os
 from functools import lru_cache
 
 from dotenv import load_dotenv
-from pydantic import SecretStr
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class ConfigError(RuntimeError):
     """A required environment variable is missing."""
@@ -49,22 +51,137 @@ EXTRACTION_MODEL = os.environ.get("OPENAI_EXTRACTION_MODEL", "gpt-4o-mini")
 COLLECTION_NAME = os.environ.get("ASTRA_DB_COLLECTION_NAME", "igbo_corpus")
 RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "8"))
 
+# "astra", or "local" for the in-process index in `api.localstore`, read from
+# LOCAL_INDEX_DIR/<collection>. Local removes the network from retrieval.
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "astra").lower()
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "index")
+# "ivf" for approximate search over the local index (see `api.ivf`). IVF_NLIST
+# is fixed at build time (0 picks ~4·√n); IVF_NPROBE is the per-query recall
+# knob and can be changed without rebuilding.
+LOCAL_INDEX_ANN = os.environ.get("LOCAL_INDEX_ANN", "").lower()
+IVF_NLIST = int(os.environ.get("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+# Maximal marginal relevance over a pool of RETRIEVAL_FETCH_K candidates,
+# at most MAX_PER_SOURCE passages per work (see `api.diversify`). MMR_LAMBDA
+# is 1 for pure relevance, lower for more diversity. "off" is plain top k.
+RETRIEVAL_DIVERSITY = os.environ.get("RETRIEVAL_DIVERSITY", "on").lower() != "off"
+RETRIEVAL_FETCH_K = int(os.environ.get("RETRIEVAL_FETCH_K", str(4 * RETRIEVAL_K)))
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.7"))
+MAX_PER_SOURCE = int(os.environ.get("MAX_PER_SOURCE", "2"))
+# Fuse BM25 results into retrieval when ingestion has built a lexical index
+# (see `api.lexical`), whichever vector backend is in use.
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "on").lower() != "off"
+
+# The most input tokens one chat turn may send (see `api.budget`): history
+# gets up to HISTORY_TOKENS, with all but the last HISTORY_VERBATIM_TURNS
+# summarized; passages get the rest, each capped at PASSAGE_TOKENS.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "3000"))
+HISTORY_TOKENS = int(os.environ.get("HISTORY_TOKENS", "600"))
+HISTORY_VERBATIM_TURNS = int(os.environ.get("HISTORY_VERBATIM_TURNS", "2"))
+PASSAGE_TOKENS = int(os.environ.get("PASSAGE_TOKENS", "400"))
+
+# Query vectors, remembered so retries and repeat questions never re-embed.
+# Set EMBEDDING_CACHE_PATH to persist them across restarts.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+
+# --- Startup ----------------------------------------------------------------
+
+# "on" builds every client and opens the upstream connections while the
+# instance starts, instead of on its first request (see `api.warmup`).
+PREWARM = os.environ.get("PREWARM", "off").lower() == "on"
+
+# --- Answer cache -----------------------------------------------------------
+
+# "memory" (per warm instance), "sqlite" (a local file), or "off".
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "memory").lower()
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", ".cache/answers.sqlite3")
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", str(24 * 3600)))
+# Cosine similarity above which a near-duplicate question reuses a cached
+# answer. 0 disables the semantic fallback, leaving exact-match only.
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0"))
+
 
 @lru_cache(maxsize=1)
-def get_embeddings():
+def openai_http_client():
+    """One connection pool for the chat and embedding clients.
+
+    Left to themselves they each open their own, so a cold instance pays for
+    two TLS handshakes to the same host, and warming one does not warm the
+    other.
+    """
+    import openai
+
+    return openai.DefaultHttpxClient()
+
+
+def _openai_embeddings(max_retries: int = 2):
     from langchain_openai import OpenAIEmbeddings
+    from pydantic import SecretStr
 
     return OpenAIEmbeddings(
         api_key=SecretStr(_required("OPENAI_API_KEY")),
         model=EMBEDDING_MODEL,
         dimensions=EMBEDDING_DIMENSIONS,
+        max_retries=max_retries,
+        http_client=openai_http_client(),
+        # The client would otherwise tokenize every input with tiktoken to
+        # split texts past the model's 8k-token window, and tiktoken fetches
+        # its vocabulary over the network on a cold instance. Questions are
+        # capped at 2000 characters and passages are smaller still.
+        check_embedding_ctx_length=False,
     )
 
 
-@lru_cache(maxsize=2)
-def get_vector_store(collection_name: str | None = None, create: bool = False):
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """OpenAI embeddings behind a query-vector cache (see `api.embeddings`).
+
+    The OpenAI client itself is only built on the first cache miss.
+    """
+    from api.embeddings import CachedEmbeddings
+
+    return CachedEmbeddings(
+        _openai_embeddings,
+        namespace=f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}",
+        max_entries=EMBEDDING_CACHE_SIZE,
+        path=EMBEDDING_CACHE_PATH or None,
+    )
+
+
+def embedding_cache_stats() -> dict | None:
+    """The query-embedding cache's counters, once a request has used it.
+
+    Never builds the cache, so a health check on a cold instance imports
+    neither NumPy nor LangChain.
+    """
+    if not get_embeddings.cache_info().currsize:
+        return None
+    embeddings = get_embeddings()
+    return embeddings.stats() if embeddings.built else None
+
+
+@lru_cache(maxsize=1)
+def get_ingest_embeddings():
+    """Document embeddings for ingestion's limiter: the client never retries,
+    so every 429 reaches the limiter. No query cache; `EmbeddingStore` keeps
+    the vectors.
+    """
+    return _openai_embeddings(max_retries=0)
+
+
+@lru_cache(maxsize=4)
+def get_vector_store(
+    collection_name: str | None = None,
+    create: bool = False,
+    backend: str | None = None,
+):
     """The corpus vector store.
 
+    `backend` overrides VECTOR_BACKEND; ingestion uses it to export to a
+    local index without touching the environment.
+
     `create` must stay False on the serving path. AstraDBVectorStore's default
     setup mode issues a create_collection on every init, which is wrong here in
     two ways: it is a write call on a read path (it costs a round trip on every
@@ -73,12 +190,39 @@ def get_vector_store(collection_name: str | None = None, create: bool = False):
     turning a misconfiguration into "no sources" instead of a loud error.
 
     Ingestion passes create=True, because that is where the collection should
-    come into existence.
+    come into existence. The same holds for a local index: serving refuses to
+    start without one, ingestion starts an empty one.
     """
+    backend = (backend or VECTOR_BACKEND).lower()
+    if backend == "local":
+        from api.localstore import LocalVectorStore
+
+        path = local_index_path(collection_name)
+        opener = LocalVectorStore.open if create else LocalVectorStore.load
+        return opener(
+            path,
+            get_embeddings(),
+            EMBEDDING_MODEL,
+            EMBEDDING_DIMENSIONS,
+            ann=LOCAL_INDEX_ANN,
+            nlist=IVF_NLIST,
+            nprobe=IVF_NPROBE,
+        )
+    if backend != "astra":
+        raise ConfigError(f"VECTOR_BACKEND must be astra or local, not {backend!r}.")
+
     from langchain_astradb import AstraDBVectorStore
     from langchain_astradb.utils.astradb import SetupMode
 
-    return AstraDBVectorStore(
+    class KnownDimensionStore(AstraDBVectorStore):
+        # Without this, the store embeds a sample sentence in its constructor
+        # to learn the vector width, costing every cold start an OpenAI round
+        # trip. The width is configured; tell it.
+        def _prepare_embedding_dimension(self, setup_mode):
+            self.embedding_dimension = EMBEDDING_DIMENSIONS
+            return super()._prepare_embedding_dimension(setup_mode)
+
+    return KnownDimensionStore(
         collection_name=collection_name or COLLECTION_NAME,
         embedding=get_embeddings(),
         token=_required("ASTRA_DB_APPLICATION_TOKEN"),
@@ -88,13 +232,67 @@ def get_vector_store(collection_name: str | None = None, create: bool = False):
     )
 
 
+def local_index_path(collection_name: str | None = None):
+    from pathlib import Path
+
+    return Path(LOCAL_INDEX_DIR) / (collection_name or COLLECTION_NAME)
+
+
 @lru_cache(maxsize=2)
-def get_chat_model(model: str | None = None, temperature: float = 0.4):
+def get_lexical_index(collection_name: str | None = None):
+    """The BM25 index for hybrid retrieval, or None if off, unbuilt or unreadable."""
+    from api.lexical import LexicalIndex
+
+    path = local_index_path(collection_name)
+    if not HYBRID_RETRIEVAL or not (path / "bm25.json").exists():
+        return None
+    try:
+        return LexicalIndex.load(path)
+    except Exception:
+        # Cached, so a damaged index is reported once rather than per request.
+        logger.exception("BM25 index at %s failed to load; vector search only", path)
+        return None
+
+
+@lru_cache(maxsize=4)
+def get_chat_model(
+    model: str | None = None,
+    temperature: float = 0.4,
+    max_retries: int | None = None,
+):
+    """A chat client; `max_retries=0` leaves 429s to the caller's own limiter."""
     from langchain_openai import ChatOpenAI
+    from pydantic import SecretStr
 
     return ChatOpenAI(
         api_key=SecretStr(_required("OPENAI_API_KEY")),
         model=model or CHAT_MODEL,
         temperature=temperature,
+        max_retries=max_retries,
+        http_client=openai_http_client(),
+        # Token counts on streamed responses too, for the metrics.
+        stream_usage=True,
         model_kwargs={"response_format": {"type": "json_object"}},
     )
+
+
+@lru_cache(maxsize=1)
+def get_answer_cache():
+    """The answer cache, or None when ANSWER_CACHE=off."""
+    from api.cache import AnswerCache, MemoryBackend, SQLiteBackend
+
+    if ANSWER_CACHE == "off":
+        return None
+    if ANSWER_CACHE == "sqlite":
+        backend = SQLiteBackend(ANSWER_CACHE_PATH, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+    elif ANSWER_CACHE == "memory":
+        backend = MemoryBackend(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+    else:
+        raise ConfigError(
+            f"ANSWER_CACHE must be memory, sqlite or off, not {ANSWER_CACHE!r}."
+        )
+    return AnswerCache(
+        backend,
+        namespace=f"{CHAT_MODEL}:{COLLECTION_NAME}",
+        similarity=ANSWER_CACHE_SIMILARITY,
+    )
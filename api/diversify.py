@@ -0,0 +1,121 @@
+"""Diverse retrieval: maximal marginal relevance with a per-source cap.
+
+The plain top k by similarity often holds three or four chunks of the same
+work, each saying much the same thing. All of them are paid for in the
+prompt, and then `_sources_from` folds them into one source anyway.
+`retrieve()` instead searches once for a pool of RETRIEVAL_FETCH_K
+candidates, with their stored vectors, and picks k from it here:
+
+    score(d) = λ · sim(q, d) − (1 − λ) · max over chosen c of sim(d, c)
+
+It takes the best-scoring candidate each step, with λ = MMR_LAMBDA. A work
+that already fills MAX_PER_SOURCE slots drops out of the pool. So does a
+candidate at or above MMR_DUPLICATE cosine similarity to a chosen passage:
+it would add tokens and nothing else, so the prompt is left shorter rather
+than padded with it.
+
+The pool is at most a few dozen vectors, so the whole selection is one
+(n, n) similarity matrix and k vectorized argmax steps: microseconds, with
+no extra round trip to the store.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+
+from api.config import MAX_PER_SOURCE, MMR_LAMBDA
+
+# Cosine similarity at which a candidate counts as a copy of a chosen passage.
+MMR_DUPLICATE = 0.95
+
+
+def source_of(document: Any) -> str:
+    """The work a passage comes from, for the per-source cap."""
+    metadata = document.metadata or {}
+    for key in ("work", "source_url", "source"):
+        if metadata.get(key):
+            return str(metadata[key])
+    return document.page_content
+
+
+def mmr(
+    query: Sequence[float],
+    vectors: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    sources: Sequence[str] | None = None,
+    per_source: int = MAX_PER_SOURCE,
+    duplicate: float = MMR_DUPLICATE,
+) -> list[int]:
+    """Indices into `vectors` of up to k diverse, relevant picks, in order.
+
+    `per_source` <= 0 lifts the cap; `duplicate` >= 1 keeps near-copies.
+    """
+    matrix = np.array(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or not len(matrix) or k <= 0:
+        return []
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    target = np.array(query, dtype=np.float32)
+    target /= max(float(np.linalg.norm(target)), 1e-12)
+
+    relevance = matrix @ target
+    similarity = matrix @ matrix.T
+    redundancy = np.zeros(len(matrix), dtype=np.float32)
+    available = np.ones(len(matrix), dtype=bool)
+    if sources is not None:
+        ids: dict[str, int] = {}
+        labels = np.array([ids.setdefault(s, len(ids)) for s in sources])
+        counts = np.zeros(len(ids), dtype=np.int64)
+
+    chosen: list[int] = []
+    while len(chosen) < k and available.any():
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        pick = int(np.argmax(np.where(available, score, -np.inf)))
+        chosen.append(pick)
+        available[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick])
+        available &= similarity[pick] < duplicate
+        if sources is not None and per_source > 0:
+            counts[labels[pick]] += 1
+            if counts[labels[pick]] >= per_source:
+                available &= labels != labels[pick]
+    return chosen
+
+
+def diversify(
+    query: Sequence[float],
+    candidates: list[tuple[Any, Sequence[float]]],
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    per_source: int = MAX_PER_SOURCE,
+) -> list:
+    """Documents chosen by `mmr` from (document, vector) search results."""
+    if not candidates:
+        return []
+    documents = [document for document, _ in candidates]
+    picks = mmr(
+        query,
+        [vector for _, vector in candidates],
+        k,
+        lambda_mult,
+        [source_of(document) for document in documents],
+        per_source,
+    )
+    return [documents[i] for i in picks]
+
+
+def cap_per_source(documents: list, per_source: int, k: int) -> list:
+    """The first k documents, with at most `per_source` from any one work."""
+    if per_source <= 0:
+        return documents[:k]
+    kept, counts = [], {}
+    for document in documents:
+        source = source_of(document)
+        if counts.get(source, 0) < per_source:
+            counts[source] = counts.get(source, 0) + 1
+            kept.append(document)
+            if len(kept) == k:
+                break
+    return kept
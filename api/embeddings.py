@@ -0,0 +1,166 @@
+"""Query-embedding cache around the OpenAI embeddings client.
+
+Every retrieval used to embed the question again — on every request and on
+every retry of a flaky Data API call. `CachedEmbeddings` wraps the real client
+and remembers query vectors by normalized text, as float32, in a bounded LRU;
+with a path it also persists them to a local SQLite file, so a restarted
+instance starts warm.
+
+Only `embed_query` is cached. `embed_documents` is ingestion's business and
+passes straight through.
+
+The wrapped client can be given as a factory instead, built on the first
+miss. Importing the OpenAI client stack costs over a second; a cold instance
+answering from cache, or serving `/api/health`, never has to pay it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from api.cache import normalize_prompt
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        inner: Embeddings | Callable[[], Embeddings],
+        namespace: str,
+        max_entries: int = 2048,
+        path: str | Path | None = None,
+    ):
+        if isinstance(inner, Embeddings):
+            self._inner, self._factory = inner, None
+        else:
+            self._inner, self._factory = None, inner
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        # Wall time spent on misses, so a hit can be credited the average.
+        self.miss_seconds = 0.0
+
+    @property
+    def inner(self) -> Embeddings:
+        if self._inner is None:
+            with self._lock:
+                if self._inner is None:
+                    self._inner = self._factory()
+        return self._inner
+
+    @property
+    def built(self) -> bool:
+        return self._inner is not None
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.namespace}\n{normalize_prompt(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _lookup(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is not None:
+                self._items.move_to_end(key)
+                return vector
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE embeddings SET used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            return vector
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._items[key] = vector
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def _store(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, used)"
+                " VALUES (?, ?, ?)",
+                (key, vector.tobytes(), time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector.tolist()
+
+        started = time.perf_counter()
+        computed = self.inner.embed_query(text)
+        self.miss_seconds += time.perf_counter() - started
+        self.misses += 1
+        self._store(key, np.asarray(computed, dtype=np.float32))
+        return computed
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector.tolist()
+
+        started = time.perf_counter()
+        computed = await self.inner.aembed_query(text)
+        self.miss_seconds += time.perf_counter() - started
+        self.misses += 1
+        self._store(key, np.asarray(computed, dtype=np.float32))
+        return computed
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inner.embed_documents(texts)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        mean_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "entries": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "mean_embed_ms": round(mean_miss * 1000, 1),
+            "saved_seconds": round(self.hits * mean_miss, 3),
+        }
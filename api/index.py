@@ -1,13 +1,24 @@
-"""Flask entrypoint for the Achalugo RAG API."""
+"""Flask entrypoint for the Achalugo RAG API.
+
+Module-level imports are kept to what every route needs: this module is the
+serverless function's cold start. Validation (pydantic) loads on the first
+chat request and the LangChain stack only when a route actually calls a
+model or a store. Set PREWARM=on to pay for all of it at startup instead
+(see `api.warmup`).
+"""
 
 from __future__ import annotations
 
+import json
 import logging
 import sys
 import uuid
+from contextlib import closing
+
+from flask import Flask, Response, jsonify, request, stream_with_context
 
-from flask import Flask, jsonify, request
-from pydantic import BaseModel, Field, ValidationError, field_validator
+from api import metrics
+from api.config import PREWARM
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,37 +29,15 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# In-character failure text, mirroring the client's own fallback so a server
-# error still reads as Achalugo rather than as an error page.
-VOICE_FAILURE = (
-    "Forgive me, nwa m — my voice did not carry just then. "
-    "Juo’m ajuju ọzọ, ask me again."
-)
-
-
-class Turn(BaseModel):
-    role: str
-    content: str
-
 
-class Query(BaseModel):
-    prompt: str = Field(min_length=1, max_length=2000)
-    history: list[Turn] = Field(default_factory=list)
+def _validate(request_id: str):
+    """The parsed query, or a 400 response to return instead."""
+    from pydantic import ValidationError
 
-    @field_validator("prompt")
-    @classmethod
-    def _not_blank(cls, value: str) -> str:
-        stripped = value.strip()
-        if not stripped:
-            raise ValueError("prompt must not be blank")
-        return stripped
-
-
-def _handle_chat():
-    request_id = uuid.uuid4().hex[:12]
+    from api.schema import Query
 
     try:
-        query = Query.model_validate(request.get_json(silent=True) or {})
+        return Query.model_validate(request.get_json(silent=True) or {}), None
     except ValidationError as exc:
         logger.warning("[%s] Invalid request: %s", request_id, exc)
         # include_context=False matters: a custom validator's ctx carries the
@@ -57,7 +46,7 @@ def _handle_chat():
         details = exc.errors(
             include_url=False, include_context=False, include_input=False
         )
-        return (
+        return None, (
             jsonify(
                 {
                     "error": "Invalid request",
@@ -68,6 +57,17 @@ def _handle_chat():
             400,
         )
 
+
+def _handle_chat():
+    request_id = uuid.uuid4().hex[:12]
+    metrics.start_request(request_id, "chat")
+
+    with metrics.stage("validate"):
+        query, invalid = _validate(request_id)
+    if invalid is not None:
+        metrics.finish_request("invalid")
+        return invalid
+
     logger.info("[%s] Question: %.120s", request_id, query.prompt)
 
     try:
@@ -80,22 +80,13 @@ def _handle_chat():
             [turn.model_dump() for turn in query.history],
         )
     except Exception:
+        from api.schema import failure_payload
+
         logger.exception("[%s] Failed to answer", request_id)
-        return (
-            jsonify(
-                {
-                    "answer": VOICE_FAILURE,
-                    "detail": "",
-                    "terms": [],
-                    "sources": [],
-                    "followups": [],
-                    "error": "Answer generation failed",
-                    "request_id": request_id,
-                }
-            ),
-            500,
-        )
+        metrics.finish_request("error")
+        return jsonify(failure_payload(request_id)), 500
 
+    metrics.finish_request("ok")
     logger.info(
         "[%s] Answered with %d source(s), %d term(s)",
         request_id,
@@ -106,10 +97,89 @@ def _handle_chat():
     return jsonify(payload)
 
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _handle_chat_stream():
+    """`/api/chat` as Server-Sent Events, for time to first token.
+
+    Events: `sources` (provisional after retrieval, final at the end),
+    `answer` and `detail` (text deltas), `terms`, `followups`, then `done`
+    carrying the request_id — or `error` carrying the in-character failure
+    answer, in which case nothing else follows.
+    """
+    request_id = uuid.uuid4().hex[:12]
+    metrics.start_request(request_id, "chat_stream")
+
+    with metrics.stage("validate"):
+        query, invalid = _validate(request_id)
+    if invalid is not None:
+        metrics.finish_request("invalid")
+        return invalid
+
+    logger.info("[%s] Question (stream): %.120s", request_id, query.prompt)
+    history = [turn.model_dump() for turn in query.history]
+
+    def events():
+        # Runs after the view has returned, but on the same worker and
+        # context, so the trace begun above is still the current one.
+        counts = {}
+        try:
+            from api.routes.chat import stream_answer
+
+            with closing(stream_answer(query.prompt, history)) as stream:
+                for event, data in stream:
+                    if isinstance(data, list):
+                        counts[event] = len(data)
+                    yield _sse(event, data)
+        except GeneratorExit:
+            # The client hung up; closing the stream stops the generation.
+            logger.info("[%s] Client disconnected", request_id)
+            metrics.finish_request("disconnected")
+            raise
+        except Exception:
+            from api.schema import VOICE_FAILURE
+
+            logger.exception("[%s] Failed to answer", request_id)
+            metrics.finish_request("error")
+            yield _sse(
+                "error",
+                {
+                    "answer": VOICE_FAILURE,
+                    "error": "Answer generation failed",
+                    "request_id": request_id,
+                },
+            )
+            return
+
+        metrics.finish_request("ok")
+        logger.info(
+            "[%s] Streamed with %d source(s), %d term(s)",
+            request_id,
+            counts.get("sources", 0),
+            counts.get("terms", 0),
+        )
+        yield _sse("done", {"request_id": request_id})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Registered on both paths: Vercel may or may not preserve the `/api` prefix
 # when it routes into this function, depending on the rewrite in play.
 app.add_url_rule("/api/chat", view_func=_handle_chat, methods=["POST"])
 app.add_url_rule("/chat", view_func=_handle_chat, methods=["POST"], endpoint="chat_bare")
+app.add_url_rule("/api/chat/stream", view_func=_handle_chat_stream, methods=["POST"])
+app.add_url_rule(
+    "/chat/stream",
+    view_func=_handle_chat_stream,
+    methods=["POST"],
+    endpoint="chat_stream_bare",
+)
 
 
 @app.route("/api/health", methods=["GET"])
@@ -117,16 +187,26 @@ app.add_url_rule("/chat", view_func=_handle_chat, methods=["POST"], endpoint="ch
 def health():
     """Reports whether the app can reach its config and its index."""
     try:
-        from api.config import COLLECTION_NAME, get_vector_store
+        from api.config import (
+            COLLECTION_NAME,
+            embedding_cache_stats,
+            get_answer_cache,
+        )
+        from api.warmup import probe_index
 
         # Deliberately not via routes.chat.retrieve, which swallows failures.
-        hits = get_vector_store().similarity_search("kola nut", k=1)
+        # Searched by a fixed vector: no embedding call, and no OpenAI client
+        # to import, just to answer a health check.
+        has_documents = probe_index()
+        cache = get_answer_cache()
         return jsonify(
             {
                 "status": "ok",
                 "collection": COLLECTION_NAME,
                 "index_reachable": True,
-                "index_has_documents": bool(hits),
+                "index_has_documents": has_documents,
+                "answer_cache": cache.stats() if cache else None,
+                "embedding_cache": embedding_cache_stats(),
             }
         )
     except Exception as exc:
@@ -134,6 +214,13 @@ def health():
         return jsonify({"status": "error", "details": str(exc)}), 500
 
 
+@app.route("/api/metrics", methods=["GET"])
+@app.route("/metrics", methods=["GET"], endpoint="metrics_bare")
+def metrics_endpoint():
+    """Per-stage latency quantiles, token and cache counters for Prometheus."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.errorhandler(404)
 def not_found(_error):
     return jsonify({"error": "Not found", "path": request.path}), 404
@@ -150,3 +237,10 @@ def method_not_allowed(_error):
         ),
         405,
     )
+
+
+# Last, once every route is registered.
+if PREWARM:
+    from api.warmup import prewarm
+
+    prewarm()
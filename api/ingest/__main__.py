@@ -5,9 +5,46 @@
     python3 -m api.ingest --only proverbs     # one tag
     python3 -m api.ingest --no-llm            # skip the extraction pass
     python3 -m api.ingest --limit 5           # first N sources, for a smoke test
+    python3 -m api.ingest --backend local     # write the local index, not Astra
+    python3 -m api.ingest --fetcher threads   # the thread-pool fetcher
+    python3 -m api.ingest --revalidate        # refresh only what changed
+    python3 -m api.ingest --rewrite           # write everything, manifest or not
+    python3 -m api.ingest --pack              # several chunks per extraction call
+    python3 -m api.ingest --batch req.jsonl   # extraction requests for the Batch API
+    python3 -m api.ingest --batch-results out.jsonl  # cache its answers, then ingest
+    python3 -m api.ingest --extract-workers 32 --embed-workers 8  # more headroom
+    python3 -m api.ingest --refresh --html-engine fast  # re-clean with the fast engine
+    python3 -m api.ingest --chunker tokens    # section-aware, token-sized chunks
+    python3 -m api.ingest --dedupe-threshold 0.8  # merge only closer near-duplicates
+    python3 -m api.ingest stats               # what the cache holds
+    python3 -m api.ingest gc --dry-run        # what gc would evict from it
+    python3 -m api.ingest gc                  # evict it
 
-Fetches and extractions are cached under .cache/ingest, so re-runs are cheap
-and interrupting a run loses nothing.
+Fetches and extractions are cached in .cache/ingest/cache.sqlite3 (see
+cache.py), so re-runs are cheap and interrupting a run loses nothing. `gc`
+evicts pages of sources no longer in the registry, and extractions that no
+cached page's chunks, under either chunker, ask for under the current
+extraction model.
+
+--revalidate asks each host whether its cached pages changed (a conditional
+GET, or a revision query per batch of MediaWiki titles) and carries only new
+or changed pages through extraction and loading. A cached page counts as
+unchanged only if the manifest records a run that wrote it from the same
+text, so pages cached by --dry-run, --batch or an interrupted run still go
+through.
+
+What was written where is recorded in a manifest (see manifest.py): each run
+embeds and writes only new or changed documents, deletes those their source
+no longer produces, and logs the delta.
+
+Passages that are near-duplicates of each other — the same proverb from
+several sources — are merged into one document listing every source (see
+dedupe.py); --no-dedupe writes them all.
+
+Fetching, extraction and embedding each have their own worker count.
+Extraction and embedding calls are paced by adaptive limiters (see
+limiter.py): the worker count is their ceiling, and they settle below it at
+whatever the account's rate limits allow.
 """
 
 from __future__ import annotations
@@ -16,11 +53,46 @@ import argparse
 import logging
 import sys
 from collections import Counter
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+from typing import Callable
 
-from .extract import Entry, chunk, extract_chunk, passthrough_chunk
-from .fetch import Page, fetch
-from .load import to_documents, write
+from api.config import (
+    COLLECTION_NAME,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    VECTOR_BACKEND,
+    local_index_path,
+)
+
+from .batch import read_results, write_requests
+from .cache import ENTRIES, PAGES, get_cache
+from .dedupe import THRESHOLD as DEDUPE_THRESHOLD
+from .dedupe import NearDuplicates
+from .extract import (
+    CHUNKERS,
+    PACK_STATS,
+    Entry,
+    cache_key,
+    extract_chunk,
+    extract_packed,
+    passthrough_chunk,
+)
+from .fetch import (
+    BATCH_TITLES,
+    ENGINES,
+    Page,
+    fetch,
+    fetch_batch,
+    load_cached,
+    mediawiki_batches,
+)
+from .fetch_async import CONCURRENCY, fetch_many
+from .limiter import AdaptiveLimiter
+from .load import Writer
+from .manifest import MANIFEST_PATH, Manifest, page_hash
+from .pipeline import Pipeline
 from .sources import SOURCES, TAGS, Source
 
 logging.basicConfig(
@@ -30,16 +102,106 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ingest")
 
+THREAD_FETCH_WORKERS = 6
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(prog="api.ingest", description=__doc__)
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=("run", "gc", "stats"),
+        default="run",
+        help="ingest (default), evict unreferenced cache items, or show the cache",
+    )
     parser.add_argument("--only", choices=TAGS, action="append", help="restrict to tag(s)")
     parser.add_argument("--limit", type=int, help="only the first N sources")
     parser.add_argument("--collection", help="override ASTRA_DB_COLLECTION_NAME")
     parser.add_argument("--dry-run", action="store_true", help="do not write to Astra")
+    parser.add_argument(
+        "--backend",
+        choices=("astra", "local"),
+        help="vector store to write to (default: VECTOR_BACKEND)",
+    )
     parser.add_argument("--no-llm", action="store_true", help="skip the extraction pass")
     parser.add_argument("--refresh", action="store_true", help="ignore the fetch cache")
-    parser.add_argument("--workers", type=int, default=6, help="concurrent workers")
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="check cached pages with their hosts; process only what changed",
+    )
+    parser.add_argument(
+        "--rewrite",
+        action="store_true",
+        help="write every document, not just what the manifest lacks",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="extract several small chunks per model request",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="PATH",
+        help="write uncached extraction requests as a Batch API file, then stop",
+    )
+    parser.add_argument(
+        "--batch-results",
+        metavar="PATH",
+        help="cache the answers in a Batch API results file before the run",
+    )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        help=f"concurrent fetches (default: {CONCURRENCY} async, "
+        f"{THREAD_FETCH_WORKERS} threads)",
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=16,
+        help="most extraction calls in flight; the limiter finds the level below",
+    )
+    parser.add_argument(
+        "--embed-workers",
+        type=int,
+        default=4,
+        help="most embedding batches in flight",
+    )
+    parser.add_argument(
+        "--fetcher",
+        choices=("async", "threads"),
+        default="async",
+        help="fetch engine: per-host token buckets on asyncio, or a thread pool",
+    )
+    parser.add_argument(
+        "--chunker",
+        choices=tuple(CHUNKERS),
+        default="chars",
+        help="chunk by characters, or by tokens along MediaWiki sections",
+    )
+    parser.add_argument(
+        "--dedupe-threshold",
+        type=float,
+        default=DEDUPE_THRESHOLD,
+        help="Jaccard similarity at which passages are merged as near-duplicates",
+    )
+    parser.add_argument(
+        "--no-dedupe", action="store_true", help="keep near-duplicate passages"
+    )
+    parser.add_argument(
+        "--html-engine",
+        choices=ENGINES,
+        default="soup",
+        help="web page cleaning: BeautifulSoup, or the single-pass parser "
+        "(lxml if installed); applies to pages fetched, not cached ones",
+    )
+    parser.add_argument(
+        "--titles-per-query",
+        type=int,
+        default=BATCH_TITLES,
+        help="MediaWiki titles resolved per extract query (1 = one by one)",
+    )
     return parser.parse_args()
 
 
@@ -52,28 +214,58 @@ def select(args: argparse.Namespace) -> list[Source]:
     return chosen
 
 
-def fetch_all(sources: list[Source], workers: int, refresh: bool) -> list[Page]:
+def fetch_all(
+    sources: list[Source],
+    workers: int | None,
+    refresh: bool,
+    fetcher: str = "async",
+    titles_per_query: int = BATCH_TITLES,
+    revalidate: bool = False,
+    on_page: Callable[[Page | None], None] | None = None,
+    engine: str = "soup",
+) -> list[Page]:
+    """Fetch every source; `on_page` sees each result as soon as it lands."""
     logger.info("Fetching %d sources", len(sources))
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        results = pool.map(lambda s: fetch(s, refresh=refresh), sources)
+    if fetcher == "async":
+        results = fetch_many(
+            sources,
+            refresh=refresh,
+            concurrency=workers or CONCURRENCY,
+            titles_per_query=titles_per_query,
+            revalidate=revalidate,
+            on_page=on_page,
+            engine=engine,
+        )
+    else:
+        # One job per MediaWiki batch or web page.
+        wiki = [s for s in sources if s.kind == "mediawiki"]
+        jobs = mediawiki_batches(wiki, titles_per_query)
+        jobs += [[s] for s in sources if s.kind != "mediawiki"]
+
+        def run(job: list[Source]) -> list[Page | None]:
+            if job[0].kind == "mediawiki":
+                return fetch_batch(job, refresh, revalidate)
+            return [fetch(job[0], refresh, revalidate, engine)]
+
+        results = []
+        with ThreadPoolExecutor(max_workers=workers or THREAD_FETCH_WORKERS) as pool:
+            for future in as_completed([pool.submit(run, job) for job in jobs]):
+                for page in future.result():
+                    results.append(page)
+                    if on_page is not None:
+                        on_page(page)
     pages = [page for page in results if page is not None]
     logger.info("Fetched %d/%d sources", len(pages), len(sources))
+    if revalidate:
+        unchanged = sum(page.unchanged for page in pages)
+        logger.info(
+            "Revalidated: %d unchanged, %d new or changed",
+            unchanged,
+            len(pages) - unchanged,
+        )
     return pages
 
 
-def extract_all(pages: list[Page], workers: int, use_llm: bool) -> list[Entry]:
-    jobs = [(body, page) for page in pages for body in chunk(page.text)]
-    logger.info("Structuring %d chunks from %d pages", len(jobs), len(pages))
-
-    worker = extract_chunk if use_llm else passthrough_chunk
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        batches = pool.map(lambda job: worker(*job), jobs)
-
-    entries = [entry for batch in batches for entry in batch]
-    logger.info("Extracted %d entries", len(entries))
-    return entries
-
-
 def report(entries: list[Entry], documents: list) -> None:
     by_kind = Counter(entry.kind for entry in entries)
     by_source = Counter(entry.page.title for entry in entries if entry.page)
@@ -90,34 +282,189 @@ def report(entries: list[Entry], documents: list) -> None:
         logger.info("  %-45s %d", title[:45], count)
 
 
+def show_stats() -> None:
+    cache = get_cache()
+    files = [cache.path, Path(f"{cache.path}-wal")]
+    on_disk = sum(path.stat().st_size for path in files if path.exists())
+    logger.info("--- cache: %s (%.1f MiB) ---", cache.path, on_disk / 2**20)
+    for kind, stats in sorted(cache.stats().items()):
+        logger.info(
+            "  %-8s %6d items  %7.1f MiB as JSON, %7.1f MiB stored",
+            kind,
+            stats["items"],
+            stats["size"] / 2**20,
+            stats["stored"] / 2**20,
+        )
+
+
+def collect_garbage(dry_run: bool) -> None:
+    """Evict pages the registry dropped, and extractions nothing asks for."""
+    cache = get_cache()
+    registry = {source.key: source for source in SOURCES}
+    pages = cache.keys(PAGES)
+    stale_pages = pages - registry.keys()
+
+    # Extraction keys hash the model and the chunk: re-chunking what is cached
+    # finds every entry a run would read, and nothing for an old model or text.
+    wanted = set()
+    for key in pages & registry.keys():
+        page = load_cached(registry[key])
+        if page is None:
+            continue
+        for chunker in CHUNKERS.values():
+            wanted.update(cache_key(body) for body in chunker(page.text))
+    entries = cache.keys(ENTRIES)
+    stale_entries = entries - wanted
+
+    logger.info(
+        "gc: %d/%d pages and %d/%d extractions unreferenced",
+        len(stale_pages),
+        len(pages),
+        len(stale_entries),
+        len(entries),
+    )
+    if dry_run:
+        logger.info("Dry run — nothing evicted.")
+        return
+    cache.delete(PAGES, stale_pages)
+    cache.delete(ENTRIES, stale_entries)
+    cache.vacuum()
+    show_stats()
+
+
+def manifest_stale(args: argparse.Namespace) -> bool:
+    """Whether the target is rebuilt, so nothing the manifest says holds."""
+    backend = (args.backend or VECTOR_BACKEND).lower()
+    collection = args.collection or COLLECTION_NAME
+    # A local index deleted by hand must not pass for an up-to-date one.
+    missing = backend == "local" and not (
+        local_index_path(collection) / "meta.json"
+    ).exists()
+    return args.rewrite or missing
+
+
+def open_manifest(args: argparse.Namespace) -> Manifest:
+    backend = (args.backend or VECTOR_BACKEND).lower()
+    collection = args.collection or COLLECTION_NAME
+    manifest = Manifest(
+        MANIFEST_PATH,
+        target=f"{backend}:{collection}",
+        model=f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}",
+    )
+    if manifest_stale(args) and not args.dry_run:
+        manifest.clear()
+    return manifest
+
+
 def main() -> int:
     args = parse_args()
+    if args.command == "stats":
+        show_stats()
+        return 0
+    if args.command == "gc":
+        collect_garbage(args.dry_run)
+        return 0
     sources = select(args)
     if not sources:
         logger.error("No sources selected")
         return 1
 
-    pages = fetch_all(sources, args.workers, args.refresh)
-    if not pages:
+    if args.batch:
+        pages = fetch_all(
+            sources,
+            args.fetch_workers,
+            args.refresh,
+            args.fetcher,
+            args.titles_per_query,
+            args.revalidate,
+            engine=args.html_engine,
+        )
+        if args.revalidate:
+            stale = manifest_stale(args)
+            written = {} if stale else open_manifest(args).written_pages()
+            pages = [
+                page
+                for page in pages
+                if not page.unchanged or written.get(page.key) != page_hash(page.text)
+            ]
+        count = write_requests(pages, args.batch, CHUNKERS[args.chunker])
+        logger.info("Wrote %d extraction requests to %s", count, args.batch)
+        return 0
+    if args.batch_results:
+        counts = read_results(args.batch_results)
+        logger.info(
+            "Batch results: %(cached)d chunks cached (%(entries)d entries), "
+            "%(failed)d failed",
+            counts,
+        )
+
+    manifest = open_manifest(args)
+    extracting = AdaptiveLimiter("extract", args.extract_workers)
+    embedding = AdaptiveLimiter("embed", args.embed_workers)
+    writer = None if args.dry_run else Writer(args.collection, args.backend, embedding)
+    extract, extract_many = passthrough_chunk, None
+    if not args.no_llm:
+        extract = partial(extract_chunk, limiter=extracting)
+        if args.pack:
+            extract_many = partial(extract_packed, limiter=extracting)
+    pipeline = Pipeline(
+        extract,
+        args.extract_workers,
+        manifest,
+        writer,
+        skip_unchanged=args.revalidate,
+        extract_many=extract_many,
+        embed_workers=args.embed_workers,
+        limiters=(extracting, embedding),
+        chunker=CHUNKERS[args.chunker],
+        dedupe=None if args.no_dedupe else NearDuplicates(args.dedupe_threshold),
+    )
+    # Only a run over the whole registry can tell that a source was retired.
+    registry = None if args.only or args.limit else {s.key for s in SOURCES}
+    outcome = pipeline.run(
+        lambda on_page: fetch_all(
+            sources,
+            args.fetch_workers,
+            args.refresh,
+            args.fetcher,
+            args.titles_per_query,
+            args.revalidate,
+            on_page,
+            args.html_engine,
+        ),
+        registry,
+    )
+
+    if not outcome.fetched:
         logger.error("Nothing fetched; aborting")
         return 1
-
-    entries = extract_all(pages, args.workers, use_llm=not args.no_llm)
-    if not entries:
+    if args.revalidate and outcome.unchanged == outcome.fetched:
+        logger.info("Nothing changed since the last run.")
+        return 0
+    if not outcome.entries:
         logger.error("Nothing extracted; aborting")
         return 1
 
-    documents, ids = to_documents(entries)
-    report(entries, documents)
+    report(outcome.entries, outcome.documents)
+    if pipeline.dedupe is not None:
+        logger.info("Near-duplicates: %s", pipeline.dedupe.describe())
+    logger.info("Cache: %s", get_cache().describe())
+    if PACK_STATS.requests:
+        logger.info("Packing: %s", PACK_STATS.describe())
+    logger.info("Delta for %s: %s", manifest.target, outcome.delta.summary())
 
     if args.dry_run:
         logger.info("Dry run — nothing written.")
-        for document in documents[:3]:
+        for document in outcome.documents[:3]:
             logger.info("sample: %s", document.page_content[:180].replace("\n", " "))
         return 0
 
-    written = write(documents, ids, args.collection)
-    logger.info("Wrote %d documents to Astra", written)
+    if not outcome.written and not outcome.delta.orphans:
+        logger.info("%s is up to date; nothing to embed.", manifest.target)
+        return 0
+    logger.info(
+        "Wrote %d documents to %s", outcome.written, args.backend or VECTOR_BACKEND
+    )
     return 0
 
 
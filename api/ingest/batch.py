@@ -0,0 +1,104 @@
+"""Extraction through the OpenAI Batch API, for full corpus rebuilds.
+
+A rebuild does not need the interactive latency of `extract_chunk`, and the
+Batch API runs the same requests at half the price in exchange for a
+turnaround of up to a day. It takes the whole job as one file:
+
+    python3 -m api.ingest --batch requests.jsonl          # write the requests
+    # upload, run and download it with the OpenAI CLI or dashboard
+    python3 -m api.ingest --batch-results results.jsonl   # cache, then ingest
+
+`write_requests` writes one Batch API line per uncached chunk, with the
+chunk's `cache_key` as its `custom_id`, so `read_results` can put each
+answer straight into the cache entry that `extract_chunk` reads — no model
+call, and the rest of the run is all cache hits. Failed requests are
+reported and left uncached, to be extracted the usual way.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Callable
+
+from api.config import EXTRACTION_MODEL
+
+from .extract import cache_key, chunk, is_cached, messages, store_reply
+from .fetch import Page
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/chat/completions"
+# The Batch API's ceiling on requests per file.
+MAX_REQUESTS = 50_000
+
+
+def request_line(body: str, page: Page) -> dict:
+    """One chunk's extraction, in the Batch API's request format."""
+    return {
+        "custom_id": cache_key(body),
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": EXTRACTION_MODEL,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": role, "content": content}
+                for role, content in messages(body, page)
+            ],
+        },
+    }
+
+
+def write_requests(
+    pages: list[Page],
+    path: str | Path,
+    chunker: Callable[[str], list[str]] = chunk,
+) -> int:
+    """Write a request for every uncached chunk of `pages`; how many."""
+    seen: set[str] = set()
+    lines = []
+    for page in pages:
+        for body in chunker(page.text):
+            key = cache_key(body)
+            if key in seen or is_cached(body):
+                continue
+            seen.add(key)
+            lines.append(request_line(body, page))
+    if len(lines) > MAX_REQUESTS:
+        logger.warning(
+            "%d requests is over the Batch API's %d per file; split %s before "
+            "uploading",
+            len(lines),
+            MAX_REQUESTS,
+            path,
+        )
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        for line in lines:
+            handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return len(lines)
+
+
+def read_results(path: str | Path) -> dict[str, int]:
+    """Cache every successful answer in a Batch API results file; counts."""
+    counts = {"cached": 0, "entries": 0, "failed": 0}
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code") != 200:
+                    raise ValueError(result.get("error") or response.get("status_code"))
+                content = response["body"]["choices"][0]["message"]["content"]
+                counts["entries"] += store_reply(result["custom_id"], content)
+                counts["cached"] += 1
+            except Exception as exc:
+                counts["failed"] += 1
+                logger.warning("Batch result %s:%d unusable: %s", path, number, exc)
+    return counts
@@ -0,0 +1,249 @@
+"""Fetched pages and extractions, in one SQLite file.
+
+The caches used to be two directories of small JSON files, one per page and
+one per chunk. Each lookup was an `exists()`, a read and a parse, which adds
+up to seconds on a cold disk or a container volume. A crash mid-write left a
+truncated file behind, and nothing was ever evicted. Now they are rows in
+`.cache/ingest/cache.sqlite3`, in WAL mode:
+
+    items(kind, key, data, codec, checksum, size, stored)
+
+    kind      "pages" (keyed by source key) or "entries" (by `cache_key`)
+    data      the JSON as stored; zlib-compressed for pages
+    checksum  CRC-32 of the JSON, checked on every read
+
+Each `put` is one transaction, so a write either lands whole or not at all.
+A row that fails its checksum is dropped and reads as a miss, to be fetched
+or extracted again.
+
+The first open migrates the old directories in one transaction per kind,
+then records that in `meta`. The directories are left for the user to
+delete. `python3 -m api.ingest gc` evicts what the registry and extraction
+model no longer reference; `python3 -m api.ingest stats` shows what is
+stored.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(".cache/ingest/cache.sqlite3")
+PAGES = "pages"
+ENTRIES = "entries"
+COMPRESSED = {PAGES}
+# The file-per-item layout this replaces, beside the cache file; migrated
+# on first open.
+LEGACY_DIRS = {PAGES: "pages", ENTRIES: "entries"}
+
+
+def _checksum(raw: bytes) -> int:
+    return zlib.crc32(raw)
+
+
+class IngestCache:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " data BLOB NOT NULL,"
+            " codec TEXT NOT NULL,"
+            " checksum INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored REAL NOT NULL,"
+            " PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._db.commit()
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.writes: Counter[str] = Counter()
+        self.corrupt = 0
+
+    @staticmethod
+    def _row(kind: str, key: str, text: str, now: float) -> tuple:
+        raw = text.encode("utf-8")
+        codec = "zlib" if kind in COMPRESSED else ""
+        data = zlib.compress(raw, 6) if codec else raw
+        return (kind, key, data, codec, _checksum(raw), len(raw), now)
+
+    def get(self, kind: str, key: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, codec, checksum FROM items WHERE kind = ? AND key = ?",
+                (kind, key),
+            ).fetchone()
+            if row is None:
+                self.misses[kind] += 1
+                return None
+            data, codec, checksum = row
+            try:
+                raw = zlib.decompress(data) if codec == "zlib" else bytes(data)
+                if _checksum(raw) != checksum:
+                    raise ValueError("checksum mismatch")
+            except (zlib.error, ValueError) as exc:
+                logger.warning(
+                    "Dropping corrupt cache item %s/%s: %s", kind, key, exc
+                )
+                self._db.execute(
+                    "DELETE FROM items WHERE kind = ? AND key = ?", (kind, key)
+                )
+                self._db.commit()
+                self.corrupt += 1
+                self.misses[kind] += 1
+                return None
+            self.hits[kind] += 1
+        return raw.decode("utf-8")
+
+    def has(self, kind: str, key: str) -> bool:
+        with self._lock:
+            return (
+                self._db.execute(
+                    "SELECT 1 FROM items WHERE kind = ? AND key = ?", (kind, key)
+                ).fetchone()
+                is not None
+            )
+
+    def put(self, kind: str, key: str, text: str) -> None:
+        self.put_many(kind, [(key, text)])
+
+    def put_many(self, kind: str, items: Iterable[tuple[str, str]]) -> int:
+        """Store every (key, JSON text) pair in one transaction; how many."""
+        now = time.time()
+        rows = [self._row(kind, key, text, now) for key, text in items]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO items"
+                " (kind, key, data, codec, checksum, size, stored)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.writes[kind] += len(rows)
+        return len(rows)
+
+    def keys(self, kind: str) -> set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT key FROM items WHERE kind = ?", (kind,))
+            return {key for (key,) in rows}
+
+    def delete(self, kind: str, keys: Iterable[str]) -> int:
+        with self._lock, self._db:
+            cursor = self._db.executemany(
+                "DELETE FROM items WHERE kind = ? AND key = ?",
+                [(kind, key) for key in keys],
+            )
+            return cursor.rowcount
+
+    def vacuum(self) -> None:
+        with self._lock:
+            self._db.execute("VACUUM")
+
+    def migrate(self, kind: str, directory: Path) -> int:
+        """One-shot import of a file-per-item directory; items imported."""
+        marker = f"migrated:{kind}"
+        with self._lock:
+            done = self._db.execute(
+                "SELECT 1 FROM meta WHERE name = ?", (marker,)
+            ).fetchone()
+        if done or not directory.is_dir():
+            return 0
+
+        items = []
+        for path in directory.glob("*.json"):
+            try:
+                text = path.read_text(encoding="utf-8")
+                parsed = json.loads(text)
+            except (OSError, ValueError):
+                # A half-written file from an interrupted run: re-fetched later.
+                continue
+            # Page files are named by a digest; the source key is inside.
+            if kind == PAGES:
+                key = parsed.get("key") if isinstance(parsed, dict) else None
+            else:
+                key = path.stem
+            if key:
+                items.append((key, text))
+
+        now = time.time()
+        rows = [self._row(kind, key, text, now) for key, text in items]
+        with self._lock, self._db:
+            # Rows already here are newer than the files; keep them.
+            self._db.executemany(
+                "INSERT OR IGNORE INTO items"
+                " (kind, key, data, codec, checksum, size, stored)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                (marker, str(now)),
+            )
+        logger.info(
+            "Migrated %d %s from %s into %s; the directory can be deleted",
+            len(rows),
+            kind,
+            directory,
+            self.path,
+        )
+        return len(rows)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Per kind: items, bytes as JSON, bytes as stored."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, COUNT(*), SUM(size), SUM(LENGTH(data))"
+                " FROM items GROUP BY kind"
+            ).fetchall()
+        return {
+            kind: {"items": count, "size": size or 0, "stored": stored or 0}
+            for kind, count, size, stored in rows
+        }
+
+    def describe(self) -> str:
+        parts = []
+        for kind in (PAGES, ENTRIES):
+            looked = self.hits[kind] + self.misses[kind]
+            if looked or self.writes[kind]:
+                parts.append(
+                    f"{kind} {self.hits[kind]}/{looked} hits, "
+                    f"{self.writes[kind]} written"
+                )
+        if self.corrupt:
+            parts.append(f"{self.corrupt} corrupt dropped")
+        return "; ".join(parts) or "unused"
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+@lru_cache(maxsize=4)
+def _open(path: str) -> IngestCache:
+    cache = IngestCache(path)
+    for kind, name in LEGACY_DIRS.items():
+        cache.migrate(kind, cache.path.parent / name)
+    return cache
+
+
+def get_cache() -> IngestCache:
+    """The cache at CACHE_PATH, opened (and migrated into) once per process."""
+    return _open(str(CACHE_PATH))
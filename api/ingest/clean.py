@@ -0,0 +1,220 @@
+"""Page text in one pass over the HTML, for `--html-engine fast`.
+
+The BeautifulSoup path in `fetch.parse_web` builds a full tree, decomposes
+every stripped tag out of it, runs each `CONTENT_SELECTORS` selector over
+what is left, and then calls `get_text` on every candidate — the body, and
+every wrapper inside it — only to keep the longest. Most of that work is
+thrown away.
+
+Here the parser never builds a tree. `_Scorer` is a parser target that sees
+each start tag, end tag and text node once, in document order:
+
+- text inside a STRIP_TAGS element is dropped as it arrives;
+- the rest is appended to one list of text nodes, with a running count of
+  stripped characters;
+- the first element matching each selector, and `<body>`, records where it
+  starts and ends in that list, and how many characters it holds.
+
+The richest candidate is then a slice of the list. It selects as `parse_web`
+does: the first match per selector in document order, scored by
+`get_text(strip=True)` length, ties going to the earlier selector.
+
+The parser is libxml2's, through lxml, when lxml is installed — several
+times faster again — and the standard library's `html.parser` otherwise.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+
+# Elements that never take an end tag, and so never open a scope.
+VOID = frozenset(
+    {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "source",
+        "track",
+        "wbr",
+    }
+)
+
+_SELECTOR = re.compile(r"([.#]?)([\w-]+)$")
+
+
+@lru_cache(maxsize=8)
+def _matchers(selectors: tuple[str, ...]) -> list[tuple[str, str]]:
+    """("tag" | "class" | "id", name) for each of the simple selectors used."""
+    kinds = {"": "tag", ".": "class", "#": "id"}
+    matchers = []
+    for selector in selectors:
+        match = _SELECTOR.match(selector)
+        if match is None:
+            raise ValueError(f"Unsupported content selector: {selector!r}")
+        matchers.append((kinds[match.group(1)], match.group(2)))
+    return matchers
+
+
+class _Scorer:
+    """Parser target: the text outside stripped tags, and each candidate's span."""
+
+    def __init__(self, strip: frozenset[str], matchers: list[tuple[str, str]]):
+        self.strip = strip
+        self.matchers = matchers
+        # (tag, candidate ranks it opened, whether it is stripped)
+        self.stack: list[tuple[str, list[int], bool]] = []
+        self.skip = 0
+        self.segments: list[str] = []
+        self.chars = 0
+        self.buffer: list[str] = []
+        # rank -> (first segment, characters before it); then (start, end, size)
+        self.open: dict[int, tuple[int, int]] = {}
+        self.found: dict[int, tuple[int, int, int]] = {}
+        self.title: list[str] | None = None
+        self.in_title = False
+
+    def _flush(self) -> None:
+        if self.buffer:
+            text = "".join(self.buffer)
+            self.buffer.clear()
+            self.segments.append(text)
+            self.chars += len(text.strip())
+
+    def _ranks(self, tag: str, attrs: dict) -> list[int]:
+        ranks = []
+        classes = None
+        for rank, (kind, name) in enumerate(self.matchers):
+            if rank in self.found or rank in self.open:
+                continue
+            if kind == "tag":
+                hit = tag == name
+            elif kind == "id":
+                hit = attrs.get("id") == name
+            else:
+                if classes is None:
+                    classes = (attrs.get("class") or "").split()
+                hit = name in classes
+            if hit:
+                ranks.append(rank)
+        body = len(self.matchers)
+        if tag == "body" and body not in self.found and body not in self.open:
+            ranks.append(body)
+        return ranks
+
+    def start(self, tag: str, attrs) -> None:
+        tag = tag.lower()
+        # A void tag still ends a text node, as <br> ends a line: soup's
+        # get_text(separator="\n") breaks there too.
+        self._flush()
+        if tag in VOID:
+            return
+        stripped = tag in self.strip
+        ranks = [] if self.skip or stripped else self._ranks(tag, attrs)
+        self.stack.append((tag, ranks, stripped))
+        if stripped:
+            self.skip += 1
+        for rank in ranks:
+            self.open[rank] = (len(self.segments), self.chars)
+        if tag == "title" and self.title is None and not self.skip:
+            self.title, self.in_title = [], True
+
+    def end(self, tag: str) -> None:
+        tag = tag.lower()
+        if tag in VOID or not any(open_tag == tag for open_tag, _, _ in self.stack):
+            return
+        self._flush()
+        while self.stack:
+            open_tag, ranks, stripped = self.stack.pop()
+            self._close(open_tag, ranks, stripped)
+            if open_tag == tag:
+                return
+
+    def _close(self, tag: str, ranks: list[int], stripped: bool) -> None:
+        if stripped:
+            self.skip -= 1
+        for rank in ranks:
+            first, before = self.open.pop(rank)
+            self.found[rank] = (first, len(self.segments), self.chars - before)
+        if tag == "title":
+            self.in_title = False
+
+    def data(self, text: str) -> None:
+        if self.skip:
+            return
+        if self.in_title and self.title is not None:
+            self.title.append(text)
+        self.buffer.append(text)
+
+    def close(self) -> _Scorer:
+        self._flush()
+        while self.stack:
+            self._close(*self.stack.pop())
+        return self
+
+    def richest(self) -> str | None:
+        if not self.found:
+            return None
+        # Rank order, so a tie goes to the earlier selector, as with max().
+        first, end, _ = max(
+            (self.found[rank] for rank in sorted(self.found)), key=lambda f: f[2]
+        )
+        return "\n".join(self.segments[first:end])
+
+
+class _StdlibFeed(HTMLParser):
+    def __init__(self, target: _Scorer):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+@lru_cache(maxsize=1)
+def has_lxml() -> bool:
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def page_text(
+    html: str,
+    strip: list[str],
+    selectors: list[str],
+    parser: str = "auto",
+) -> tuple[str | None, str | None]:
+    """(title, text of the richest candidate) in `html`; None where missing.
+
+    `parser` is "lxml", "stdlib", or "auto" for lxml when it is installed.
+    """
+    scorer = _Scorer(frozenset(strip), _matchers(tuple(selectors)))
+    if parser == "lxml" or (parser == "auto" and has_lxml()):
+        from lxml import etree
+
+        feed = etree.HTMLParser(target=scorer, remove_comments=True)
+        feed.feed(html)
+        feed.close()
+    else:
+        stdlib = _StdlibFeed(scorer)
+        stdlib.feed(html)
+        stdlib.close()
+        scorer.close()
+    title = "".join(scorer.title).strip() if scorer.title is not None else None
+    return title, scorer.richest()
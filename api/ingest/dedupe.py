@@ -0,0 +1,203 @@
+"""Near-duplicate passages, clustered with MinHash and LSH.
+
+`to_documents` drops only exact repeats, but the same proverb turns up on
+several sources — Wikiquote, igboguide, a steemit post — each extracted in
+slightly different words. Left alone, a question about it fills every
+retrieval slot with the same saying. `NearDuplicates` clusters passages
+whose character 5-gram sets overlap by at least THRESHOLD (Jaccard). Each
+cluster goes into the store as one canonical passage, the longest, carrying
+every member's Igbo terms and source URLs.
+
+Comparing every pair would be quadratic. Instead, each passage gets a MinHash
+signature of NUM_PERM values. Passages that agree on every row of at least
+one LSH band become candidates; the band shape puts the collision curve's
+midpoint just under THRESHOLD. Only candidates are compared, by the share of
+signature values they agree on. Clusters are the connected components, so
+they do not depend on the order passages arrive in.
+
+Passages arrive while the pipeline is still writing. `add` hands back those
+that start a cluster, to be written straight away; a passage that joins a
+cluster marks it for revision instead. Passages that were clustered on the
+last run (`hold`, from the manifest) are held back: a re-run would otherwise
+write a merged canonical twice, bare and then merged, or write a superseded
+member only to delete it again. Everything else streams, and a passage that
+first finds a near-duplicate on this run costs one write that is later
+superseded, as on a first build. `finish` then gives what is left to write:
+each revised cluster's canonical and the held passages that stayed alone. It
+also gives the ids of members written earlier and now superseded.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+import zlib
+from collections.abc import Container
+from dataclasses import replace
+
+import numpy as np
+
+from .extract import Entry
+from .load import doc_id
+
+THRESHOLD = 0.7
+NUM_PERM = 120
+SHINGLE = 5
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK = np.uint64((1 << 32) - 1)
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercased, without diacritics or punctuation: sources disagree on all three."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_PUNCTUATION.sub(" ", plain.casefold()).split())
+
+
+def shingles(text: str) -> np.ndarray:
+    """Hashes of the distinct character SHINGLE-grams of `normalize(text)`."""
+    plain = normalize(text)
+    grams = {plain[i : i + SHINGLE] for i in range(max(1, len(plain) - SHINGLE + 1))}
+    return np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in grams), np.uint64, len(grams)
+    )
+
+
+def bands_for(threshold: float, num_perm: int) -> tuple[int, int]:
+    """(bands, rows) whose collision midpoint is the highest at or under threshold."""
+    shapes = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)]
+    shapes = [(b, r) for b, r in shapes if b * r == num_perm]
+    under = [(b, r) for b, r in shapes if (1 / b) ** (1 / r) <= threshold]
+    return max(under or shapes[:1], key=lambda shape: (1 / shape[0]) ** (1 / shape[1]))
+
+
+class NearDuplicates:
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM):
+        self.threshold = threshold
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = bands_for(threshold, num_perm)
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(self.bands)]
+
+        self.entries: list[Entry] = []
+        self._signatures: list[np.ndarray] = []
+        self._parent: list[int] = []
+        self._emitted: set[int] = set()
+        self._held: set[int] = set()
+        self._dirty: set[int] = set()
+        self.compared = 0
+
+    def _signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        # Universal hashing, one permutation per column; uint64 wraps on purpose.
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME & _MASK
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _root(self, i: int) -> int:
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _insert(self, entry: Entry) -> bool:
+        """Index one passage; whether it joined a cluster."""
+        index = len(self.entries)
+        signature = self._signature(entry.text)
+        self.entries.append(entry)
+        self._signatures.append(signature)
+        self._parent.append(index)
+
+        candidates: set[int] = set()
+        for band, bucket in enumerate(self._buckets):
+            key = signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            members = bucket.setdefault(key, [])
+            candidates.update(members)
+            members.append(index)
+
+        joined = False
+        for other in candidates:
+            self.compared += 1
+            similarity = np.mean(self._signatures[other] == signature)
+            if similarity >= self.threshold and self._root(other) != self._root(index):
+                self._parent[self._root(other)] = self._root(index)
+                joined = True
+        if joined:
+            self._dirty.add(index)
+        return joined
+
+    def add(self, entries: list[Entry], hold: Container[str] = ()) -> list[Entry]:
+        """Index passages; those that start a cluster, to write now.
+
+        Those whose ids are in `hold` are kept for `finish` instead.
+        """
+        fresh = []
+        for entry in entries:
+            if entry.page is None or self._insert(entry):
+                continue
+            index = len(self.entries) - 1
+            if doc_id(entry.text) in hold:
+                self._held.add(index)
+            else:
+                self._emitted.add(index)
+                fresh.append(entry)
+        return fresh
+
+    def _clusters(self) -> dict[int, list[int]]:
+        clusters: dict[int, list[int]] = {}
+        for index in range(len(self.entries)):
+            clusters.setdefault(self._root(index), []).append(index)
+        return clusters
+
+    def canonical(self, members: list[int]) -> Entry:
+        """The longest member, with every member's terms and pages."""
+        entries = [self.entries[i] for i in members]
+        keep = max(entries, key=lambda e: (len(e.text), -members[entries.index(e)]))
+        terms, seen = [], set()
+        for entry in [keep] + entries:
+            for term in entry.igbo_terms:
+                if term["term"].casefold() not in seen:
+                    seen.add(term["term"].casefold())
+                    terms.append(term)
+        pages = [e.page for e in entries if e is not keep and e.page is not None]
+        return replace(keep, igbo_terms=terms, also_from=pages)
+
+    def finish(self) -> tuple[list[Entry], set[str]]:
+        """What is left to write, and the ids it supersedes."""
+        dirty = {self._root(i) for i in self._dirty}
+        revised, superseded = [], set()
+        for root, members in self._clusters().items():
+            if root not in dirty:
+                revised += [self.entries[i] for i in members if i in self._held]
+                continue
+            entry = self.canonical(members)
+            revised.append(entry)
+            keep = doc_id(entry.text)
+            superseded.update(
+                doc_id(self.entries[i].text) for i in members if i in self._emitted
+            )
+            superseded.discard(keep)
+        return revised, superseded
+
+    def clustered(self) -> dict[str, str]:
+        """Source keys of the passages in clusters of two or more, by id."""
+        return {
+            doc_id(self.entries[i].text): self.entries[i].page.key
+            for members in self._clusters().values()
+            if len(members) > 1
+            for i in members
+        }
+
+    def counts(self) -> tuple[int, int]:
+        """Clusters of two or more passages, and passages merged away."""
+        sizes = [len(m) for m in self._clusters().values() if len(m) > 1]
+        return len(sizes), sum(sizes) - len(sizes)
+
+    def describe(self) -> str:
+        clusters, merged = self.counts()
+        return (
+            f"{clusters} clusters of near-duplicates, {merged} "
+            f"of {len(self.entries)} passages merged away "
+            f"({self.compared} comparisons, {self.bands}x{self.rows} LSH bands)"
+        )
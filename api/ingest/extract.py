@@ -6,8 +6,32 @@ back as self-contained passages with a topic, a summary and the Igbo terms
 they use — which is what lets the UI show real glossary terms and honest
 source notes.
 
-Extractions are cached by content hash, so a re-run costs nothing for chunks
-that have not changed.
+Extractions are cached by content hash (see `cache.py`), so a re-run costs
+nothing for chunks that have not changed.
+
+Pages reach the model in one of two chunkings. `chunk`, the default, cuts
+every CHUNK_CHARS characters wherever a paragraph allows. `chunk_tokens`
+(`--chunker tokens`) keeps MediaWiki sections whole where they fit in
+CHUNK_TOKENS tokens of EXTRACTION_MODEL. It packs consecutive sections up to
+that budget, heads each section with its heading path, and splits only the
+sections that are too long on their own. Counting in tokens keeps chunk
+cost steady, where diacritic-heavy Igbo costs more tokens per character than
+English. The two chunk differently, so they hit different cache entries;
+switching re-extracts.
+
+Most wiki stubs make one chunk far smaller than the model's context, and
+each request repeats the whole EXTRACTION_PROMPT. `extract_packed` sends up
+to PACK_CHUNKS uncached chunks in one request, delimited and answered per
+chunk, and splits the reply back into the same per-chunk cache entries
+`extract_chunk` would have written; `PACK_STATS` counts what it saved.
+
+Given an `AdaptiveLimiter` (see `limiter.py`), model calls go through it:
+the client's own retries are turned off so rate limits reach the limiter,
+which backs off and retries the chunk rather than giving it up.
+
+A chunk that still fails raises `ExtractionFailed` rather than coming back
+empty, so the pipeline can tell an outage from a page with nothing in it,
+and keeps that page's stored documents.
 """
 
 from __future__ import annotations
@@ -15,19 +39,46 @@ from __future__ import annotations
 import hashlib
 import json
 import logging
+import re
+import threading
 from dataclasses import dataclass, field
-from pathlib import Path
+from functools import lru_cache
 
+from api.budget import count_tokens as _count_tokens
+from api.budget import encoding
 from api.config import EXTRACTION_MODEL, get_chat_model
 
+from .cache import ENTRIES, get_cache
 from .fetch import Page
+from .limiter import AdaptiveLimiter, usage_tokens
 
 logger = logging.getLogger(__name__)
 
-CACHE_DIR = Path(".cache/ingest/entries")
 CHUNK_CHARS = 3500
 CHUNK_OVERLAP = 250
+# Token chunking: about what CHUNK_CHARS came to in English prose.
+CHUNK_TOKENS = 900
+CHUNK_OVERLAP_TOKENS = 60
+MIN_CHUNK_TOKENS = 50
+# Headings of sections that list citations and links rather than say anything.
+SKIP_SECTIONS = {
+    "see also",
+    "references",
+    "notes",
+    "footnotes",
+    "citations",
+    "sources",
+    "bibliography",
+    "further reading",
+    "external links",
+}
+# "== History ==" through "====== ... ======", as plaintext extracts render them.
+HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
 MAX_ENTRIES_PER_CHUNK = 8
+# A packed request: at most this many chunks and characters of source text,
+# which keeps the reply (up to 8 entries per chunk) inside the output limit.
+PACK_CHUNKS = 4
+PACK_CHARS = 8000
 
 KINDS = {
     "proverb",
@@ -63,6 +114,26 @@ Reply with a single JSON object:
 At most %d entries. Return {"entries": []} if the text carries nothing usable. Only list igbo_terms that actually appear in the entry's text; an empty list is fine.""" % MAX_ENTRIES_PER_CHUNK
 
 
+PACKED_PROMPT = """
+
+This time the user message holds several SOURCE TEXTs, each starting with a line [CHUNK n]. Treat every chunk as a separate source: extract from each one on its own, never merging or moving passages between chunks.
+
+Reply with a single JSON object holding one item per chunk, in order:
+{"chunks": [{"chunk": n, "entries": [...entries for chunk n, as above...]}]}"""
+
+
+class ExtractionFailed(Exception):
+    """The model could not structure chunks of `pages`.
+
+    `entries` holds what the other chunks of the same request gave.
+    """
+
+    def __init__(self, pages: list[Page], entries: list | None = None):
+        super().__init__(", ".join(page.title for page in pages))
+        self.pages = pages
+        self.entries = entries or []
+
+
 @dataclass
 class Entry:
     text: str
@@ -71,22 +142,97 @@ class Entry:
     kind: str
     igbo_terms: list[dict] = field(default_factory=list)
     page: Page | None = None
+    # Pages whose near-duplicates were merged into this one (see dedupe.py).
+    also_from: list[Page] = field(default_factory=list)
 
 
-def chunk(text: str) -> list[str]:
+@lru_cache(maxsize=1)
+def _char_splitter():
     from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-    splitter = RecursiveCharacterTextSplitter(
+    return RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_CHARS,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", ". ", " ", ""],
     )
-    return [c for c in splitter.split_text(text) if len(c.strip()) >= 200]
 
 
-def _cache_path(body: str) -> Path:
+def chunk(text: str) -> list[str]:
+    return [c for c in _char_splitter().split_text(text) if len(c.strip()) >= 200]
+
+
+@lru_cache(maxsize=1)
+def _token_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    # Room for the heading path that goes on top of every piece.
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_TOKENS - 40,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        length_function=count_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""],
+        # Sentences keep their full stop, rather than the next piece taking it.
+        keep_separator="end",
+    )
+
+
+def sections(text: str) -> list[tuple[str, str]]:
+    """(heading path, body) for each section of a plaintext extract.
+
+    The lead has an empty path; "History > Colonial era" is a subsection.
+    Reference-type sections, and everything under them, are left out.
+    """
+    found: list[tuple[str, str]] = []
+    path: list[tuple[int, str]] = []
+    start, heading = 0, ""
+    for match in HEADING.finditer(text):
+        found.append((heading, text[start : match.start()].strip()))
+        level, title = len(match.group(1)), match.group(2).strip()
+        path = [(depth, name) for depth, name in path if depth < level]
+        path.append((level, title))
+        skipped = any(name.lower() in SKIP_SECTIONS for _, name in path)
+        heading = None if skipped else " > ".join(name for _, name in path)
+        start = match.end()
+    found.append((heading, text[start:].strip()))
+    return [(heading, body) for heading, body in found if heading is not None and body]
+
+
+def chunk_tokens(text: str) -> list[str]:
+    """Chunks of at most CHUNK_TOKENS, cut on section boundaries where possible."""
+    units: list[tuple[int, str]] = []
+    for heading, body in sections(text):
+        head = f"Section: {heading}\n\n" if heading else ""
+        size = count_tokens(head + body)
+        if size <= CHUNK_TOKENS:
+            units.append((size, head + body))
+            continue
+        for part in _token_splitter().split_text(body):
+            units.append((count_tokens(head + part), head + part))
+
+    chunks: list[str] = []
+    current: list[str] = []
+    used = 0
+
+    def flush() -> None:
+        if used >= MIN_CHUNK_TOKENS:
+            chunks.append("\n\n".join(current))
+        current.clear()
+
+    for size, unit in units:
+        if current and used + size > CHUNK_TOKENS:
+            flush()
+            used = 0
+        current.append(unit)
+        used += size
+    if current:
+        flush()
+    return chunks
+
+
+def cache_key(body: str) -> str:
+    """A chunk's cache entry name: the extraction model and text, hashed."""
     digest = hashlib.sha256(f"{EXTRACTION_MODEL}\n{body}".encode("utf-8")).hexdigest()
-    return CACHE_DIR / f"{digest[:24]}.json"
+    return digest[:24]
 
 
 def _coerce(raw: dict) -> list[dict]:
@@ -122,32 +268,167 @@ def _coerce(raw: dict) -> list[dict]:
     return cleaned
 
 
-def extract_chunk(body: str, page: Page) -> list[Entry]:
-    """Structure one chunk, reading through the on-disk cache."""
-    path = _cache_path(body)
-    if path.exists():
-        raw = json.loads(path.read_text(encoding="utf-8"))
+def is_cached(body: str) -> bool:
+    return get_cache().has(ENTRIES, cache_key(body))
+
+
+def _save(body: str, raw: list[dict]) -> None:
+    get_cache().put(ENTRIES, cache_key(body), json.dumps(raw, ensure_ascii=False))
+
+
+def store_reply(key: str, content: str) -> int:
+    """Cache a model reply obtained elsewhere under `cache_key`; entries kept."""
+    raw = _coerce(json.loads(content))
+    get_cache().put(ENTRIES, key, json.dumps(raw, ensure_ascii=False))
+    return len(raw)
+
+
+def _source(body: str, page: Page) -> str:
+    return f"SOURCE: {page.title} ({page.domain})\n\nSOURCE TEXT:\n{body}"
+
+
+def messages(body: str, page: Page) -> list[tuple[str, str]]:
+    """The extraction request for one chunk, as (role, content) pairs."""
+    return [("system", EXTRACTION_PROMPT), ("user", _source(body, page))]
+
+
+def _invoke(prompt: list[tuple[str, str]], limiter: AdaptiveLimiter | None):
+    if limiter is None:
+        return get_chat_model(EXTRACTION_MODEL, temperature=0).invoke(prompt)
+    model = get_chat_model(EXTRACTION_MODEL, temperature=0, max_retries=0)
+    return limiter.call(lambda: model.invoke(prompt), usage_tokens)
+
+
+def extract_chunk(
+    body: str, page: Page, limiter: AdaptiveLimiter | None = None
+) -> list[Entry]:
+    """Structure one chunk, reading through the on-disk cache.
+
+    A chunk that still fails is logged and left uncached, for the next run,
+    and raises `ExtractionFailed`.
+    """
+    cached = get_cache().get(ENTRIES, cache_key(body))
+    if cached is not None:
+        raw = json.loads(cached)
     else:
         try:
-            response = get_chat_model(EXTRACTION_MODEL, temperature=0).invoke(
-                [
-                    ("system", EXTRACTION_PROMPT),
-                    (
-                        "user",
-                        f"SOURCE: {page.title} ({page.domain})\n\nSOURCE TEXT:\n{body}",
-                    ),
-                ]
-            )
+            response = _invoke(messages(body, page), limiter)
             raw = _coerce(json.loads(str(response.content)))
         except Exception as exc:
             logger.warning("Extraction failed for %s: %s", page.title, exc)
-            return []
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        path.write_text(json.dumps(raw, ensure_ascii=False), encoding="utf-8")
+            raise ExtractionFailed([page]) from exc
+        _save(body, raw)
 
     return [Entry(page=page, **item) for item in raw]
 
 
+def _encoding():
+    return encoding(EXTRACTION_MODEL, wait=True)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens for EXTRACTION_MODEL; about four UTF-8 bytes each without tiktoken."""
+    return _count_tokens(text, EXTRACTION_MODEL, wait=True)
+
+
+class PackStats:
+    """What packing saved over one request per chunk, across a run.
+
+    Net of what it cost: a chunk the packed reply left out is still sent on
+    its own, and the packing instructions ride on every packed request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.chunks = 0
+        self.fallbacks = 0
+        self.tokens_saved = 0
+
+    def add(self, chunks: int, fallbacks: int) -> None:
+        # Per chunk, the system prompt would have been sent once; instead it
+        # went once with the pack and once with each fallback.
+        saved = (chunks - 1 - fallbacks) * count_tokens(EXTRACTION_PROMPT)
+        saved -= count_tokens(PACKED_PROMPT)
+        with self._lock:
+            self.requests += 1
+            self.chunks += chunks
+            self.fallbacks += fallbacks
+            self.tokens_saved += saved
+
+    def describe(self) -> str:
+        saved = self.chunks - self.requests - self.fallbacks
+        return (
+            f"{self.chunks} chunks in {self.requests} packed requests and "
+            f"{self.fallbacks} single-chunk fallbacks: {saved} requests and "
+            f"~{self.tokens_saved} prompt tokens saved"
+        )
+
+
+PACK_STATS = PackStats()
+
+
+def extract_packed(
+    jobs: list[tuple[str, Page]], limiter: AdaptiveLimiter | None = None
+) -> list[Entry]:
+    """Structure several chunks in one request, through the per-chunk cache.
+
+    Cached chunks are read as usual. A chunk the reply leaves out, or all of
+    them if the request fails, falls back to `extract_chunk`. If any of those
+    fail too, `ExtractionFailed` names their pages and carries the rest.
+    """
+    entries: list[Entry] = []
+    pending = []
+    failed: list[Page] = []
+
+    def one(body: str, page: Page) -> list[Entry]:
+        try:
+            return extract_chunk(body, page, limiter)
+        except ExtractionFailed:
+            failed.append(page)
+            return []
+
+    for body, page in jobs:
+        if is_cached(body):
+            entries += extract_chunk(body, page)
+        else:
+            pending.append((body, page))
+    if len(pending) < 2:
+        entries += [e for body, page in pending for e in one(body, page)]
+        if failed:
+            raise ExtractionFailed(failed, entries)
+        return entries
+
+    message = "\n\n".join(
+        f"[CHUNK {n}]\n{_source(body, page)}"
+        for n, (body, page) in enumerate(pending, 1)
+    )
+    replies: dict[int, list] = {}
+    try:
+        response = _invoke(
+            [("system", EXTRACTION_PROMPT + PACKED_PROMPT), ("user", message)],
+            limiter,
+        )
+        for item in json.loads(str(response.content)).get("chunks") or []:
+            if isinstance(item, dict) and isinstance(item.get("entries"), list):
+                replies[int(item.get("chunk", 0))] = item["entries"]
+    except Exception as exc:
+        logger.warning("Packed extraction failed for %d chunks: %s", len(pending), exc)
+    answered = sum(n in replies for n in range(1, len(pending) + 1))
+    PACK_STATS.add(len(pending), len(pending) - answered)
+
+    for n, (body, page) in enumerate(pending, 1):
+        if n not in replies:
+            entries += one(body, page)
+            continue
+        raw = _coerce({"entries": replies[n]})
+        _save(body, raw)
+        entries += [Entry(page=page, **item) for item in raw]
+    if failed:
+        raise ExtractionFailed(failed, entries)
+    return entries
+
+
 def passthrough_chunk(body: str, page: Page) -> list[Entry]:
     """`--no-llm` path: keep the chunk verbatim with page-level metadata."""
     return [
@@ -160,3 +441,6 @@ def passthrough_chunk(body: str, page: Page) -> list[Entry]:
             page=page,
         )
     ]
+
+
+CHUNKERS = {"chars": chunk, "tokens": chunk_tokens}
@@ -0,0 +1,301 @@
+"""Asyncio fetch engine: every host at its own pace, none waiting on another.
+
+The thread pool fetcher throttles with a per-host lock that it sleeps inside,
+so with the registry's long run of Wikipedia titles every worker ends up
+queued behind en.wikipedia.org while the other hosts sit idle, and a worker
+backing off a 429 is a worker lost to everyone.
+
+Here each host has a token bucket refilled every `HOST_INTERVAL[host]`
+seconds and its own lanes of workers, and only the HTTP request itself takes
+one of the shared connection slots. Waiting for a host's next token — or out
+a Retry-After it sent — holds up that host alone; the slots go FIFO to
+whichever host is ready, so no host starves another.
+
+Same results as `fetch()`: one `Page | None` per source, parsed by the same
+code (MediaWiki titles in `ExtractBatch`es), read from and written to the
+same `.cache/ingest/pages` cache, and revalidated the same way — a host's
+`RevisionBatch` goes first in its queue and queues the extracts it finds
+stale.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable
+from urllib.parse import urlparse
+
+import httpx
+
+from .fetch import (
+    BATCH_TITLES,
+    HOST_INTERVAL,
+    RETRIES,
+    RETRY_STATUSES,
+    TIMEOUT,
+    USER_AGENT,
+    ExtractBatch,
+    Page,
+    RevisionBatch,
+    conditional_headers,
+    load_cached,
+    mediawiki_batches,
+    read_web,
+    retry_delay,
+    settle,
+)
+from .sources import Source
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight across all hosts.
+CONCURRENCY = 16
+# Workers per host. Two keep a host's bucket busy while a slow response is
+# still arriving; more only queue on the bucket.
+PER_HOST = 2
+
+
+class TokenBucket:
+    """One token per `interval` seconds, holding at most `burst`."""
+
+    def __init__(self, interval: float, burst: int = 1):
+        self.interval = interval
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._not_before = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = max(0.0, now - self._updated)
+                self._tokens = min(self.burst, self._tokens + elapsed / self.interval)
+                self._updated = now
+                wait = max(
+                    self._not_before - now, (1 - self._tokens) * self.interval
+                )
+                if wait <= 0:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(wait)
+
+    def defer(self, delay: float) -> None:
+        """Hold the whole host back: a 429 speaks for every request to it."""
+        self._not_before = max(self._not_before, time.monotonic() + delay)
+        self._tokens = 0.0
+        self._updated = self._not_before
+
+
+def _host(source: Source) -> str:
+    return source.host if source.kind == "mediawiki" else urlparse(source.ref).netloc
+
+
+async def _get(
+    client: httpx.AsyncClient,
+    bucket: TokenBucket,
+    slots: asyncio.Semaphore,
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+) -> httpx.Response:
+    host = urlparse(url).netloc
+    for attempt in range(RETRIES):
+        await bucket.acquire()
+        async with slots:
+            response = await client.get(url, params=params, headers=headers)
+        if response.status_code not in RETRY_STATUSES:
+            return response
+
+        delay = retry_delay(response.headers, attempt)
+        logger.info(
+            "HTTP %s from %s, deferring the host %.0fs (%d/%d)",
+            response.status_code,
+            host,
+            delay,
+            attempt + 1,
+            RETRIES,
+        )
+        bucket.defer(delay)
+    return response
+
+
+async def _fetch_web(
+    client: httpx.AsyncClient,
+    bucket: TokenBucket,
+    slots: asyncio.Semaphore,
+    source: Source,
+    cached: Page | None = None,
+    engine: str = "soup",
+) -> Page | None:
+    try:
+        response = await _get(
+            client, bucket, slots, source.ref, headers=conditional_headers(cached)
+        )
+        # Parsing HTML is CPU work; off the loop, so other hosts keep going.
+        page = await asyncio.to_thread(
+            read_web,
+            source,
+            response.status_code,
+            response.headers,
+            response.text,
+            cached,
+            engine,
+        )
+    except Exception as exc:
+        logger.warning("Fetch failed for %s: %s", source.key, exc)
+        page = None
+    return settle(page, cached)
+
+
+async def _query(
+    client: httpx.AsyncClient,
+    bucket: TokenBucket,
+    slots: asyncio.Semaphore,
+    batch: ExtractBatch,
+) -> None:
+    params = batch.params()
+    while True:
+        response = await _get(client, bucket, slots, batch.url(), params)
+        response.raise_for_status()
+        continuation = batch.feed(response.json())
+        if continuation is None:
+            return
+        params = {**batch.params(), **continuation}
+
+
+async def fetch_all_async(
+    sources: list[Source],
+    refresh: bool = False,
+    concurrency: int = CONCURRENCY,
+    per_host: int = PER_HOST,
+    titles_per_query: int = BATCH_TITLES,
+    revalidate: bool = False,
+    on_page: Callable[[Page | None], None] | None = None,
+    engine: str = "soup",
+) -> list[Page | None]:
+    """`fetch()` for every source, in order, fetching hosts side by side.
+
+    MediaWiki sources go in `ExtractBatch`es, one host's titles at a time.
+    `on_page` sees each result as it lands, from a worker thread: if it
+    blocks, only the lane that fetched the page waits.
+    """
+    results: dict[str, Page | None] = {}
+
+    async def done(key: str, page: Page | None) -> None:
+        results[key] = page
+        if on_page is not None:
+            await asyncio.to_thread(on_page, page)
+
+    cached: dict[str, Page] = {}
+    pending: list[Source] = []
+    for source in sources:
+        page = None if refresh else load_cached(source)
+        if page is None:
+            pending.append(source)
+        elif revalidate:
+            cached[source.key] = page
+            pending.append(source)
+        else:
+            await done(source.key, page)
+
+    # Work per host: a batch of titles, or a single web page. Cached titles
+    # are checked first; extracts are fetched for those found stale.
+    queues: dict[str, deque[ExtractBatch | Source]] = {}
+    wiki = [s for s in pending if s.kind == "mediawiki"]
+    known = [s for s in wiki if s.key in cached]
+    for group in mediawiki_batches(known, BATCH_TITLES):
+        check = RevisionBatch(group, cached)
+        queues.setdefault(check.host, deque()).append(check)
+    fresh = [s for s in wiki if s.key not in cached]
+    for group in mediawiki_batches(fresh, titles_per_query):
+        queues.setdefault(group[0].host, deque()).append(ExtractBatch(group))
+    for source in pending:
+        if source.kind != "mediawiki":
+            queues.setdefault(_host(source), deque()).append(source)
+
+    if queues:
+        slots = asyncio.Semaphore(concurrency)
+        buckets = {host: TokenBucket(HOST_INTERVAL[host]) for host in queues}
+        async with httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "en,ig;q=0.8"},
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency),
+        ) as client:
+
+            async def lane(host: str) -> None:
+                queue = queues[host]
+                while queue:
+                    work = queue.popleft()
+                    if isinstance(work, RevisionBatch):
+                        try:
+                            await _query(client, buckets[host], slots, work)
+                            unchanged, stale = work.split()
+                        except Exception as exc:
+                            logger.warning(
+                                "Revision check failed for %s: %s",
+                                work.describe(),
+                                exc,
+                            )
+                            unchanged, stale = {}, work.sources
+                        for key, page in unchanged.items():
+                            await done(key, page)
+                        for group in mediawiki_batches(stale, titles_per_query):
+                            queue.append(ExtractBatch(group))
+                    elif isinstance(work, ExtractBatch):
+                        try:
+                            await _query(client, buckets[host], slots, work)
+                            found = work.pages()
+                        except Exception as exc:
+                            logger.warning(
+                                "Fetch failed for %s: %s", work.describe(), exc
+                            )
+                            found = {}
+                        for source in work.sources:
+                            page = settle(
+                                found.get(source.key), cached.get(source.key)
+                            )
+                            await done(source.key, page)
+                    else:
+                        page = await _fetch_web(
+                            client,
+                            buckets[host],
+                            slots,
+                            work,
+                            cached.get(work.key),
+                            engine,
+                        )
+                        await done(work.key, page)
+
+            await asyncio.gather(
+                *(lane(host) for host in queues for _ in range(per_host))
+            )
+    return [results.get(source.key) for source in sources]
+
+
+def fetch_many(
+    sources: list[Source],
+    refresh: bool = False,
+    concurrency: int = CONCURRENCY,
+    per_host: int = PER_HOST,
+    titles_per_query: int = BATCH_TITLES,
+    revalidate: bool = False,
+    on_page: Callable[[Page | None], None] | None = None,
+    engine: str = "soup",
+) -> list[Page | None]:
+    return asyncio.run(
+        fetch_all_async(
+            sources,
+            refresh,
+            concurrency,
+            per_host,
+            titles_per_query,
+            revalidate,
+            on_page,
+            engine,
+        )
+    )
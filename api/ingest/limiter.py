@@ -0,0 +1,139 @@
+"""Adaptive concurrency for the OpenAI calls ingestion makes.
+
+A fixed worker count is wrong in both directions: too low leaves the rate
+limit unused, too high draws 429s — and a chunk whose extraction failed used
+to be logged and dropped, silently shrinking the corpus. `AdaptiveLimiter`
+finds the level as it goes, AIMD-style, as TCP does:
+
+- every success raises the limit by 1/limit, about one more request in
+  flight per limit's worth of successes (additive increase);
+- a rate limit or timeout halves it (multiplicative decrease) — once per
+  episode: requests already in flight when it was cut do not cut it again;
+- the failed call waits out `Retry-After`, or an exponential backoff, and
+  is retried, up to RETRIES times.
+
+Errors that retrying cannot fix — a bad request, an unparseable reply — are
+raised at once. The limiter also keeps the run's requests and tokens per
+minute, for the progress log.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRIES = 6
+MAX_BACKOFF = 60.0
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def classify(exc: Exception) -> str:
+    """"rate" (back off and retry), "transient" (retry) or "fatal"."""
+    import openai
+
+    if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError)):
+        return "rate"
+    if isinstance(exc, (openai.APIConnectionError, openai.InternalServerError)):
+        return "transient"
+    return "fatal"
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str, maximum: int, minimum: int = 1):
+        self.name = name
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(max(self.minimum, self.maximum // 2))
+        self._in_flight = 0
+        self._cut_at = 0.0
+        self._ready = threading.Condition()
+
+        self.started = time.monotonic()
+        self.requests = 0
+        self.tokens = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _acquire(self) -> float:
+        with self._ready:
+            while self._in_flight >= int(self.limit):
+                self._ready.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def _release(self, started: float, outcome: str, tokens: int = 0) -> None:
+        with self._ready:
+            self._in_flight -= 1
+            if outcome == "ok":
+                self.requests += 1
+                self.tokens += tokens
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "rate":
+                self.rate_limited += 1
+                if started >= self._cut_at:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._cut_at = time.monotonic()
+                    logger.info(
+                        "%s: rate limited, limit now %.1f", self.name, self.limit
+                    )
+            self._ready.notify_all()
+
+    def call(self, fn: Callable[[], T], tokens: Callable[[T], int] | None = None) -> T:
+        """`fn()` in a slot, retried through rate limits and transient errors."""
+        for attempt in range(RETRIES):
+            started = self._acquire()
+            try:
+                result = fn()
+            except Exception as exc:
+                kind = classify(exc)
+                self._release(started, kind)
+                if kind == "fatal" or attempt == RETRIES - 1:
+                    with self._ready:
+                        self.failures += 1
+                    raise
+                delay = _retry_after(exc) or min(MAX_BACKOFF, 2.0 * 2**attempt)
+                with self._ready:
+                    self.retries += 1
+                logger.info(
+                    "%s: %s, retrying in %.0fs (%d/%d)",
+                    self.name,
+                    type(exc).__name__,
+                    delay,
+                    attempt + 1,
+                    RETRIES,
+                )
+                time.sleep(delay)
+                continue
+            self._release(started, "ok", tokens(result) if tokens else 0)
+            return result
+        raise AssertionError("unreachable")
+
+    def describe(self) -> str:
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        return (
+            f"{self.name} {self.requests / minutes:.0f} rpm "
+            f"{self.tokens / minutes:.0f} tpm, limit {self.limit:.1f}/{self.maximum}"
+            f" ({self.rate_limited} rate-limited, {self.retries} retries,"
+            f" {self.failures} failed)"
+        )
+
+
+def usage_tokens(message) -> int:
+    """Total tokens on a chat reply, from LangChain's usage metadata."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return int(usage.get("total_tokens", 0))
@@ -1,11 +1,20 @@
-"""Build documents from extracted entries and write them to Astra."""
+"""Build documents from extracted entries and write them to the vector store.
+
+The store is Astra by default; `--backend local` exports the same documents
+to an in-process index under LOCAL_INDEX_DIR instead (see `api.localstore`).
+Either way the vectors come from the on-disk `EmbeddingStore` (see
+`vectors.py`), so only text never embedded before costs an OpenAI call.
+"""
 
 from __future__ import annotations
 
 import hashlib
 import logging
+import threading
 
 from .extract import Entry
+from .limiter import AdaptiveLimiter
+from .vectors import VECTOR_CACHE_DIR, EmbeddingStore, PrecomputedEmbeddings
 
 logger = logging.getLogger(__name__)
 
@@ -29,15 +38,22 @@ def _embedding_text(entry: Entry) -> str:
     return "\n".join(parts)
 
 
-def to_documents(entries: list[Entry]) -> tuple[list, list[str]]:
-    """Documents plus deterministic ids, deduped on passage text.
+def doc_id(text: str) -> str:
+    """A passage's document id: a hash of its text."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:32]
+
+
+def to_documents(entries: list[Entry]) -> tuple[list, list[str], list[str]]:
+    """Documents, deterministic ids and source keys, deduped on passage text.
 
     Ids are content hashes so re-running the pipeline overwrites rather than
-    duplicating — the corpus can be grown incrementally.
+    duplicating — the corpus can be grown incrementally. The source key of
+    each document is what the manifest tracks it by. A passage standing in
+    for near-duplicates elsewhere lists every page in `source_urls`.
     """
     from langchain_core.documents import Document
 
-    documents, ids, seen = [], [], set()
+    documents, ids, keys, seen = [], [], [], set()
 
     for entry in entries:
         page = entry.page
@@ -45,42 +61,164 @@ def to_documents(entries: list[Entry]) -> tuple[list, list[str]]:
             continue
 
         content = _embedding_text(entry)
-        doc_id = hashlib.sha256(entry.text.strip().encode("utf-8")).hexdigest()[:32]
-        if doc_id in seen:
+        document_id = doc_id(entry.text)
+        if document_id in seen:
             continue
-        seen.add(doc_id)
-
-        documents.append(
-            Document(
-                page_content=content,
-                metadata={
-                    "work": page.title,
-                    "source_url": page.url,
-                    "domain": page.domain,
-                    "tag": page.tag,
-                    "kind": entry.kind,
-                    "topic": entry.topic,
-                    "summary": entry.summary,
-                    "igbo_terms": [t["term"] for t in entry.igbo_terms],
-                    "content_type": "igbo_corpus",
-                },
-            )
-        )
-        ids.append(doc_id)
+        seen.add(document_id)
+
+        metadata = {
+            "work": page.title,
+            "source_url": page.url,
+            "domain": page.domain,
+            "tag": page.tag,
+            "kind": entry.kind,
+            "topic": entry.topic,
+            "summary": entry.summary,
+            "igbo_terms": [t["term"] for t in entry.igbo_terms],
+            "content_type": "igbo_corpus",
+        }
+        if entry.also_from:
+            # Only on merged passages, so the rest keep their content hash.
+            urls = [page.url] + [other.url for other in entry.also_from]
+            metadata["source_urls"] = list(dict.fromkeys(urls))
+        documents.append(Document(page_content=content, metadata=metadata))
+        ids.append(document_id)
+        keys.append(page.key)
+
+    return documents, ids, keys
+
+
+class Writer:
+    """Writes documents to the store as they arrive, and finishes once.
+
+    Each `add` embeds (through the `EmbeddingStore`) and upserts one batch;
+    `finish` deletes, saves a local index, and folds the run's documents into
+    the BM25 index — the parts that should happen once per run, not per batch.
+    `add` may be called from several threads: they embed side by side, paced
+    by `limiter`, and take turns at the store.
+    """
 
-    return documents, ids
+    def __init__(
+        self,
+        collection: str | None = None,
+        backend: str | None = None,
+        limiter: AdaptiveLimiter | None = None,
+    ):
+        from api.config import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, get_vector_store
+        from api.localstore import LocalVectorStore
+
+        self.collection = collection
+        # create=True: ingestion is where the collection comes into existence.
+        self.store = get_vector_store(collection, create=True, backend=backend)
+        self.local = isinstance(self.store, LocalVectorStore)
+        self.vectors = EmbeddingStore(
+            VECTOR_CACHE_DIR, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+        )
+        self.limiter = limiter
+        # Paced by the limiter, embedding goes through a client that leaves
+        # rate limits to it, as extraction does.
+        if limiter is None:
+            self.embeddings = self.store.embedding
+        else:
+            from api.config import get_ingest_embeddings
+
+            self.embeddings = get_ingest_embeddings()
+        self.documents: list = []
+        self.ids: list[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, documents: list, ids: list[str]) -> int:
+        store = self.store
+        texts = [document.page_content for document in documents]
+        matrix = self.vectors.embed(texts, self.embeddings, self.limiter)
+
+        # The embedding swap below is per store, so writes take turns.
+        with self._lock:
+            # Astra embeds inside add_documents; have it embed from the matrix.
+            embedding = store.embedding
+            if not self.local:
+                store.embedding = PrecomputedEmbeddings(texts, matrix, embedding)
+            try:
+                for start in range(0, len(documents), BATCH):
+                    batch_docs = documents[start : start + BATCH]
+                    batch_ids = ids[start : start + BATCH]
+                    if self.local:
+                        batch_vectors = matrix[start : start + BATCH]
+                        store.add_vectors(batch_docs, batch_ids, batch_vectors)
+                    else:
+                        store.add_documents(batch_docs, ids=batch_ids)
+            finally:
+                store.embedding = embedding
+            self.documents += documents
+            self.ids += ids
+            logger.info("Wrote %d documents", len(self.ids))
+        return len(documents)
+
+    @property
+    def lexical_size(self) -> int:
+        """Documents in the collection's BM25 index on disk."""
+        from api.config import local_index_path
+        from api.lexical import LexicalIndex
+
+        return LexicalIndex.size(local_index_path(self.collection))
+
+    def finish(
+        self,
+        delete: list[str] | None = None,
+        lexical: tuple[list, list[str]] | None = None,
+    ) -> None:
+        """Delete, save, and update BM25 with what was added, or with `lexical`.
+
+        `lexical` is every document a run produced, unchanged ones included,
+        so that a BM25 index deleted or left short is refilled, not just
+        topped up with this run's writes.
+        """
+        store = self.store
+        logger.info("Vectors: %s", self.vectors.stats())
+        if delete:
+            for start in range(0, len(delete), BATCH):
+                store.delete(delete[start : start + BATCH])
+            logger.info("Deleted %d documents", len(delete))
+        if self.local:
+            store.save()
+            logger.info(
+                "Saved local index at %s (%d documents)", store.path, len(store)
+            )
+        documents, ids = lexical or (self.documents, self.ids)
+        write_lexical(documents, ids, self.collection, delete)
+
+
+def write(
+    documents: list,
+    ids: list[str],
+    collection: str | None = None,
+    backend: str | None = None,
+    delete: list[str] | None = None,
+) -> int:
+    """Upsert documents, and delete the ids in `delete`, in store and BM25."""
+    writer = Writer(collection, backend)
+    written = writer.add(documents, ids) if documents else 0
+    writer.finish(delete)
+    return written
 
 
-def write(documents: list, ids: list[str], collection: str | None = None) -> int:
-    from api.config import get_vector_store
+def write_lexical(
+    documents: list,
+    ids: list[str],
+    collection: str | None = None,
+    delete: list[str] | None = None,
+) -> None:
+    """Fold these documents into the collection's BM25 index.
 
-    # create=True: ingestion is where the collection is brought into existence.
-    store = get_vector_store(collection, create=True)
-    written = 0
-    for start in range(0, len(documents), BATCH):
-        batch_docs = documents[start : start + BATCH]
-        batch_ids = ids[start : start + BATCH]
-        store.add_documents(batch_docs, ids=batch_ids)
-        written += len(batch_docs)
-        logger.info("Wrote %d/%d documents", written, len(documents))
-    return written
+    Upserted rather than rebuilt from this run alone, so an `--only` run does
+    not drop every other tag from lexical retrieval.
+    """
+    from api.config import local_index_path
+    from api.lexical import LexicalIndex
+
+    index = LexicalIndex.open(local_index_path(collection))
+    index.update(documents, ids)
+    if delete:
+        index.delete(delete)
+    index.save()
+    logger.info("Saved BM25 index at %s (%d documents)", index.path, len(index))
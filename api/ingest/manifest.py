@@ -0,0 +1,256 @@
+"""What has been written where: the ingestion manifest.
+
+Without it every run re-upserts the whole corpus — every passage embedded
+again through OpenAI — and passages whose source text has gone stay in the
+collection forever. The manifest is a local SQLite file recording, for each
+target (backend and collection), every document written there: its id, the
+source it came from, a hash of what was written and the embedding model that
+wrote it. A run then diffs against it:
+
+    new        ids the target has never had             embed and write
+    changed    same id, different content or model      embed and write
+    unchanged  same id, same hash, same model           skip
+    orphans    ids no longer produced by their source   delete
+
+A source only orphans documents when this run actually processed it, so
+`--only`, `--limit` and `--revalidate` runs leave everything else alone; a
+source dropped from the registry orphans its documents on a full run. A page
+with a chunk that failed to extract is not processed, whatever else of it
+was: an outage never shrinks the collection.
+
+The manifest also records, per source, a hash of the page text that a
+writing run carried through to the target. `--revalidate` skips a page only
+when its text matches that record. A page the cache holds but no run has
+written, after a `--dry-run`, a `--batch` run or an interrupted run, is
+processed like a changed one.
+
+Last, it records the passages that were merged with near-duplicates (see
+`dedupe.py`), members merged away included, so that a later run holds back
+only those passages and streams the rest.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+MANIFEST_PATH = Path(".cache/ingest/manifest.sqlite3")
+
+
+def page_hash(text: str) -> str:
+    """Hash of a page's text, as recorded for the sources a run wrote."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def content_hash(document) -> str:
+    """Hash of everything a write sends: the embedded text and the metadata."""
+    metadata = json.dumps(document.metadata or {}, sort_keys=True, ensure_ascii=False)
+    payload = f"{document.page_content}\0{metadata}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+@dataclass
+class Delta:
+    """A run's documents against the manifest. Indices are into the run's list."""
+
+    new: list[int] = field(default_factory=list)
+    changed: list[int] = field(default_factory=list)
+    unchanged: list[int] = field(default_factory=list)
+    orphans: list[str] = field(default_factory=list)
+
+    @property
+    def writes(self) -> list[int]:
+        return sorted(self.new + self.changed)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.new)} new, {len(self.changed)} changed, "
+            f"{len(self.unchanged)} unchanged, {len(self.orphans)} orphaned"
+        )
+
+
+class Manifest:
+    def __init__(self, path: str | Path, target: str, model: str):
+        self.target = target
+        self.model = model
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " target TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " source_key TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " written REAL NOT NULL,"
+            " PRIMARY KEY (target, doc_id))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " target TEXT NOT NULL,"
+            " source_key TEXT NOT NULL,"
+            " page_hash TEXT NOT NULL,"
+            " written REAL NOT NULL,"
+            " PRIMARY KEY (target, source_key))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS clustered ("
+            " target TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " source_key TEXT NOT NULL,"
+            " PRIMARY KEY (target, doc_id))"
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM documents WHERE target = ?", (self.target,)
+        ).fetchone()[0]
+
+    def clear(self) -> None:
+        """Forget the target, so the next run writes everything."""
+        self._db.execute("DELETE FROM documents WHERE target = ?", (self.target,))
+        self._db.execute("DELETE FROM sources WHERE target = ?", (self.target,))
+        self._db.execute("DELETE FROM clustered WHERE target = ?", (self.target,))
+        self._db.commit()
+
+    def diff(
+        self,
+        documents: list,
+        ids: list[str],
+        scope: set[str],
+        registry: set[str] | None = None,
+    ) -> Delta:
+        """Compare a run's documents with what the target holds.
+
+        `scope` is the source keys this run processed; `registry`, on a run
+        over the whole registry, is every source key that still exists.
+        """
+        delta = self.classify(documents, ids)
+        delta.orphans = self.orphans(ids, scope, registry)
+        return delta
+
+    def classify(self, documents: list, ids: list[str]) -> Delta:
+        """New, changed and unchanged; a streaming run classifies per batch."""
+        known = {
+            doc_id: (text_hash, model)
+            for doc_id, text_hash, model in self._db.execute(
+                "SELECT doc_id, text_hash, model FROM documents WHERE target = ?",
+                (self.target,),
+            )
+        }
+        delta = Delta()
+        for i, (document, doc_id) in enumerate(zip(documents, ids)):
+            if doc_id not in known:
+                delta.new.append(i)
+            elif known[doc_id] != (content_hash(document), self.model):
+                delta.changed.append(i)
+            else:
+                delta.unchanged.append(i)
+        return delta
+
+    def orphans(
+        self, ids: list[str], scope: set[str], registry: set[str] | None = None
+    ) -> list[str]:
+        """Recorded ids that the run's sources no longer produce."""
+        current = set(ids)
+        return [
+            doc_id
+            for doc_id, source_key in self._db.execute(
+                "SELECT doc_id, source_key FROM documents WHERE target = ?",
+                (self.target,),
+            )
+            if doc_id not in current
+            and (
+                source_key in scope
+                or (registry is not None and source_key not in registry)
+            )
+        ]
+
+    def apply(
+        self, delta: Delta, documents: list, ids: list[str], keys: list[str]
+    ) -> None:
+        """Record a delta once the target has taken it."""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO documents"
+            " (target, doc_id, source_key, text_hash, model, written)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    self.target,
+                    ids[i],
+                    keys[i],
+                    content_hash(documents[i]),
+                    self.model,
+                    now,
+                )
+                for i in delta.writes
+            ],
+        )
+        # A passage shared by two sources may now be owned by the other one.
+        self._db.executemany(
+            "UPDATE documents SET source_key = ? WHERE target = ? AND doc_id = ?",
+            [(keys[i], self.target, ids[i]) for i in delta.unchanged],
+        )
+        self._db.executemany(
+            "DELETE FROM documents WHERE target = ? AND doc_id = ?",
+            [(self.target, doc_id) for doc_id in delta.orphans],
+        )
+        self._db.commit()
+
+    def written_pages(self) -> dict[str, str]:
+        """The page hash each source was last written from, by source key."""
+        return dict(
+            self._db.execute(
+                "SELECT source_key, page_hash FROM sources WHERE target = ?",
+                (self.target,),
+            )
+        )
+
+    def record_pages(self, hashes: dict[str, str]) -> None:
+        """Note the pages a run has carried through to the target."""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO sources (target, source_key, page_hash, written)"
+            " VALUES (?, ?, ?, ?)",
+            [(self.target, key, value, now) for key, value in hashes.items()],
+        )
+        self._db.commit()
+
+    def clustered(self) -> set[str]:
+        """Ids of passages a run merged with near-duplicates."""
+        return {
+            doc_id
+            for (doc_id,) in self._db.execute(
+                "SELECT doc_id FROM clustered WHERE target = ?", (self.target,)
+            )
+        }
+
+    def record_clusters(self, members: dict[str, str], scope: set[str]) -> None:
+        """Replace the clustered passages of the sources in `scope`.
+
+        `members` maps each clustered passage's id to its source key.
+        """
+        self._db.executemany(
+            "DELETE FROM clustered WHERE target = ? AND source_key = ?",
+            [(self.target, key) for key in scope],
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO clustered (target, doc_id, source_key)"
+            " VALUES (?, ?, ?)",
+            [
+                (self.target, doc_id, key)
+                for doc_id, key in members.items()
+                if key in scope
+            ],
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,455 @@
+"""Streaming ingestion: every stage working at once.
+
+Run as barriers — fetch everything, then extract everything, then write —
+ingestion takes the sum of its stages: no chunk reaches the model until the
+last Wikipedia title has trickled in at en.wikipedia.org's pace, and nothing
+is embedded until the last chunk is back. Here the stages are threads joined
+by bounded queues:
+
+    fetch ──pages──▶ chunk ──chunks──▶ extract ×N ──entries──▶ write
+                  QUEUE_PAGES      workers × CHUNKS_PER_WORKER   ENTRY_QUEUE
+
+A page is chunked as soon as it is fetched, each chunk is extracted by the
+first free worker, and entries are written in batches of `WRITE_BATCH`
+documents, each diffed against the manifest on its way and handed to one of
+`embed_workers` writers; up to two batches per writer are in flight before
+the write stage waits for the oldest. A full queue blocks
+the stage feeding it, so a slow model holds back chunking and fetching rather
+than piling pages up in memory. End to end, a run takes about as long as its
+slowest stage.
+
+With `dedupe`, entries pass through `NearDuplicates` on their way to the
+write stage. A passage that joins a cluster is held back, and so is one the
+manifest records as clustered by an earlier run. Once the stream has
+drained, each cluster that grew is written as its merged canonical passage,
+and the members written before it are orphaned.
+
+With `extract_many`, uncached chunks travel as packs of up to PACK_CHUNKS
+(see `extract.extract_packed`); a pack still open when pages stop arriving
+for PACK_WAIT seconds goes out as it is.
+
+A page whose chunking or extraction fails, including a chunk the model
+could not structure (`ExtractionFailed`), is logged and skipped, and kept
+out of the run's scope: its documents from earlier runs are not orphaned,
+and the next run tries it again.
+
+Progress is logged every `PROGRESS_SECONDS` with each stage's count, rate
+and queue depth; a stage that is always full downstream is the bottleneck.
+The `limiters` pacing the model calls are logged alongside, with the
+requests and tokens per minute they achieve.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+from .dedupe import NearDuplicates
+from .extract import (
+    PACK_CHARS,
+    PACK_CHUNKS,
+    Entry,
+    ExtractionFailed,
+    chunk,
+    is_cached,
+)
+from .fetch import Page
+from .limiter import AdaptiveLimiter
+from .load import Writer, to_documents
+from .manifest import Delta, Manifest, page_hash
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PAGES = 32
+CHUNKS_PER_WORKER = 4
+ENTRY_QUEUE = 64
+WRITE_BATCH = 200
+PROGRESS_SECONDS = 10.0
+PACK_WAIT = 2.0
+
+_DONE = object()
+
+
+class Throughput:
+    """Items through one stage, and its rate over the run so far."""
+
+    def __init__(self, name: str, unit: str, started: float):
+        self.name = name
+        self.unit = unit
+        self.started = started
+        self.count = 0
+        self.last = started
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1) -> None:
+        with self._lock:
+            self.count += n
+            self.last = time.monotonic()
+
+    def describe(self, backlog: queue.Queue | None = None) -> str:
+        elapsed = max(self.last - self.started, 1e-9)
+        text = f"{self.name} {self.count} {self.unit} ({self.count / elapsed:.1f}/s)"
+        if backlog is not None and backlog.maxsize:
+            text += f" [{backlog.qsize()}/{backlog.maxsize} queued]"
+        return text
+
+
+@dataclass
+class Outcome:
+    entries: list[Entry] = field(default_factory=list)
+    documents: list = field(default_factory=list)
+    ids: list[str] = field(default_factory=list)
+    keys: list[str] = field(default_factory=list)
+    delta: Delta = field(default_factory=Delta)
+    fetched: int = 0
+    unchanged: int = 0
+    written: int = 0
+    failed: int = 0
+
+
+class Pipeline:
+    def __init__(
+        self,
+        extract: Callable[[str, Page], list[Entry]],
+        workers: int,
+        manifest: Manifest,
+        writer: Writer | None,
+        skip_unchanged: bool = False,
+        extract_many: Callable[[list[tuple[str, Page]]], list[Entry]] | None = None,
+        embed_workers: int = 1,
+        limiters: Sequence[AdaptiveLimiter] = (),
+        chunker: Callable[[str], list[str]] = chunk,
+        dedupe: NearDuplicates | None = None,
+    ):
+        self.extract = extract
+        self.extract_many = extract_many
+        self.chunker = chunker
+        self.workers = max(1, workers)
+        self.manifest = manifest
+        # None for a dry run: classify against the manifest, write nothing.
+        self.writer = writer
+        self.skip_unchanged = skip_unchanged
+        # Read here: the manifest's connection belongs to this thread.
+        self.written_pages = manifest.written_pages() if skip_unchanged else {}
+        self.dedupe = dedupe
+        self.embed_workers = max(1, embed_workers)
+        self.limiters = list(limiters)
+        # Embedding and upserts run here; the manifest stays on the write stage.
+        self.pool = ThreadPoolExecutor(self.embed_workers, thread_name_prefix="embed")
+        self.writes: deque[tuple[Future, Delta, list, list[str], list[str]]] = deque()
+
+        self.pages: queue.Queue = queue.Queue(QUEUE_PAGES)
+        self.chunks: queue.Queue = queue.Queue(self.workers * CHUNKS_PER_WORKER)
+        self.entries: queue.Queue = queue.Queue(ENTRY_QUEUE)
+        self.scope: set[str] = set()
+        self.hashes: dict[str, str] = {}
+        # Pages a stage failed on: never orphaned, whatever else they made.
+        self.failed: set[str] = set()
+        self._failed_lock = threading.Lock()
+        self.outcome = Outcome()
+        # Position of each document id in the outcome, and how it classified.
+        self.index: dict[str, int] = {}
+        self.status: list[str] = []
+
+        self.started = time.monotonic()
+        self.fetched = Throughput("fetch", "pages", self.started)
+        self.chunked = Throughput("chunk", "chunks", self.started)
+        self.extracted = Throughput("extract", "chunks", self.started)
+        self.loaded = Throughput("load", "documents", self.started)
+
+    # --- Stages -------------------------------------------------------------
+
+    def _on_page(self, page: Page | None) -> None:
+        if page is None:
+            return
+        self.outcome.fetched += 1
+        self.fetched.add()
+        # Unchanged since the cache, and the cached text is what was written.
+        if (
+            self.skip_unchanged
+            and page.unchanged
+            and self.written_pages.get(page.key) == page_hash(page.text)
+        ):
+            self.outcome.unchanged += 1
+            return
+        self.pages.put(page)
+
+    def _fail(self, pages: Sequence[Page]) -> None:
+        with self._failed_lock:
+            self.failed.update(page.key for page in pages)
+
+    def _fetch(self, fetch: Callable[[Callable[[Page | None], None]], object]) -> None:
+        try:
+            fetch(self._on_page)
+        except Exception:
+            logger.exception("Fetch stage failed")
+        finally:
+            self.pages.put(_DONE)
+
+    def _chunk(self) -> None:
+        pack: list[tuple[str, Page]] = []
+
+        def flush() -> None:
+            if pack:
+                self.chunks.put(list(pack))
+                pack.clear()
+
+        page, done = None, False
+        try:
+            while True:
+                try:
+                    page = self.pages.get(timeout=PACK_WAIT if pack else None)
+                except queue.Empty:
+                    flush()
+                    continue
+                if page is _DONE:
+                    done = True
+                    break
+                self.scope.add(page.key)
+                self.hashes[page.key] = page_hash(page.text)
+                try:
+                    bodies = self.chunker(page.text)
+                except Exception:
+                    logger.exception("Chunking failed for %s", page.title)
+                    self._fail([page])
+                    continue
+                for body in bodies:
+                    self.chunked.add()
+                    if self.extract_many is None or is_cached(body):
+                        self.chunks.put((body, page))
+                        continue
+                    size = sum(len(packed) for packed, _ in pack) + len(body)
+                    if len(pack) >= PACK_CHUNKS or size > PACK_CHARS:
+                        flush()
+                    pack.append((body, page))
+            flush()
+        except Exception:
+            logger.exception("Chunk stage failed")
+            self._fail([queued for _, queued in pack])
+            # Keep draining, so fetching never blocks on a dead stage.
+            while not done:
+                self._fail([page] if page is not None else [])
+                done = (page := self.pages.get()) is _DONE
+        finally:
+            for _ in range(self.workers):
+                self.chunks.put(_DONE)
+
+    def _extract(self) -> None:
+        try:
+            while (job := self.chunks.get()) is not _DONE:
+                jobs = job if isinstance(job, list) else [job]
+                try:
+                    if isinstance(job, list):
+                        entries = self.extract_many(job)
+                    else:
+                        entries = self.extract(*job)
+                except ExtractionFailed as exc:
+                    # Logged where it failed; keep what the rest of a pack gave.
+                    self._fail(exc.pages)
+                    entries = exc.entries
+                except Exception:
+                    titles = ", ".join(sorted({page.title for _, page in jobs}))
+                    logger.exception("Extraction failed for %s", titles)
+                    self._fail([page for _, page in jobs])
+                    entries = []
+                self.entries.put(entries)
+                self.extracted.add(len(jobs))
+        finally:
+            self.entries.put(_DONE)
+
+    def _write(self, entries: list[Entry], revise: bool = False) -> None:
+        documents, ids, keys = to_documents(entries)
+        # to_documents dedupes within a batch; this dedupes across them,
+        # unless these are merged canonicals replacing what was written.
+        fresh = [
+            i for i, doc_id in enumerate(ids) if revise or doc_id not in self.index
+        ]
+        documents = [documents[i] for i in fresh]
+        ids = [ids[i] for i in fresh]
+        keys = [keys[i] for i in fresh]
+
+        delta = self.manifest.classify(documents, ids)
+        status = {i: "new" for i in delta.new}
+        status.update({i: "changed" for i in delta.changed})
+        outcome = self.outcome
+        for i, doc_id in enumerate(ids):
+            position = self.index.get(doc_id)
+            if position is None:
+                self.index[doc_id] = len(outcome.ids)
+                outcome.documents.append(documents[i])
+                outcome.ids.append(doc_id)
+                outcome.keys.append(keys[i])
+                self.status.append(status.get(i, "unchanged"))
+                continue
+            outcome.documents[position] = documents[i]
+            outcome.keys[position] = keys[i]
+            if self.status[position] != "new":
+                self.status[position] = status.get(i, "unchanged")
+
+        if self.writer is None:
+            self.loaded.add(len(documents))
+            return
+        writes = delta.writes
+        if writes:
+            future = self.pool.submit(
+                self.writer.add,
+                [documents[i] for i in writes],
+                [ids[i] for i in writes],
+            )
+        else:
+            future = Future()
+            future.set_result(0)
+        self.writes.append((future, delta, documents, ids, keys))
+        self._settle(2 * self.embed_workers)
+
+    def _settle(self, outstanding: int = 0) -> None:
+        """Record finished writes in the manifest, down to `outstanding`."""
+        while self.writes and (
+            len(self.writes) > outstanding or self.writes[0][0].done()
+        ):
+            future, delta, documents, ids, keys = self.writes.popleft()
+            # A failed write raises here and stops the run, as it always has.
+            self.outcome.written += future.result()
+            self.manifest.apply(delta, documents, ids, keys)
+            self.loaded.add(len(documents))
+
+    def _tally(self, superseded: set[str]) -> Outcome:
+        """The outcome without superseded documents, and its total delta.
+
+        Superseded documents were written before their cluster grew; left
+        out of the outcome's ids, they are orphaned like any other.
+        """
+        outcome = self.outcome
+        keep = [i for i, doc_id in enumerate(outcome.ids) if doc_id not in superseded]
+        outcome.documents = [outcome.documents[i] for i in keep]
+        outcome.ids = [outcome.ids[i] for i in keep]
+        outcome.keys = [outcome.keys[i] for i in keep]
+        status = [self.status[i] for i in keep]
+        outcome.delta = Delta(
+            new=[i for i, s in enumerate(status) if s == "new"],
+            changed=[i for i, s in enumerate(status) if s == "changed"],
+            unchanged=[i for i, s in enumerate(status) if s == "unchanged"],
+        )
+        return outcome
+
+    # --- Run ----------------------------------------------------------------
+
+    def _progress(self, stop: threading.Event) -> None:
+        while not stop.wait(PROGRESS_SECONDS):
+            logger.info(
+                "%s | %s | %s | %s",
+                self.fetched.describe(self.pages),
+                self.chunked.describe(self.chunks),
+                self.extracted.describe(self.entries),
+                self.loaded.describe(),
+            )
+            for limiter in self.limiters:
+                if limiter.requests or limiter.retries:
+                    logger.info("  %s", limiter.describe())
+
+    def run(
+        self,
+        fetch: Callable[[Callable[[Page | None], None]], object],
+        registry: set[str] | None = None,
+    ) -> Outcome:
+        """Stream everything `fetch` delivers through to the store.
+
+        `fetch` is called with the callback to hand each page to. Orphans
+        are settled once every stage has drained, against the sources that
+        actually came through.
+        """
+        started = self.started
+        stop = threading.Event()
+        # Daemons: if the write stage fails, nothing is left blocked on a queue.
+        threads = [
+            threading.Thread(target=self._fetch, args=(fetch,), daemon=True),
+            threading.Thread(target=self._chunk, daemon=True),
+        ] + [
+            threading.Thread(target=self._extract, daemon=True)
+            for _ in range(self.workers)
+        ]
+        threads.append(
+            threading.Thread(target=self._progress, args=(stop,), daemon=True)
+        )
+        for thread in threads:
+            thread.start()
+
+        # The write stage runs here: the manifest's connection is this thread's.
+        batch: list[Entry] = []
+        pending_docs, finished, superseded = 0, 0, set()
+        # Passages clustered last time wait for their clusters; see dedupe.py.
+        hold = self.manifest.clustered() if self.dedupe is not None else set()
+        try:
+            while finished < self.workers:
+                entries = self.entries.get()
+                if entries is _DONE:
+                    finished += 1
+                    continue
+                self.outcome.entries += entries
+                if self.dedupe is not None:
+                    entries = self.dedupe.add(entries, hold)
+                batch += entries
+                pending_docs += len(entries)
+                if pending_docs >= WRITE_BATCH:
+                    self._write(batch)
+                    batch, pending_docs = [], 0
+            if batch:
+                self._write(batch)
+            if self.dedupe is not None:
+                revised, superseded = self.dedupe.finish()
+                for start in range(0, len(revised), WRITE_BATCH):
+                    self._write(revised[start : start + WRITE_BATCH], revise=True)
+            self._settle()
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+        stop.set()
+        for thread in threads[:-1]:
+            thread.join()
+
+        outcome = self._tally(superseded)
+        outcome.failed = len(self.failed)
+        if self.failed:
+            logger.warning(
+                "%d pages failed; their stored documents are kept", len(self.failed)
+            )
+        scope = self.scope - self.failed
+        outcome.delta.orphans = self.manifest.orphans(outcome.ids, scope, registry)
+        # BM25 sits beside the store, not in it, and can be lost on its own.
+        # Short of what the manifest records, it is refilled from every
+        # document the run produced, not just the ones it wrote.
+        short = self.writer is not None and (
+            self.writer.lexical_size < len(self.manifest)
+        )
+        if self.writer is not None and (
+            outcome.written or outcome.delta.orphans or short
+        ):
+            self.writer.finish(
+                outcome.delta.orphans, (outcome.documents, outcome.ids)
+            )
+            self.manifest.apply(Delta(orphans=outcome.delta.orphans), [], [], [])
+            if self.writer.lexical_size < len(self.manifest):
+                logger.warning(
+                    "BM25 index holds %d of %d documents; a run without "
+                    "--only, --limit or --revalidate indexes the rest.",
+                    self.writer.lexical_size,
+                    len(self.manifest),
+                )
+        if self.writer is not None:
+            self.manifest.record_pages({key: self.hashes[key] for key in scope})
+            if self.dedupe is not None:
+                self.manifest.record_clusters(self.dedupe.clustered(), scope)
+
+        logger.info("--- stages (%.1fs) ---", time.monotonic() - started)
+        for stage in (self.fetched, self.chunked, self.extracted, self.loaded):
+            logger.info("  %s, last at %.1fs", stage.describe(), stage.last - started)
+        for limiter in self.limiters:
+            if limiter.requests or limiter.retries:
+                logger.info("  %s", limiter.describe())
+        return outcome
@@ -0,0 +1,193 @@
+"""Document vectors, kept on disk by content hash.
+
+Embedding used to happen inside the store's `add_documents`, so rebuilding a
+collection, or exporting the corpus to another backend, paid OpenAI for every
+vector again. `EmbeddingStore` keeps every document vector ingestion has
+computed, one directory per embedding model and width:
+
+    vectors.f32   float32 rows, appended in order, memory-mapped for reads
+    keys.txt      one sha256 of the embedded text per line, same order
+
+Lookups are by hash of the exact text embedded; misses are embedded with
+`embed_documents` in batches of `EMBED_BATCH` and appended. Keys are written
+after their rows, so an interrupted append loses at most those rows. Several
+writers may embed at once: the API calls run side by side, through the
+`AdaptiveLimiter` when given one, and only the lookups and appends take the
+store's lock.
+
+The vectors then reach the store already computed: `LocalVectorStore` takes
+them through `add_vectors`, and Astra through `PrecomputedEmbeddings`, an
+embeddings client that answers from them and only falls back to the real one
+for a text it has not seen.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .limiter import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+VECTOR_CACHE_DIR = Path(".cache/ingest/vectors")
+# Texts per embed_documents call. Passages run to a few hundred tokens, which
+# keeps a full batch well inside the API's per-request token limit.
+EMBED_BATCH = 512
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class EmbeddingStore:
+    def __init__(self, directory: str | Path, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+        safe = model.replace("/", "_").replace(":", "_")
+        self.path = Path(directory) / f"{safe}-{dimensions}"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.path / "vectors.f32"
+        self._keys_path = self.path / "keys.txt"
+        self._vectors_path.touch()
+        self._keys_path.touch()
+
+        keys = self._keys_path.read_text(encoding="ascii").split()
+        row_bytes = 4 * dimensions
+        complete = self._vectors_path.stat().st_size // row_bytes
+        if complete < len(keys):
+            logger.warning("Embedding store at %s was cut short", self.path)
+            keys = keys[:complete]
+            self._keys_path.write_text(
+                "".join(f"{key}\n" for key in keys), encoding="ascii"
+            )
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._count = len(keys)
+        self._matrix = self._map()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _map(self) -> np.ndarray:
+        if self._count == 0:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(self._count, self.dimensions),
+        )
+
+    def _append(self, keys: list[str], matrix: np.ndarray) -> None:
+        # Another writer may have embedded the same text meanwhile.
+        fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+        if not fresh:
+            return
+        keys, matrix = [keys[i] for i in fresh], matrix[fresh]
+        # Rows past the last key (an interrupted append) are overwritten.
+        with open(self._vectors_path, "r+b") as handle:
+            handle.seek(self._count * 4 * self.dimensions)
+            handle.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            handle.truncate()
+        with open(self._keys_path, "a", encoding="ascii") as handle:
+            handle.write("".join(f"{key}\n" for key in keys))
+        for key in keys:
+            self._rows[key] = self._count
+            self._count += 1
+        self._matrix = self._map()
+
+    def embed(
+        self,
+        texts: list[str],
+        embeddings: Embeddings,
+        limiter: AdaptiveLimiter | None = None,
+    ) -> np.ndarray:
+        """Vectors for `texts`, (len(texts), dimensions): stored, or embedded."""
+        keys = [text_key(text) for text in texts]
+        missing: dict[str, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key not in self._rows:
+                    missing.setdefault(key, text)
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), EMBED_BATCH):
+            batch = pending[start : start + EMBED_BATCH]
+            inputs = [text for _, text in batch]
+            started = time.perf_counter()
+            if limiter is None:
+                vectors = embeddings.embed_documents(inputs)
+            else:
+                # No usage on embedding replies: about four characters a token.
+                size = sum(len(text) for text in inputs) // 4
+                vectors = limiter.call(
+                    lambda: embeddings.embed_documents(inputs), lambda _: size
+                )
+            matrix = np.asarray(vectors, dtype=np.float32)
+            if matrix.shape != (len(batch), self.dimensions):
+                raise ValueError(
+                    f"Embedded {matrix.shape} for {len(batch)} texts "
+                    f"at {self.dimensions}d"
+                )
+            with self._lock:
+                self.calls += 1
+                self._append([key for key, _ in batch], matrix)
+            logger.info(
+                "Embedded %d/%d new texts in %.1fs",
+                min(start + EMBED_BATCH, len(pending)),
+                len(pending),
+                time.perf_counter() - started,
+            )
+
+        if not keys:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        with self._lock:
+            return np.asarray(self._matrix[[self._rows[key] for key in keys]])
+
+    def stats(self) -> str:
+        return (
+            f"{self.hits} stored, {self.misses} embedded in {self.calls} calls, "
+            f"{len(self)} in {self.path}"
+        )
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Embeddings that hand back vectors computed ahead of time.
+
+    For stores that embed inside `add_documents`: installed as the store's
+    embedding for the write, it answers every text it was given vectors for,
+    and passes anything else to `fallback`.
+    """
+
+    def __init__(self, texts: list[str], matrix: np.ndarray, fallback: Embeddings):
+        self._rows = {text: row for row, text in enumerate(texts)}
+        self._matrix = matrix
+        self.fallback = fallback
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        missing = [text for text in texts if text not in self._rows]
+        computed = {}
+        if missing:
+            computed = dict(zip(missing, self.fallback.embed_documents(missing)))
+        return [
+            self._matrix[self._rows[text]].tolist()
+            if text in self._rows
+            else computed[text]
+            for text in texts
+        ]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.fallback.embed_query(text)
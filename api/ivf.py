@@ -0,0 +1,144 @@
+"""Inverted-file (IVF) approximate search for the local index.
+
+A brute-force scan is fine for today's few thousand passages, but book-length
+sources will push the matrix past what one request should touch. IVF splits
+the vectors into `nlist` clusters with spherical k-means; a search scores the
+centroids, scans only the `nprobe` nearest clusters exactly, and takes the top
+k from those candidates. `nprobe` is the recall knob: nprobe == nlist is exact.
+
+State is two arrays — the centroids and each row's cluster — saved next to the
+index as `ivf.npz`. New rows are assigned to their nearest centroid as they are
+added, so incremental ingestion never needs a retrain; `needs_training` says
+when the corpus has outgrown the clustering it was trained on.
+"""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import numpy as np
+
+# k-means sees at most this many rows per cluster; beyond that the centroids
+# stop moving and training time just grows.
+TRAIN_ROWS_PER_LIST = 256
+TRAIN_ITERATIONS = 20
+# Retrain once the corpus has grown this much past the training set.
+RETRAIN_GROWTH = 2.0
+
+
+def default_nlist(count: int) -> int:
+    return max(1, min(count, int(4 * math.sqrt(count))))
+
+
+class IVFIndex:
+    def __init__(
+        self, centroids: np.ndarray, assignments: np.ndarray, trained_on: int
+    ):
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.assignments = assignments.astype(np.int32, copy=False)
+        self.trained_on = trained_on
+        self._lists: tuple[np.ndarray, np.ndarray] | None = None
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    # --- Build --------------------------------------------------------------
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = 0, seed: int = 0) -> "IVFIndex":
+        """Spherical k-means over (a sample of) normalized `vectors`."""
+        count = vectors.shape[0]
+        nlist = min(nlist or default_nlist(count), count)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(count, nlist * TRAIN_ROWS_PER_LIST)
+        sample = np.asarray(vectors[rng.choice(count, sample_size, replace=False)])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(TRAIN_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            sizes = np.bincount(labels, minlength=nlist)
+            empty = sizes == 0
+            # Only non-empty clusters: their starts are distinct and in range,
+            # so each slice runs exactly to the next cluster's first row.
+            starts = (np.cumsum(sizes) - sizes)[~empty]
+            sums = np.zeros((nlist, sample.shape[1]), dtype=np.float32)
+            sums[~empty] = np.add.reduceat(sample[order], starts, axis=0)
+            # An empty cluster restarts on a random point rather than dying.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        index = cls(centroids, np.empty(0, dtype=np.int32), trained_on=count)
+        index.assignments = index.assign(vectors)
+        return index
+
+    def assign(self, vectors: np.ndarray, batch: int = 8192) -> np.ndarray:
+        """Nearest centroid for each row, in batches to bound memory."""
+        labels = [
+            np.argmax(np.asarray(vectors[start : start + batch]) @ self.centroids.T, 1)
+            for start in range(0, vectors.shape[0], batch)
+        ]
+        if not labels:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate(labels).astype(np.int32)
+
+    def update(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """(Re)assign `rows`, which may extend past the current end."""
+        if len(rows) == 0:
+            return
+        labels = self.assign(vectors)
+        size = max(len(self.assignments), int(rows.max()) + 1)
+        if size > len(self.assignments):
+            grown = np.full(size, -1, dtype=np.int32)
+            grown[: len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.assignments[rows] = labels
+        self._lists = None
+
+    def needs_training(self, count: int) -> bool:
+        return count > self.trained_on * RETRAIN_GROWTH
+
+    # --- Search -------------------------------------------------------------
+
+    def _inverted(self) -> tuple[np.ndarray, np.ndarray]:
+        """Rows grouped by cluster (CSR style): order, and each list's offsets."""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+            counts = np.bincount(self.assignments, minlength=self.nlist)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            self._lists = (order, offsets)
+        return self._lists
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the `nprobe` clusters nearest to a normalized query."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probes = np.argpartition(scores, -nprobe)[-nprobe:]
+        else:
+            probes = np.arange(self.nlist)
+        order, offsets = self._inverted()
+        return np.concatenate([order[offsets[p] : offsets[p + 1]] for p in probes])
+
+    # --- Persistence --------------------------------------------------------
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "wb") as handle:
+            np.savez(
+                handle,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                trained_on=np.int64(self.trained_on),
+            )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"], data["assignments"], int(data["trained_on"])
+            )
@@ -0,0 +1,231 @@
+"""BM25 lexical index, fused with vector search in `retrieve()`.
+
+A question that is just an Igbo word ("Mmanwụ?", "ọfọ") embeds poorly — the
+embedding model has seen little Igbo — but it is exactly the case a lexical
+match handles well. This is a small BM25 index built at ingest time over the
+passage text and its `igbo_terms`.
+
+Tokens are indexed twice when they carry diacritics: as written ("ọfọ") and
+folded ("ofo"). A query is tokenized the same way, so someone typing without
+dots still lands on the dotted word, while someone typing with them scores
+higher on the exact form.
+
+On disk, next to the local index for the collection:
+
+    bm25.npz             postings as CSR arrays: per-term offsets into
+                         (doc row uint32, precomputed BM25 weight float32)
+    bm25.json            vocabulary, in term-id order
+    bm25_docs.jsonl      the documents themselves, so lexical-only hits can
+                         be returned whatever the vector backend is
+
+Weights are final BM25 contributions, so a search is a handful of NumPy
+scatter-adds and one `argpartition` — well under a millisecond.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Glossary terms are what a bare-word question is looking for; they count
+# as if they appeared this many extra times in the passage.
+TERM_BOOST = 2
+# Reciprocal rank fusion constant; 60 is the value from the original paper.
+RRF_K = 60
+
+# Word characters plus combining marks, so tone marks stay inside the token.
+_TOKEN = re.compile(r"[\w\u0300-\u036f]+")
+
+
+def fold(token: str) -> str:
+    """Strip diacritics: "ọjị" -> "oji", "mmanwụ" -> "mmanwu"."""
+    decomposed = unicodedata.normalize("NFD", token)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens, each followed by its folded form if different."""
+    tokens = []
+    for token in _TOKEN.findall(unicodedata.normalize("NFC", text).casefold()):
+        tokens.append(token)
+        folded = fold(token)
+        if folded != token:
+            tokens.append(folded)
+    return tokens
+
+
+def rrf(rankings: list[list], key, k: int) -> list:
+    """Reciprocal rank fusion of several ranked lists, best first."""
+    scores: dict = {}
+    items: dict = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            items.setdefault(item_key, item)
+    best = sorted(scores, key=scores.get, reverse=True)
+    return [items[item_key] for item_key in best[:k]]
+
+
+class LexicalIndex:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._records: list[dict] = []
+        self._vocab: dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.uint32)
+        self._weights = np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LexicalIndex":
+        index = cls(path)
+        with np.load(index.path / "bm25.npz") as data:
+            index._offsets = data["offsets"]
+            index._postings = data["postings"]
+            index._weights = data["weights"]
+        terms = json.loads((index.path / "bm25.json").read_text(encoding="utf-8"))
+        index._vocab = {term: i for i, term in enumerate(terms)}
+        with open(index.path / "bm25_docs.jsonl", encoding="utf-8") as handle:
+            index._records = [json.loads(line) for line in handle]
+        return index
+
+    @staticmethod
+    def size(path: str | Path) -> int:
+        """Documents in the index at `path`, without loading it; 0 if none."""
+        if not (Path(path) / "bm25.json").exists():
+            return 0
+        with open(Path(path) / "bm25_docs.jsonl", "rb") as handle:
+            return sum(1 for _ in handle)
+
+    @classmethod
+    def open(cls, path: str | Path) -> "LexicalIndex":
+        """Load the index at `path` for updating, or start an empty one."""
+        if (Path(path) / "bm25.json").exists():
+            return cls.load(path)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # --- Build --------------------------------------------------------------
+
+    def update(self, documents: list, ids: list[str]) -> None:
+        """Upsert documents. Call `save()` to rebuild postings and persist."""
+        rows = {record["id"]: row for row, record in enumerate(self._records)}
+        for document, doc_id in zip(documents, ids):
+            record = {
+                "id": doc_id,
+                "page_content": document.page_content,
+                "metadata": dict(document.metadata or {}),
+            }
+            if doc_id in rows:
+                self._records[rows[doc_id]] = record
+            else:
+                rows[doc_id] = len(self._records)
+                self._records.append(record)
+
+    def delete(self, ids: list[str]) -> None:
+        doomed = set(ids)
+        self._records = [r for r in self._records if r["id"] not in doomed]
+
+    @staticmethod
+    def _document_tokens(record: dict) -> list[str]:
+        tokens = tokenize(record["page_content"])
+        for term in record["metadata"].get("igbo_terms") or []:
+            tokens.extend(tokenize(str(term)) * TERM_BOOST)
+        return tokens
+
+    def _build(self) -> None:
+        counts = [Counter(self._document_tokens(r)) for r in self._records]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) else 1.0
+
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for row, counter in enumerate(counts):
+            for term, tf in counter.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        terms = sorted(postings)
+        total = len(self._records)
+        offsets, rows, weights = [0], [], []
+        for term in terms:
+            entries = postings[term]
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            for row, tf in entries:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[row] / average)
+                rows.append(row)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+            offsets.append(len(rows))
+
+        self._vocab = {term: i for i, term in enumerate(terms)}
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._postings = np.asarray(rows, dtype=np.uint32)
+        self._weights = np.asarray(weights, dtype=np.float32)
+
+    def save(self) -> None:
+        self._build()
+        self.path.mkdir(parents=True, exist_ok=True)
+        staged = {
+            name: self.path / f"{name}.tmp"
+            for name in ("bm25.npz", "bm25.json", "bm25_docs.jsonl")
+        }
+        with open(staged["bm25.npz"], "wb") as handle:
+            np.savez(
+                handle,
+                offsets=self._offsets,
+                postings=self._postings,
+                weights=self._weights,
+            )
+        terms = sorted(self._vocab, key=self._vocab.get)
+        staged["bm25.json"].write_text(
+            json.dumps(terms, ensure_ascii=False), encoding="utf-8"
+        )
+        with open(staged["bm25_docs.jsonl"], "w", encoding="utf-8") as handle:
+            for record in self._records:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # bm25.json last: its presence is what marks the index loadable.
+        for name in ("bm25.npz", "bm25_docs.jsonl", "bm25.json"):
+            os.replace(staged[name], self.path / name)
+
+    # --- Search -------------------------------------------------------------
+
+    def search(self, query: str, k: int) -> list:
+        """Top-k documents by BM25, best first. Empty when nothing matches."""
+        from langchain_core.documents import Document
+
+        term_ids = {self._vocab[t] for t in tokenize(query) if t in self._vocab}
+        if not term_ids or not self._records:
+            return []
+
+        scores = np.zeros(len(self._records), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            # Rows are unique within one posting list, so plain fancy-index
+            # addition is safe here.
+            scores[self._postings[start:end]] += self._weights[start:end]
+
+        hits = int(np.count_nonzero(scores))
+        k = min(k, hits)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        documents = []
+        for row in top:
+            record = self._records[int(row)]
+            documents.append(
+                Document(
+                    id=record["id"],
+                    page_content=record["page_content"],
+                    metadata=dict(record["metadata"]),
+                )
+            )
+        return documents
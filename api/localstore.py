@@ -0,0 +1,284 @@
+"""An in-process vector index, as an alternative to Astra.
+
+The corpus is a few thousand passages, small enough that a brute-force scan
+over a float32 matrix beats any network round trip. An index is a directory:
+
+    vectors.npy      float32 (n, dimensions), rows L2-normalized
+    documents.jsonl  one {"id", "page_content", "metadata"} per row, same order
+    meta.json        embedding model and dimensions the vectors were built with
+
+The serving path memory-maps `vectors.npy`, so a cold start reads only the
+pages a search touches. Search is one matrix-vector product and an
+`argpartition` for the top k. Results are ordinary LangChain `Document`s,
+exactly as the Astra store returns them.
+
+Ingestion writes here through the same `add_documents(documents, ids=...)`
+call it uses for Astra, then `save()`s once at the end. Writes go into a
+buffer that doubles as it fills, so a build in batches copies each row a
+constant number of times rather than once per batch.
+
+With `ann="ivf"` the scan is restricted to the nearest clusters of an
+`api.ivf.IVFIndex` saved alongside as `ivf.npz`; `nprobe` trades recall for
+latency. Without it, or when the IVF file is stale, search is exact.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from api.ivf import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+
+class LocalIndexError(RuntimeError):
+    """The index on disk is missing or was built for another embedding model."""
+
+
+def _normalized(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class LocalVectorStore:
+    def __init__(
+        self,
+        path: str | Path,
+        embedding,
+        model: str,
+        dimensions: int,
+        ann: str = "",
+        nlist: int = 0,
+        nprobe: int = 8,
+    ):
+        self.path = Path(path)
+        self.embedding = embedding
+        self.model = model
+        self.dimensions = dimensions
+        self.ann = ann
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf: IVFIndex | None = None
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        # Writable rows with spare capacity; `_vectors` is its filled part.
+        self._buffer: np.ndarray | None = None
+        self._records: list[dict] = []
+        self._rows: dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str | Path, embedding, model: str, dimensions: int, **options):
+        store = cls(path, embedding, model, dimensions, **options)
+        meta_path = store.path / "meta.json"
+        if not meta_path.exists():
+            raise LocalIndexError(
+                f"No local index at {store.path}. Build one with "
+                "`python3 -m api.ingest --backend local`."
+            )
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if (meta.get("model"), meta.get("dimensions")) != (model, dimensions):
+            raise LocalIndexError(
+                f"Index at {store.path} was built with {meta.get('model')} "
+                f"({meta.get('dimensions')}d), not {model} ({dimensions}d). "
+                "Rebuild it."
+            )
+
+        store._vectors = np.load(store.path / "vectors.npy", mmap_mode="r")
+        with open(store.path / "documents.jsonl", encoding="utf-8") as handle:
+            store._records = [json.loads(line) for line in handle]
+        if len(store._records) != store._vectors.shape[0]:
+            raise LocalIndexError(f"Index at {store.path} is inconsistent; rebuild it.")
+        store._rows = {record["id"]: row for row, record in enumerate(store._records)}
+
+        ivf_path = store.path / "ivf.npz"
+        if store.ann == "ivf" and ivf_path.exists():
+            ivf = IVFIndex.load(ivf_path)
+            if len(ivf.assignments) == len(store._records):
+                store.ivf = ivf
+            else:
+                logger.warning("Stale IVF index at %s; searching exactly", ivf_path)
+        return store
+
+    @classmethod
+    def open(cls, path: str | Path, embedding, model: str, dimensions: int, **options):
+        """Load the index at `path`, or start an empty one for writing."""
+        if (Path(path) / "meta.json").exists():
+            return cls.load(path, embedding, model, dimensions, **options)
+        return cls(path, embedding, model, dimensions, **options)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # --- Read ---------------------------------------------------------------
+
+    def _document(self, row: int):
+        from langchain_core.documents import Document
+
+        record = self._records[row]
+        return Document(
+            id=record["id"],
+            page_content=record["page_content"],
+            metadata=dict(record["metadata"]),
+        )
+
+    def _top_k(self, vector, k: int) -> tuple[np.ndarray, np.ndarray]:
+        count = len(self._records)
+        if count == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalized(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        if self.ivf is not None:
+            candidates = np.sort(self.ivf.candidates(query, self.nprobe))
+            scores = self._vectors[candidates] @ query
+        else:
+            candidates = None
+            scores = self._vectors @ query
+
+        if k < len(scores):
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        rows = candidates[top] if candidates is not None else top
+        return rows, scores[top]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4) -> list:
+        rows, scores = self._top_k(embedding, k)
+        return [
+            (self._document(int(row)), float(score)) for row, score in zip(rows, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4) -> list:
+        rows, _ = self._top_k(embedding, k)
+        return [self._document(int(row)) for row in rows]
+
+    def similarity_search_with_embedding_by_vector(
+        self, embedding, k: int = 4
+    ) -> list:
+        """(document, stored vector) pairs, as Astra's store returns them."""
+        rows, _ = self._top_k(embedding, k)
+        vectors = np.asarray(self._vectors[rows])
+        return [(self._document(int(row)), vectors[i]) for i, row in enumerate(rows)]
+
+    def similarity_search(self, query: str, k: int = 4) -> list:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    async def asimilarity_search_by_vector(self, embedding, k: int = 4) -> list:
+        # A scan of an in-memory matrix: over before a thread hop would be.
+        return self.similarity_search_by_vector(embedding, k)
+
+    async def asimilarity_search_with_embedding_by_vector(
+        self, embedding, k: int = 4
+    ) -> list:
+        return self.similarity_search_with_embedding_by_vector(embedding, k)
+
+    # --- Write --------------------------------------------------------------
+
+    def add_documents(self, documents: list, ids: list[str] | None = None) -> list[str]:
+        """Embed and upsert, in memory. Call `save()` to persist."""
+        if ids is None:
+            ids = [document.id for document in documents]
+        vectors = self.embedding.embed_documents(
+            [document.page_content for document in documents]
+        )
+        return self.add_vectors(documents, ids, vectors)
+
+    def add_vectors(self, documents: list, ids: list[str], vectors) -> list[str]:
+        """Upsert documents whose vectors are already computed."""
+        if not documents:
+            return []
+        matrix = _normalized(np.asarray(vectors, dtype=np.float32))
+        if matrix.shape[1:] != (self.dimensions,):
+            raise LocalIndexError(
+                f"Got {matrix.shape[1]}d vectors for a {self.dimensions}d index."
+            )
+
+        touched = []
+        for document, doc_id in zip(documents, ids):
+            record = {
+                "id": doc_id,
+                "page_content": document.page_content,
+                "metadata": dict(document.metadata or {}),
+            }
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = self._rows[doc_id] = len(self._records)
+                self._records.append(record)
+            else:
+                self._records[row] = record
+            touched.append(row)
+
+        self._reserve(len(self._records))
+        rows = np.asarray(touched, dtype=np.int64)
+        self._buffer[rows] = matrix
+        self._vectors = self._buffer[: len(self._records)]
+
+        # Incremental insert: new and changed rows join their nearest cluster.
+        if self.ivf is not None:
+            self.ivf.update(rows, self._vectors[rows])
+        return list(ids)
+
+    def _reserve(self, count: int) -> None:
+        """Room for `count` rows in the write buffer, doubling when it is full."""
+        if self._buffer is not None and len(self._buffer) >= count:
+            return
+        # The first write copies the memory-mapped matrix, which is read-only.
+        held = 0 if self._buffer is None else len(self._buffer)
+        buffer = np.empty((max(count, 2 * held, 1024), self.dimensions), np.float32)
+        buffer[: len(self._vectors)] = self._vectors
+        self._buffer = buffer
+
+    def delete(self, ids: list[str]) -> None:
+        """Drop documents by id, in memory. Call `save()` to persist."""
+        doomed = {self._rows[doc_id] for doc_id in ids if doc_id in self._rows}
+        if not doomed:
+            return
+        keep = [row for row in range(len(self._records)) if row not in doomed]
+        self._vectors = np.array(self._vectors[keep], dtype=np.float32)
+        self._buffer = None
+        self._records = [self._records[row] for row in keep]
+        self._rows = {record["id"]: row for row, record in enumerate(self._records)}
+        # Every later row has moved; `save()` retrains rather than patch.
+        self.ivf = None
+
+    def save(self) -> None:
+        """Stage every file, then swap each into place with an atomic rename."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        staged = {
+            "vectors.npy": self.path / "vectors.npy.tmp",
+            "documents.jsonl": self.path / "documents.jsonl.tmp",
+            "meta.json": self.path / "meta.json.tmp",
+        }
+        with open(staged["vectors.npy"], "wb") as handle:
+            np.save(handle, np.ascontiguousarray(self._vectors, dtype=np.float32))
+        with open(staged["documents.jsonl"], "w", encoding="utf-8") as handle:
+            for record in self._records:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        staged["meta.json"].write_text(
+            json.dumps(
+                {
+                    "model": self.model,
+                    "dimensions": self.dimensions,
+                    "count": len(self._records),
+                }
+            ),
+            encoding="utf-8",
+        )
+        if self.ann == "ivf" and len(self._records):
+            if self.ivf is None or self.ivf.needs_training(len(self._records)):
+                self.ivf = IVFIndex.train(self._vectors, self.nlist)
+                logger.info(
+                    "Trained IVF index: %d lists over %d vectors",
+                    self.ivf.nlist,
+                    len(self._records),
+                )
+            staged["ivf.npz"] = self.path / "ivf.npz.tmp"
+            self.ivf.save(staged["ivf.npz"])
+
+        # meta.json last: its presence is what marks the index loadable.
+        for name in sorted(staged, key=lambda name: name == "meta.json"):
+            os.replace(staged[name], self.path / name)
@@ -0,0 +1,243 @@
+"""Per-stage latency and token accounting, exposed in Prometheus text format.
+
+Each request opens a trace (`start_request`); code on the path wraps its
+steps in `stage("embed")`, `stage("llm")` and so on. A stage's duration goes
+two places: into the request's trace, which is logged as one line against the
+request_id when the request finishes, and into a process-wide summary that
+`/api/metrics` renders with p50/p95/p99 over a sliding window.
+
+The trace lives in a ContextVar, so it follows a request across threads'
+own contexts and into asyncio tasks spawned from it, and stages timed
+outside any request (ingestion, a health check) still feed the summaries.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Samples kept per series for quantiles. Enough for stable p99s, bounded so a
+# long-lived process never grows.
+WINDOW = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_trace: ContextVar[dict | None] = ContextVar("achalugo_trace", default=None)
+
+
+class Summary:
+    """Quantiles over a sliding window, plus all-time sum and count."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.setdefault(
+                label_values, [deque(maxlen=WINDOW), 0.0, 0]
+            )
+            series[0].append(value)
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} summary"]
+        with self._lock:
+            snapshot = {k: (sorted(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (window, total, count) in sorted(snapshot.items()):
+            labels = _labels(self.labels, label_values)
+            for q in QUANTILES:
+                value = window[min(len(window) - 1, int(q * len(window)))]
+                names = self.labels + ("quantile",)
+                quantile = _labels(names, label_values + (str(q),))
+                lines.append(f"{self.name}{quantile} {value:.6f}")
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Summary(
+    "achalugo_stage_seconds", "Time spent in each step of a chat turn.", ("stage",)
+)
+REQUEST_SECONDS = Summary(
+    "achalugo_request_seconds", "End-to-end chat turn latency.", ("route", "outcome")
+)
+FIRST_TOKEN_SECONDS = Summary(
+    "achalugo_first_token_seconds",
+    "Time from sending a streamed prompt to the first answer text.",
+    (),
+)
+LLM_TOKENS = Counter(
+    "achalugo_llm_tokens_total", "Tokens reported by the chat model.", ("type",)
+)
+PROMPT_TOKENS = Summary(
+    "achalugo_prompt_tokens",
+    "Prompt tokens per chat turn, by part, as budgeted before sending.",
+    ("part",),
+)
+RETRIEVAL_RETRIES = Counter(
+    "achalugo_retrieval_retries_total", "Vector search attempts that were retried.", ()
+)
+
+
+# --- Request traces ---------------------------------------------------------
+
+
+def start_request(request_id: str, route: str) -> None:
+    _trace.set(
+        {
+            "id": request_id,
+            "route": route,
+            "started": time.perf_counter(),
+            "stages": {},
+            "tokens": {},
+            "prompt": "",
+        }
+    )
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a step; repeats within one request (retries) accumulate."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _trace.get()
+        if trace is not None:
+            trace["stages"][name] = trace["stages"].get(name, 0.0) + elapsed
+
+
+def record_tokens(message: Any) -> None:
+    """Count the token usage a LangChain AI message (or chunk) carries."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    trace = _trace.get()
+    for kind in ("input_tokens", "output_tokens"):
+        count = usage.get(kind)
+        if not count:
+            continue
+        LLM_TOKENS.inc(count, kind.removesuffix("_tokens"))
+        if trace is not None:
+            trace["tokens"][kind] = trace["tokens"].get(kind, 0) + count
+
+
+def record_prompt(usage: Any) -> None:
+    """Note where a turn's prompt tokens went (an `api.budget.Usage`)."""
+    for part, count in usage.parts.items():
+        PROMPT_TOKENS.observe(count, part)
+    PROMPT_TOKENS.observe(usage.total, "total")
+    trace = _trace.get()
+    if trace is not None:
+        trace["prompt"] = usage.describe()
+
+
+def finish_request(outcome: str) -> None:
+    """Close the current trace: record the total and log the breakdown."""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    elapsed = time.perf_counter() - trace["started"]
+    REQUEST_SECONDS.observe(elapsed, trace["route"], outcome)
+
+    stages = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in trace["stages"].items())
+    tokens = " ".join(f"{k}={v}" for k, v in trace["tokens"].items())
+    logger.info(
+        "[%s] %s in %.0fms: %s %s",
+        trace["id"],
+        outcome,
+        elapsed * 1000,
+        stages,
+        tokens,
+    )
+    if trace["prompt"]:
+        logger.info("[%s] prompt tokens: %s", trace["id"], trace["prompt"])
+
+
+# --- Exposition -------------------------------------------------------------
+
+
+def _cache_lines() -> list[str]:
+    from api import config
+
+    caches = {}
+    answer_cache = config.get_answer_cache()
+    if answer_cache is not None:
+        caches["answer"] = answer_cache.stats()
+    # Only report the embeddings cache once something has built it: building
+    # it here would demand credentials from a metrics scrape.
+    built = getattr(config.get_embeddings, "cache_info", None)
+    if built is not None and built().currsize:
+        caches["embedding"] = config.get_embeddings().stats()
+
+    name = "achalugo_cache_lookups_total"
+    lines = [f"# HELP {name} Cache lookups by result.", f"# TYPE {name} counter"]
+    for cache, stats in caches.items():
+        for key, result in (("hits", "hit"), ("misses", "miss")):
+            labels = _labels(("cache", "result"), (cache, result))
+            lines.append(f"{name}{labels} {stats[key]}")
+    return lines
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in (
+        STAGE_SECONDS,
+        REQUEST_SECONDS,
+        FIRST_TOKEN_SECONDS,
+        LLM_TOKENS,
+        PROMPT_TOKENS,
+        RETRIEVAL_RETRIES,
+    ):
+        lines.extend(metric.render())
+    try:
+        lines.extend(_cache_lines())
+    except Exception:
+        logger.exception("Cache metrics unavailable")
+    return "\n".join(lines) + "\n"
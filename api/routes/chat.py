@@ -11,13 +11,34 @@ back to real corpus metadata. The model never writes a citation itself.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import re
 import time
-from typing import Any, Iterable
-
-from api.config import RETRIEVAL_K, get_chat_model, get_vector_store
+from typing import Any, Iterable, Iterator
+
+from api.budget import Usage, count_tokens, fit_history, fit_passages, passage_budget
+from api.config import (
+    MAX_PER_SOURCE,
+    RETRIEVAL_DIVERSITY,
+    RETRIEVAL_FETCH_K,
+    RETRIEVAL_K,
+    get_answer_cache,
+    get_chat_model,
+    get_embeddings,
+    get_lexical_index,
+    get_vector_store,
+)
+from api.diversify import cap_per_source, diversify
+from api.lexical import rrf
+from api.metrics import (
+    FIRST_TOKEN_SECONDS,
+    RETRIEVAL_RETRIES,
+    record_prompt,
+    record_tokens,
+    stage,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -54,27 +75,84 @@ RETRIEVAL_BACKOFF = 0.4
 
 
 def retrieve(query: str, k: int = RETRIEVAL_K) -> list:
-    """Top-k corpus documents for a query.
-
-    Never raises: an unreachable index degrades to an unsourced answer rather
-    than a 500. Connection-level failures are retried, because a serverless
-    cold start can hit a transient socket error reaching the Data API — the
-    kind that succeeds immediately on a second try. Errors the API actually
-    responded with (a missing collection, a bad token) are not retried, since
-    repeating them only burns the request's time budget.
+    """Top-k corpus documents for a query: vector search, plus BM25 if built.
+
+    The two rankings are merged by reciprocal rank fusion, so a bare Igbo word
+    that embeds poorly still surfaces the passages that actually contain it.
+    With RETRIEVAL_DIVERSITY the vector side is picked by MMR from a larger
+    pool, and the fused list keeps at most MAX_PER_SOURCE passages per work
+    (see `api.diversify`). Never raises; either side failing leaves the
+    other's results.
     """
+    return _fuse(query, _vector_search(query, k), k)
+
+
+def _fuse(query: str, documents: list, k: int) -> list:
+    try:
+        lexical = get_lexical_index()
+        if lexical is None:
+            return documents
+        with stage("lexical"):
+            matches = lexical.search(query, k)
+    except Exception:
+        logger.exception("Lexical retrieval failed; using vector results only")
+        return documents
+    if not RETRIEVAL_DIVERSITY:
+        return rrf([documents, matches], key=lambda d: d.page_content, k=k)
+    # Fuse everything, then cap: BM25 knows nothing of the works MMR spread.
+    fused = rrf([documents, matches], key=lambda d: d.page_content, k=2 * k)
+    return cap_per_source(fused, MAX_PER_SOURCE, k)
+
+
+def _pool_size(k: int) -> int:
+    return max(k, RETRIEVAL_FETCH_K)
+
+
+def _transient_errors() -> tuple:
     import httpx
 
-    transient = (
+    return (
         httpx.ConnectError,
         httpx.ConnectTimeout,
         httpx.ReadTimeout,
         httpx.RemoteProtocolError,
     )
 
+
+def _vector_search(query: str, k: int) -> list:
+    """Top-k corpus documents by embedding similarity.
+
+    Never raises: an unreachable index degrades to an unsourced answer rather
+    than a 500. Connection-level failures are retried, because a serverless
+    cold start can hit a transient socket error reaching the Data API — the
+    kind that succeeds immediately on a second try. Errors the API actually
+    responded with (a missing collection, a bad token) are not retried, since
+    repeating them only burns the request's time budget.
+
+    The query is embedded once, up front, through the embedding cache; the
+    retries then search by vector and never pay for the embedding again.
+    With RETRIEVAL_DIVERSITY the one search returns a larger pool with its
+    vectors, and k are chosen from it locally.
+    """
+    try:
+        with stage("embed"):
+            vector = get_embeddings().embed_query(query)
+    except Exception:
+        logger.exception("Query embedding failed; answering without corpus context")
+        return []
+
+    transient = _transient_errors()
     for attempt in range(RETRIEVAL_ATTEMPTS):
         try:
-            return get_vector_store().similarity_search(query, k=k)
+            with stage("search"):
+                store = get_vector_store()
+                if not RETRIEVAL_DIVERSITY:
+                    return store.similarity_search_by_vector(vector, k=k)
+                pool = store.similarity_search_with_embedding_by_vector(
+                    vector, k=_pool_size(k)
+                )
+            with stage("diversify"):
+                return diversify(vector, pool, k)
         except transient as exc:
             last = attempt == RETRIEVAL_ATTEMPTS - 1
             logger.warning(
@@ -86,7 +164,9 @@ def retrieve(query: str, k: int = RETRIEVAL_K) -> list:
             if last:
                 logger.error("Retrieval unreachable; answering without corpus context")
                 return []
-            time.sleep(RETRIEVAL_BACKOFF * (2**attempt))
+            RETRIEVAL_RETRIES.inc()
+            with stage("retry_backoff"):
+                time.sleep(RETRIEVAL_BACKOFF * (2**attempt))
         except Exception:
             logger.exception("Retrieval failed; answering without corpus context")
             return []
@@ -115,11 +195,14 @@ def _passage_note(document: Any) -> str:
     return text
 
 
+def _passage_header(number: int, document: Any) -> str:
+    return f"[{number}] ({_passage_title(document.metadata or {})})\n"
+
+
 def format_passages(documents: Iterable[Any]) -> str:
     blocks = []
     for i, document in enumerate(documents, start=1):
-        title = _passage_title(document.metadata or {})
-        blocks.append(f"[{i}] ({title})\n{document.page_content}")
+        blocks.append(_passage_header(i, document) + document.page_content)
     return "\n\n".join(blocks)
 
 
@@ -204,22 +287,67 @@ def _to_messages(history: Any) -> list[tuple[str, str]]:
     return turns[-6:]
 
 
-def answer_question(query: str, history: Any = None) -> dict:
-    """Retrieve, compose, and return one structured answer object."""
-    documents = retrieve(query)
+def _cache_lookup(
+    query: str, vector: list[float] | None = None, embed: bool = True
+) -> tuple[dict | None, list[float] | None]:
+    """A cached answer for `query`, plus its embedding if one was needed.
+
+    A caller that has already embedded the query passes `vector`; with
+    `embed` off a semantic cache is only matched exactly.
 
+    Never raises: a broken cache is a slower answer, not a failed one.
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    try:
+        with stage("cache"):
+            if cache.semantic and vector is None and embed:
+                vector = get_embeddings().embed_query(query)
+            return cache.get(query, vector), vector
+    except Exception:
+        logger.exception("Answer cache lookup failed")
+        return None, vector
+
+
+def _cache_store(query: str, payload: dict, vector: list[float] | None) -> None:
+    cache = get_answer_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(query, payload, vector)
+    except Exception:
+        logger.exception("Answer cache write failed")
+
+
+def _compose(
+    query: str, history: Any, documents: list
+) -> tuple[list[tuple[str, str]], list]:
+    """The turn's messages, fitted to PROMPT_TOKEN_BUDGET, and the passages sent.
+
+    `passage_ids` number the passages sent, so sources are mapped from
+    those rather than from everything retrieved (see `api.budget`).
+    """
+    usage = Usage()
+    question = f"\n\nQUESTION: {query}"
+    usage.parts["system"] = count_tokens(SYSTEM_PROMPT)
+    usage.parts["question"] = count_tokens(f"PASSAGES:\n{question}")
+    turns = fit_history(_to_messages(history), usage)
+    documents = fit_passages(documents, passage_budget(usage), _passage_header, usage)
     if documents:
         context = format_passages(documents)
     else:
         context = "(No passages were retrieved. Answer from your own knowledge, and return an empty passage_ids.)"
+        usage.parts["passages"] = count_tokens(context)
+    record_prompt(usage)
 
     messages: list[tuple[str, str]] = [("system", SYSTEM_PROMPT)]
-    messages.extend(_to_messages(history))
-    messages.append(("user", f"PASSAGES:\n{context}\n\nQUESTION: {query}"))
+    messages.extend(turns)
+    messages.append(("user", f"PASSAGES:\n{context}{question}"))
+    return messages, documents
 
-    response = get_chat_model().invoke(messages)
-    data = _parse_json(str(response.content))
 
+def _payload(data: dict, documents: list) -> dict:
     return {
         "answer": str(data.get("answer", "")).strip(),
         "detail": str(data.get("detail", "")).strip(),
@@ -227,3 +355,254 @@ def answer_question(query: str, history: Any = None) -> dict:
         "sources": _sources_from(documents, data.get("passage_ids") or []),
         "followups": _clean_followups(data.get("followups")),
     }
+
+
+def answer_question(query: str, history: Any = None) -> dict:
+    """Retrieve, compose, and return one structured answer object.
+
+    Only history-free turns go through the answer cache. With prior turns the
+    same words can mean a different question ("and who may break it?"), and
+    the first question of a session is where the repeats are anyway.
+    """
+    cacheable = not _to_messages(history)
+    vector = None
+    if cacheable:
+        cached, vector = _cache_lookup(query)
+        if cached is not None:
+            logger.info("Answer cache hit: %.60s", query)
+            return cached
+
+    documents = retrieve(query)
+    with stage("prompt"):
+        messages, documents = _compose(query, history, documents)
+    with stage("llm"):
+        response = get_chat_model().invoke(messages)
+    record_tokens(response)
+    with stage("parse"):
+        data = _parse_json(str(response.content))
+    with stage("sources"):
+        payload = _payload(data, documents)
+
+    if cacheable and payload["answer"]:
+        _cache_store(query, payload, vector)
+    return payload
+
+
+# --- Async ------------------------------------------------------------------
+
+
+async def _vector_search_async(
+    query: str, k: int, embedding: asyncio.Future | None = None
+) -> list:
+    """`_vector_search` without holding a thread through the round trips.
+
+    `embedding`, when given, is the query's embedding already in flight.
+    """
+    try:
+        with stage("embed"):
+            if embedding is None:
+                embedding = get_embeddings().aembed_query(query)
+            vector = await embedding
+    except Exception:
+        logger.exception("Query embedding failed; answering without corpus context")
+        return []
+
+    transient = _transient_errors()
+    for attempt in range(RETRIEVAL_ATTEMPTS):
+        try:
+            with stage("search"):
+                store = get_vector_store()
+                if not RETRIEVAL_DIVERSITY:
+                    return await store.asimilarity_search_by_vector(vector, k=k)
+                pool = await store.asimilarity_search_with_embedding_by_vector(
+                    vector, k=_pool_size(k)
+                )
+            with stage("diversify"):
+                return diversify(vector, pool, k)
+        except transient as exc:
+            logger.warning(
+                "Retrieval connection error (%d/%d): %s",
+                attempt + 1,
+                RETRIEVAL_ATTEMPTS,
+                exc,
+            )
+            if attempt == RETRIEVAL_ATTEMPTS - 1:
+                logger.error("Retrieval unreachable; answering without corpus context")
+                return []
+            RETRIEVAL_RETRIES.inc()
+            with stage("retry_backoff"):
+                await asyncio.sleep(RETRIEVAL_BACKOFF * (2**attempt))
+        except Exception:
+            logger.exception("Retrieval failed; answering without corpus context")
+            return []
+
+    return []
+
+
+async def retrieve_async(
+    query: str, k: int = RETRIEVAL_K, embedding: asyncio.Future | None = None
+) -> list:
+    return _fuse(query, await _vector_search_async(query, k, embedding), k)
+
+
+async def answer_question_async(query: str, history: Any = None) -> dict:
+    """`answer_question` for an event loop: one process, many chats in flight.
+
+    Retrieval starts at once, alongside the answer-cache lookup rather than
+    after it, and is cancelled if the cache answers. The lookup itself runs
+    in a thread, since the SQLite backend blocks. A semantic cache and the
+    search share one embedding of the query rather than each making one.
+    """
+    cacheable = not _to_messages(history)
+    cache = get_answer_cache() if cacheable else None
+    embedding = None
+    if cache is not None and cache.semantic:
+        embedding = asyncio.ensure_future(get_embeddings().aembed_query(query))
+    retrieval = asyncio.create_task(retrieve_async(query, embedding=embedding))
+
+    vector = None
+    if cacheable:
+        if embedding is not None:
+            try:
+                vector = await embedding
+            except Exception:
+                pass  # logged by the search; the cache then matches exactly
+        cached, vector = await asyncio.to_thread(
+            _cache_lookup, query, vector, embedding is None
+        )
+        if cached is not None:
+            retrieval.cancel()
+            logger.info("Answer cache hit: %.60s", query)
+            return cached
+
+    documents = await retrieval
+    with stage("prompt"):
+        messages, documents = _compose(query, history, documents)
+    with stage("llm"):
+        response = await get_chat_model().ainvoke(messages)
+    record_tokens(response)
+    with stage("parse"):
+        data = _parse_json(str(response.content))
+    with stage("sources"):
+        payload = _payload(data, documents)
+
+    if cacheable and payload["answer"]:
+        await asyncio.to_thread(_cache_store, query, payload, vector)
+    return payload
+
+
+# --- Streaming --------------------------------------------------------------
+
+
+class _PartialFields:
+    """Grows top-level JSON string fields out of a response as it streams.
+
+    The model writes one JSON object, so "answer" and "detail" arrive as the
+    inside of string literals. Each `feed` returns whatever text those fields
+    gained since the last call, decoded — never splitting an escape sequence,
+    and never emitting past the closing quote.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.buffer = ""
+        self._starts: dict[str, int] = {}
+        self._emitted = {field: 0 for field in fields}
+        self._patterns = {
+            field: re.compile(rf'"{re.escape(field)}"\s*:\s*"') for field in fields
+        }
+
+    def _value(self, field: str) -> str | None:
+        start = self._starts.get(field)
+        if start is None:
+            match = self._patterns[field].search(self.buffer)
+            if match is None:
+                return None
+            start = self._starts[field] = match.end()
+
+        raw, i, safe = self.buffer, start, start
+        while i < len(raw):
+            char = raw[i]
+            if char == '"':
+                break
+            if char == "\\":
+                width = 6 if raw[i + 1 : i + 2] == "u" else 2
+                if i + width > len(raw):
+                    break
+                # Hold back a high surrogate until its partner arrives.
+                surrogate = raw[i + 2 : i + 4].lower() in ("d8", "d9", "da", "db")
+                if width == 6 and surrogate:
+                    if i + 12 > len(raw):
+                        break
+                    width = 12
+                i += width
+            else:
+                i += 1
+            safe = i
+        return json.loads(f'"{raw[start:safe]}"')
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        self.buffer += text
+        deltas = []
+        for field, emitted in self._emitted.items():
+            value = self._value(field)
+            if value is not None and len(value) > emitted:
+                deltas.append((field, value[emitted:]))
+                self._emitted[field] = len(value)
+        return deltas
+
+
+def _candidate_sources(documents: list) -> list[dict]:
+    """Sources for everything retrieved, before the model has chosen any."""
+    return _sources_from(documents, list(range(1, len(documents) + 1)))
+
+
+def stream_answer(query: str, history: Any = None) -> Iterator[tuple[str, Any]]:
+    """`answer_question` as a sequence of (event, data) pairs.
+
+    Sources go out as soon as retrieval finishes — provisional, from the top
+    of the retrieved set — then "answer" and "detail" as text deltas while the
+    model writes, then the cited sources, terms and followups once the whole
+    object has parsed. Time to first token is what the asker feels.
+    """
+    cacheable = not _to_messages(history)
+    vector = None
+    if cacheable:
+        cached, vector = _cache_lookup(query)
+        if cached is not None:
+            logger.info("Answer cache hit: %.60s", query)
+            yield "sources", cached["sources"]
+            yield "answer", cached["answer"]
+            yield "detail", cached["detail"]
+            yield "terms", cached["terms"]
+            yield "followups", cached["followups"]
+            return
+
+    documents = retrieve(query)
+    with stage("prompt"):
+        messages, documents = _compose(query, history, documents)
+    yield "sources", _candidate_sources(documents)
+
+    fields = _PartialFields(("answer", "detail"))
+    # Streamed, the "llm" stage runs to the last token; time to the first is
+    # the number the asker actually feels, so it is recorded on its own.
+    started = time.perf_counter()
+    first = True
+    with stage("llm"):
+        for chunk in get_chat_model().stream(messages):
+            record_tokens(chunk)
+            deltas = fields.feed(str(chunk.content))
+            if deltas and first:
+                first = False
+                FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            yield from deltas
+
+    with stage("parse"):
+        data = _parse_json(fields.buffer)
+    with stage("sources"):
+        payload = _payload(data, documents)
+    if cacheable and payload["answer"]:
+        _cache_store(query, payload, vector)
+
+    yield "sources", payload["sources"]
+    yield "terms", payload["terms"]
+    yield "followups", payload["followups"]
@@ -0,0 +1,47 @@
+"""Request validation and the shared failure answer, for both entry points.
+
+The Flask app (`api.index`) and the ASGI app (`api.asgi`) accept exactly the
+same payloads and fail in exactly the same voice.
+"""
+
+from __future__ import annotations
+
+from pydantic import BaseModel, Field, field_validator
+
+# In-character failure text, mirroring the client's own fallback so a server
+# error still reads as Achalugo rather than as an error page.
+VOICE_FAILURE = (
+    "Forgive me, nwa m — my voice did not carry just then. "
+    "Juo’m ajuju ọzọ, ask me again."
+)
+
+
+class Turn(BaseModel):
+    role: str
+    content: str
+
+
+class Query(BaseModel):
+    prompt: str = Field(min_length=1, max_length=2000)
+    history: list[Turn] = Field(default_factory=list)
+
+    @field_validator("prompt")
+    @classmethod
+    def _not_blank(cls, value: str) -> str:
+        stripped = value.strip()
+        if not stripped:
+            raise ValueError("prompt must not be blank")
+        return stripped
+
+
+def failure_payload(request_id: str) -> dict:
+    """The 500 body: still a renderable answer, never error chrome."""
+    return {
+        "answer": VOICE_FAILURE,
+        "detail": "",
+        "terms": [],
+        "sources": [],
+        "followups": [],
+        "error": "Answer generation failed",
+        "request_id": request_id,
+    }
@@ -0,0 +1,72 @@
+"""Pre-warming: do a cold start's work before the first request arrives.
+
+A cold instance's first turn imports the LangChain and OpenAI client stacks,
+builds every client in `api.config`, loads the indexes and then opens TLS
+connections to OpenAI and the Data API — a second or more ahead of any real
+work, which is where the p99 lives. With PREWARM=on, `prewarm()` does all of
+it at startup instead: at import time for the Flask function (Vercel runs
+that in the instance's init phase) and on lifespan startup for the ASGI app.
+
+Connecting costs nothing billable: one GET for the chat model's metadata
+opens the shared OpenAI pool (`config.openai_http_client`), and a search by a
+fixed vector — no embedding — opens the store's. Every step is best-effort;
+a failure is logged and the request path builds what it needs as before.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _unit_vector(dimensions: int) -> list[float]:
+    return [1.0] + [0.0] * (dimensions - 1)
+
+
+def probe_index() -> bool:
+    """Search the vector store without embedding anything: is it non-empty?"""
+    from api.config import EMBEDDING_DIMENSIONS, get_vector_store
+
+    vector = _unit_vector(EMBEDDING_DIMENSIONS)
+    return bool(get_vector_store().similarity_search_by_vector(vector, k=1))
+
+
+def prewarm(connect: bool = True) -> dict[str, float]:
+    """Build the clients (and with `connect`, open their pools); step timings."""
+    from api import config
+    from api.budget import encoding
+
+    def connect_openai():
+        config.get_chat_model().root_client.models.retrieve(config.CHAT_MODEL)
+
+    steps = {
+        "import": lambda: importlib.import_module("api.routes.chat"),
+        "answer_cache": config.get_answer_cache,
+        "embeddings": lambda: config.get_embeddings().inner,
+        "chat_model": config.get_chat_model,
+        "vector_store": config.get_vector_store,
+        "lexical_index": config.get_lexical_index,
+        "tokenizer": lambda: encoding(config.CHAT_MODEL, wait=True),
+    }
+    if connect:
+        steps["openai"] = connect_openai
+        steps["index"] = probe_index
+
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as exc:
+            logger.warning("Pre-warm step %s failed: %s", name, exc)
+        timings[name] = time.perf_counter() - started
+
+    logger.info(
+        "Pre-warmed in %.0fms: %s",
+        sum(timings.values()) * 1000,
+        " ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()),
+    )
+    return timings
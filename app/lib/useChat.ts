@@ -21,6 +21,45 @@ function toElderMessage(id: string, data: AnswerPayload): Message {
   };
 }
 
+type StreamHandler = (event: string, data: unknown) => void;
+
+/**
+ * POST to the SSE endpoint and hand each event to `onEvent` as it lands.
+ * Resolves once the stream closes; throws if it never opened.
+ */
+async function streamChat(body: object, onEvent: StreamHandler): Promise<void> {
+  const res = await fetch('/api/chat/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok || !res.body) throw new Error(`stream unavailable (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 function errorMessage(id: string): Message {
   return {
     id,
@@ -75,19 +114,65 @@ export function useChat() {
       setDraft('');
       setBusy(true);
 
-      let answer: Message;
+      // The pending turn becomes the elder's as soon as the first words of the
+      // answer arrive, and fills in as the rest of the stream lands.
+      let answer: Message = {
+        id: pendingId,
+        role: 'pending',
+        terms: [],
+        sources: [],
+        followups: [],
+      };
+      const show = (next: Message) => {
+        answer = next;
+        setMessages((prev) => prev.map((m) => (m.id === pendingId ? next : m)));
+      };
+
+      let opened = false;
       try {
-        const res = await axios.post<AnswerPayload>('/api/chat', {
-          prompt: text,
-          history,
+        await streamChat({ prompt: text, history }, (event, data) => {
+          opened = true;
+          if (event === 'error') throw new Error('answer failed');
+          if (event === 'answer') {
+            show({ ...answer, role: 'elder', answer: `${answer.answer || ''}${data}` });
+          } else if (event === 'detail') {
+            show({ ...answer, detail: `${answer.detail || ''}${data}` });
+          } else if (event === 'sources') {
+            show({ ...answer, sources: asArray<Source>(data).filter((s) => s?.title) });
+          } else if (event === 'terms') {
+            show({ ...answer, terms: asArray<Term>(data).filter((t) => t?.term) });
+          } else if (event === 'followups') {
+            show({
+              ...answer,
+              followups: asArray<string>(data).filter(Boolean).slice(0, 2),
+            });
+          }
         });
-        answer = toElderMessage(pendingId, res.data ?? {});
+        answer = {
+          ...answer,
+          answer: answer.answer?.trim(),
+          detail: answer.detail?.trim(),
+        };
         if (!answer.answer) answer = errorMessage(pendingId);
       } catch {
         answer = errorMessage(pendingId);
       }
 
-      setMessages((prev) => prev.map((m) => (m.id === pendingId ? answer : m)));
+      // A deployment without the streaming route still gets an answer.
+      if (!opened) {
+        try {
+          const res = await axios.post<AnswerPayload>('/api/chat', {
+            prompt: text,
+            history,
+          });
+          answer = toElderMessage(pendingId, res.data ?? {});
+          if (!answer.answer) answer = errorMessage(pendingId);
+        } catch {
+          answer = errorMessage(pendingId);
+        }
+      }
+
+      show(answer);
       setBusy(false);
       inFlight.current = false;
     },
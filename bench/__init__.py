@@ -0,0 +1,5 @@
+"""Benchmarks for the serving path and the ingestion pipeline.
+
+Each module runs standalone, e.g. ``python3 -m bench.ann``. None of them need
+credentials unless they say so.
+"""
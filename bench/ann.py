@@ -0,0 +1,119 @@
+"""Recall versus latency for IVF search against exact search.
+
+    python3 -m bench.ann                          # the real local index
+    python3 -m bench.ann --synthetic 200000       # clustered random vectors
+    python3 -m bench.ann --nprobe 1 2 4 8 16 32 --k 8
+
+Queries are corpus vectors with noise added, so each has a well-defined but
+non-trivial neighbourhood. Ground truth is the exact top k; recall@k is the
+share of it IVF recovers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from api.ivf import IVFIndex
+from api.localstore import _normalized
+
+
+def _corpus(args: argparse.Namespace) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        centres = rng.standard_normal((max(1, args.synthetic // 200), args.dim))
+        labels = rng.integers(0, len(centres), args.synthetic)
+        noise = rng.standard_normal((args.synthetic, args.dim)) * 0.6
+        return _normalized((centres[labels] + noise).astype(np.float32))
+
+    from api.config import COLLECTION_NAME, LOCAL_INDEX_DIR
+
+    path = Path(args.index or Path(LOCAL_INDEX_DIR) / COLLECTION_NAME)
+    return np.load(path / "vectors.npy", mmap_mode="r")
+
+
+def _exact(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+def _ivf(vectors, index: IVFIndex, query, k: int, nprobe: int) -> np.ndarray:
+    candidates = index.candidates(query, nprobe)
+    scores = vectors[candidates] @ query
+    kk = min(k, len(scores))
+    top = np.argpartition(scores, -kk)[-kk:]
+    return candidates[top[np.argsort(-scores[top])]]
+
+
+def _timed(fn, queries) -> tuple[list, list[float]]:
+    results, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(fn(query))
+        timings.append((time.perf_counter() - started) * 1000)
+    return results, timings
+
+
+def _pct(timings: list[float], q: int) -> float:
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100)[q - 1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="bench.ann", description=__doc__)
+    parser.add_argument("--index", help="local index directory (default: configured)")
+    parser.add_argument("--synthetic", type=int, help="use N clustered random vectors")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = _corpus(args)
+    count = vectors.shape[0]
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(count, min(args.queries, count), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])) * 0.02
+    queries = _normalized((np.asarray(vectors[picks]) + noise).astype(np.float32))
+
+    started = time.perf_counter()
+    index = IVFIndex.train(vectors, args.nlist, seed=args.seed)
+    trained = time.perf_counter() - started
+    print(
+        f"{count} vectors, {vectors.shape[1]}d; "
+        f"IVF nlist={index.nlist} trained in {trained:.2f}s"
+    )
+
+    truth, timings = _timed(lambda q: _exact(vectors, q, args.k), queries)
+    print(f"{'search':<12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    print(
+        f"{'exact':<12} {1.0:>10.3f} "
+        f"{_pct(timings, 50):>8.3f} {_pct(timings, 95):>8.3f}"
+    )
+
+    for nprobe in args.nprobe:
+        if nprobe > index.nlist:
+            continue
+        found, timings = _timed(
+            lambda q: _ivf(vectors, index, q, args.k, nprobe), queries
+        )
+        recall = np.mean(
+            [len(set(a) & set(b)) / len(a) for a, b in zip(truth, found)]
+        )
+        print(
+            f"{'nprobe=' + str(nprobe):<12} {recall:>10.3f} "
+            f"{_pct(timings, 50):>8.3f} {_pct(timings, 95):>8.3f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
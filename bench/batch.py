@@ -0,0 +1,172 @@
+"""Batch API extraction, round-tripped offline.
+
+    python3 -m bench.batch
+    python3 -m bench.batch --pages 500 --fail 0.05
+    python3 -m bench.batch --answer requests.jsonl results.jsonl
+
+With no arguments: synthetic pages are chunked and written out as a Batch
+API requests file, every request is answered by a local stand-in for the
+Batch API (a results file in its format, with `--fail` of the requests
+coming back as errors), and the results are read into a scratch entries
+cache. Then every chunk is extracted through `extract_chunk` with the model
+patched to fail loudly — only the chunks whose request failed may reach it.
+
+`--answer` writes the stand-in's results for a real requests file instead,
+so `python3 -m api.ingest --batch-results` can be tried without the API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from api.ingest import cache, extract
+from api.ingest.batch import read_results, write_requests
+from api.ingest.fetch import Page
+
+PARAGRAPH = (
+    "Ọjị, the kola nut, is broken and shared when visitors arrive. The eldest "
+    "man present blesses it before it is passed around, and a guest who is "
+    "offered ọjị is a guest who is welcome.\n\n"
+)
+
+
+def answer(request: dict, fail: bool) -> dict:
+    """The Batch API's result line for one request, from a stand-in model."""
+    if fail:
+        return {
+            "id": f"batch_req_{request['custom_id']}",
+            "custom_id": request["custom_id"],
+            "response": None,
+            "error": {"code": "server_error", "message": "stand-in failure"},
+        }
+    source = request["body"]["messages"][-1]["content"]
+    title = source.split("\n", 1)[0].removeprefix("SOURCE: ")
+    text = " ".join(source.split("SOURCE TEXT:", 1)[-1].split()[:80])
+    content = {
+        "entries": [
+            {
+                "text": text,
+                "topic": title,
+                "summary": f"Passage from {title}",
+                "kind": "custom",
+                "igbo_terms": [{"term": "Ọjị", "meaning": "kola nut"}],
+            }
+        ]
+    }
+    return {
+        "id": f"batch_req_{request['custom_id']}",
+        "custom_id": request["custom_id"],
+        "response": {
+            "status_code": 200,
+            "body": {
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": json.dumps(content, ensure_ascii=False),
+                        },
+                    }
+                ]
+            },
+        },
+        "error": None,
+    }
+
+
+def write_answers(requests: Path, results: Path, fail: float, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    count = 0
+    with open(requests, encoding="utf-8") as source, open(
+        results, "w", encoding="utf-8"
+    ) as sink:
+        for line in source:
+            result = answer(json.loads(line), rng.random() < fail)
+            sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.batch",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--fail", type=float, default=0.02, help="failed share")
+    parser.add_argument(
+        "--answer", nargs=2, metavar=("REQUESTS", "RESULTS"), type=Path
+    )
+    args = parser.parse_args()
+    # The failed requests' fallback extractions warn; expected here.
+    logging.getLogger("api.ingest").setLevel(logging.ERROR)
+
+    if args.answer:
+        count = write_answers(*args.answer, args.fail)
+        print(f"answered {count} requests in {args.answer[1]}")
+        return 0
+
+    pages = [
+        Page(
+            key=f"bench:{i}",
+            title=f"Page {i}",
+            text=f"Page {i}.\n\n" + PARAGRAPH * (2 + i % 40),
+            url=f"https://example.org/{i}",
+            tag="bench",
+            domain="example.org",
+        )
+        for i in range(args.pages)
+    ]
+    # Distinct chunks that reached the model: pages share most of their text.
+    asked: set[str] = set()
+
+    class RefusingModel:
+        def invoke(self, messages):
+            asked.add(messages[-1][1].split("SOURCE TEXT:\n", 1)[-1])
+            raise RuntimeError("the model is offline")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.CACHE_PATH = Path(tmp) / "cache.sqlite3"
+        extract.get_chat_model = lambda *args, **kwargs: RefusingModel()
+        requests, results = Path(tmp) / "requests.jsonl", Path(tmp) / "results.jsonl"
+
+        started = time.perf_counter()
+        written = write_requests(pages, requests)
+        write_seconds = time.perf_counter() - started
+        write_answers(requests, results, args.fail)
+
+        started = time.perf_counter()
+        counts = read_results(results)
+        read_seconds = time.perf_counter() - started
+
+        chunks = [(body, page) for page in pages for body in extract.chunk(page.text)]
+        entries = []
+        for job in chunks:
+            try:
+                entries += extract.extract_chunk(*job)
+            except extract.ExtractionFailed:
+                pass
+        size = requests.stat().st_size
+
+    print(f"{len(pages)} pages, {len(chunks)} chunks")
+    print(
+        f"requests   {written:>6}  {size / 1024:>8.0f} KiB  {write_seconds:>6.2f}s"
+    )
+    print(
+        f"results    {counts['cached']:>6} cached, {counts['failed']} failed  "
+        f"{read_seconds:>6.2f}s"
+    )
+    print(f"extracted  {len(entries):>6} entries, {len(asked)} chunks sent to the model")
+    # Only the failed requests may have reached the model.
+    return 0 if len(asked) == counts["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
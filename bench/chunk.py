@@ -0,0 +1,158 @@
+"""Chunkers compared on one corpus: chunks, tokens, split sections, speed.
+
+    python3 -m bench.chunk
+    python3 -m bench.chunk --pages 1000
+    python3 -m bench.chunk --cached      # the pages in the ingest cache
+
+By default the corpus is synthetic, shaped like the registry's: mostly
+MediaWiki plaintext extracts, stubs and long articles with `== Section ==`
+headings, some sections dense with Igbo diacritics, and the reference lists
+articles end with. `--cached` chunks the pages in the ingest cache instead.
+
+For each chunker: the chunks it makes, their tokens (min / median / max),
+the tokens the extraction requests would send in all (chunks plus one
+EXTRACTION_PROMPT each), and "split sections" — sections short enough to go
+in one chunk that were cut across two anyway. The time is for chunking the
+whole corpus, best of `--repeat`, after a warm-up. Tokens are counted with
+tiktoken for EXTRACTION_MODEL, or estimated when its encoding cannot be
+loaded; the header says which.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import time
+
+from api.config import EXTRACTION_MODEL
+from api.ingest import extract
+from api.ingest.cache import PAGES, get_cache
+from api.ingest.extract import (
+    CHUNK_TOKENS,
+    CHUNKERS,
+    EXTRACTION_PROMPT,
+    MIN_CHUNK_TOKENS,
+    count_tokens,
+    sections,
+)
+
+ENGLISH = [
+    "The kola nut is broken and shared when visitors arrive.",
+    "The eldest man present blesses it before it is passed around.",
+    "Wrestling marked the end of the farming season in many towns.",
+    "Masquerades are held to embody the spirits of the ancestors.",
+    "Titles were taken in stages, each marked by a feast for the town.",
+    "Colonial administrators appointed warrant chiefs where none had ruled.",
+]
+IGBO = [
+    "Ọjị bụ ndụ; onye wetara ọjị wetara ndụ.",
+    "Egbe bere ugo bere; nke sị ibe ya ebela, nku kwaa ya.",
+    "Ịgba mgba na Iri ji bụ emume ndị Igbo ji akpọrọ ihe.",
+    "Mmanwụ na-egosi mmụọ ndị nna nna anyị hà.",
+]
+HEADINGS = [
+    "History",
+    "Etymology",
+    "Culture",
+    "Religion",
+    "Festivals",
+    "Language",
+    "Economy",
+    "Colonial era",
+    "Oral tradition",
+    "Cuisine",
+]
+
+
+def paragraph(rng: random.Random) -> str:
+    pool = IGBO + ENGLISH if rng.random() < 0.3 else ENGLISH
+    return " ".join(rng.choice(pool) for _ in range(rng.randint(2, 9)))
+
+
+def article(rng: random.Random) -> str:
+    parts = [paragraph(rng) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.35:
+        return "\n".join(parts)  # a stub: the lead and nothing else
+    for heading in rng.sample(HEADINGS, rng.randint(2, 8)):
+        parts.append(f"\n== {heading} ==")
+        parts += [paragraph(rng) for _ in range(rng.randint(1, 10))]
+        if rng.random() < 0.3:
+            parts.append(f"=== {heading} today ===")
+            parts += [paragraph(rng) for _ in range(rng.randint(1, 4))]
+    parts.append("\n== References ==")
+    parts += [f"^ Author {n}. Title {n}. Publisher, 19{n}0." for n in range(9)]
+    return "\n".join(parts)
+
+
+def split_sections(text: str, chunks: list[str]) -> int:
+    """Sections that fit in a chunk, yet appear whole in none.
+
+    Sections under MIN_CHUNK_TOKENS are left out: a stub that short is
+    dropped whole by both chunkers, not split.
+    """
+    return sum(
+        1
+        for _, body in sections(text)
+        if MIN_CHUNK_TOKENS <= count_tokens(body) <= CHUNK_TOKENS - 40
+        and not any(body in chunk for chunk in chunks)
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.chunk",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--pages", type=int, default=290)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cached", action="store_true", help="use cached pages")
+    args = parser.parse_args()
+    logging.getLogger("api.ingest").setLevel(logging.ERROR)
+
+    if args.cached:
+        cache = get_cache()
+        keys = sorted(cache.keys(PAGES))
+        texts = [json.loads(cache.get(PAGES, key))["text"] for key in keys]
+        if not texts:
+            print(f"no pages cached in {cache.path}")
+            return 1
+    else:
+        rng = random.Random(0)
+        texts = [article(rng) for _ in range(args.pages)]
+
+    encoding = extract._encoding()
+    counted = f"tiktoken {encoding.name}" if encoding else "estimated, no tokenizer"
+    chars = sum(len(text) for text in texts)
+    print(f"{len(texts)} pages, {chars / 1e6:.2f}M characters; tokens {counted}")
+    prompt = count_tokens(EXTRACTION_PROMPT)
+
+    print(
+        f"{'chunker':<8} {'chunks':>7} {'min':>5} {'median':>7} {'max':>5} "
+        f"{'chunk tok':>10} {'sent tok':>10} {'split sec':>10} {'seconds':>8}"
+    )
+    for name, chunker in CHUNKERS.items():
+        chunker(texts[0])  # warm-up: splitter and tokenizer
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            chunked = [chunker(text) for text in texts]
+            best = min(best, time.perf_counter() - started)
+
+        sizes = [count_tokens(chunk) for chunks in chunked for chunk in chunks]
+        split = sum(split_sections(t, c) for t, c in zip(texts, chunked))
+        total = sum(sizes)
+        print(
+            f"{name:<8} {len(sizes):>7} {min(sizes):>5} "
+            f"{statistics.median(sizes):>7.0f} {max(sizes):>5} {total:>10} "
+            f"{total + prompt * len(sizes):>10} {split:>10} {best:>8.3f}"
+        )
+    print(f"({EXTRACTION_MODEL}; prompt {prompt} tokens per request)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
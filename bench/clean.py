@@ -0,0 +1,177 @@
+"""HTML cleaning engines on the same pages: pages/sec and peak memory.
+
+    python3 -m bench.clean
+    python3 -m bench.clean --pages 400 --repeat 5
+    python3 -m bench.clean --html saved/       # *.html fixtures of your own
+
+The page cache keeps cleaned text, not HTML, so by default the fixtures are
+synthetic CMS pages built the way scraped ones fail: nav, header and footer
+chrome, scripts and styles, a cookie banner, an empty `.content` wrapper
+above the real `<article>`, share and comment boilerplate inside it, tables,
+unclosed `<p>` and `<li>`, verse broken into lines with `<br>`, entities
+and Igbo diacritics. `--html` takes a directory of raw pages instead (say,
+a few hundred saved with curl).
+
+Every engine cleans every page `--repeat` times for the rate, then once more
+under tracemalloc for the peak allocated while cleaning one page (mean and
+worst). "same text" is the share of pages on which an engine's text matches
+the soup engine's exactly. The lxml row appears only when lxml is installed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from api.ingest.clean import has_lxml, page_text
+from api.ingest.fetch import CONTENT_SELECTORS, STRIP_TAGS, _clean_lines, _soup_text
+
+SENTENCES = [
+    "Ọjị, the kola nut, is broken and shared when visitors arrive.",
+    "The eldest man present blesses it before it is passed around.",
+    "Ndị Igbo say that a guest who is offered ọjị is a guest who is welcome.",
+    "Ịgba mgba, wrestling, marked the end of the farming season in many towns.",
+    "The New Yam festival, Iri ji, gives thanks for the harvest &amp; the land.",
+    "Masquerades (mmanwụ) are held to embody the spirits of the ancestors.",
+]
+# Verse set line by line, as proverb and song pages do.
+VERSES = [
+    "Onye wetara ọjị<br>wetara ndụ,<br>the one who brings kola brings life.",
+    "Egbe bere, ugo bere;<br>nke sị ibe ya ebela,<br>nku kwaa ya.",
+    "Ọ bụ onye ahụ ọjị<br/>ka ọ dịrị ịkpa ya,<br>so the elders say.",
+]
+CHROME = (
+    "<nav><ul><li><a href='/'>Home</a><li><a href='/about'>About</a>"
+    "<li><a href='/culture'>Culture</a></ul></nav>"
+    "<header><h1>Igbo Heritage Blog</h1><form><input name=q><button>Go</button>"
+    "</form></header>"
+)
+SCRIPT = (
+    "<script>window.dataLayer = window.dataLayer || []; function gtag(){"
+    "dataLayer.push(arguments);} gtag('js', new Date());</script>"
+    "<style>.post-content p { margin: 0 0 1em; } .sidebar { float: right; }</style>"
+)
+FOOTER = (
+    "<aside class='sidebar'><h3>Related posts</h3><ul><li>Ofala festival"
+    "<li>Nri kingdom</ul></aside>"
+    "<div class='cookie'>We use cookies to improve your experience. "
+    "Read our privacy policy.</div>"
+    "<footer>© 2024 Igbo Heritage. All rights reserved.</footer>"
+)
+
+
+def synthetic(n: int, rng: random.Random) -> str:
+    paragraphs = "".join(
+        "<p>" + " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 6)))
+        + ("</p>" if rng.random() < 0.8 else "")
+        + (f"<p>{rng.choice(VERSES)}</p>" if rng.random() < 0.2 else "")
+        for _ in range(rng.randint(6, 60))
+    )
+    table = (
+        "<table><tr><td>Market day</td><td>Eke</td></tr>"
+        "<tr><td>Next</td><td>Orie</td></tr></table>"
+        if n % 3 == 0
+        else ""
+    )
+    return (
+        f"<!DOCTYPE html><html><head><title>Igbo culture, part {n}</title>"
+        f"<meta charset='utf-8'>{SCRIPT}</head><body>{CHROME}"
+        f"<div id='content' class='content'><div class='content'></div>"
+        f"<main><article class='post'><h2>Part {n}</h2>{paragraphs}{table}"
+        f"<p>Share this on WhatsApp<br>Leave a comment below</p>"
+        f"<!-- comments load here --></article></main></div>{FOOTER}"
+        f"</body></html>"
+    )
+
+
+def soup(html: str) -> str:
+    _, raw = _soup_text(html)
+    return _clean_lines(raw or "")
+
+
+def fast(parser: str) -> Callable[[str], str]:
+    def clean(html: str) -> str:
+        _, raw = page_text(html, STRIP_TAGS, CONTENT_SELECTORS, parser)
+        return _clean_lines(raw or "", fast=True)
+
+    return clean
+
+
+def measure(clean: Callable[[str], str], pages: list[str], repeat: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            clean(html)
+    seconds = time.perf_counter() - started
+
+    peaks = []
+    texts = []
+    tracemalloc.start()
+    for html in pages:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        texts.append(clean(html))
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return {
+        "rate": len(pages) * repeat / seconds,
+        "mean": sum(peaks) / len(peaks),
+        "worst": max(peaks),
+        "texts": texts,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.clean",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--html", type=Path, help="directory of *.html fixtures")
+    args = parser.parse_args()
+
+    if args.html:
+        pages = [
+            path.read_text(encoding="utf-8", errors="replace")
+            for path in sorted(args.html.glob("*.html"))
+        ]
+        if not pages:
+            print(f"no *.html files in {args.html}")
+            return 1
+    else:
+        rng = random.Random(0)
+        pages = [synthetic(n, rng) for n in range(args.pages)]
+    size = sum(len(html.encode("utf-8")) for html in pages)
+    print(f"{len(pages)} pages, {size / len(pages) / 1024:.0f} KiB each on average")
+
+    engines = {"soup (html.parser)": soup, "fast (html.parser)": fast("stdlib")}
+    if has_lxml():
+        engines["fast (lxml)"] = fast("lxml")
+    else:
+        print("lxml not installed; skipping the fast (lxml) row")
+
+    baseline = None
+    print(
+        f"{'engine':<20} {'pages/s':>9} {'peak KiB':>9} {'worst KiB':>10} "
+        f"{'same text':>10}"
+    )
+    for name, clean in engines.items():
+        result = measure(clean, pages, args.repeat)
+        if baseline is None:
+            baseline = result
+        same = sum(a == b for a, b in zip(result["texts"], baseline["texts"]))
+        print(
+            f"{name:<20} {result['rate']:>9.0f} {result['mean'] / 1024:>9.0f} "
+            f"{result['worst'] / 1024:>10.0f} {same / len(pages):>10.0%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
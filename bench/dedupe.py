@@ -0,0 +1,94 @@
+"""Near-duplicate clustering at growing corpus sizes: comparisons and time.
+
+    python3 -m bench.dedupe
+    python3 -m bench.dedupe --sizes 1000 4000 16000 --variants 0.2
+
+The corpus is synthetic: passages of 40-100 words drawn from a vocabulary
+of made-up Igbo-looking words, and for a `--variants` share of them a
+second copy from another page with a few words swapped — what the same
+proverb looks like extracted from two sources. Each size is fed through
+`NearDuplicates` in write-stage batches of WRITE_BATCH, shuffled, as a
+streaming run would, and then settled with `finish`.
+
+For each size: the passages, the clusters found against those planted,
+passages merged away, signature comparisons made against the pairs a
+quadratic pass would compare, and the time taken. Comparisons grow with the
+corpus, not with its square.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from api.ingest.dedupe import THRESHOLD, NearDuplicates
+from api.ingest.extract import Entry
+from api.ingest.fetch import Page
+from api.ingest.pipeline import WRITE_BATCH
+
+LETTERS = "abcdefghijklmnoprstuwyọịụ"
+
+
+def corpus(rng: random.Random, size: int, variants: float) -> tuple[list[Entry], int]:
+    """Passages, shuffled, and how many near-duplicate pairs were planted."""
+    words = [
+        "".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 9)))
+        for _ in range(3000)
+    ]
+    entries, planted = [], 0
+    for n in range(size):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(40, 100)))
+        page = Page(f"p{n}", f"Page {n}", "", f"https://example.org/{n}", "t", "x")
+        entries.append(Entry(text, "topic", "summary", "proverb", page=page))
+        if rng.random() < variants:
+            swapped = text.split()
+            for _ in range(max(1, len(swapped) // 25)):
+                swapped[rng.randrange(len(swapped))] = rng.choice(words)
+            url = f"https://example.com/{n}"
+            other = Page(f"q{n}", f"Copy {n}", "", url, "t", "x")
+            copy = " ".join(swapped)
+            entries.append(Entry(copy, "topic", "summary", "proverb", page=other))
+            planted += 1
+    rng.shuffle(entries)
+    return entries, planted
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.dedupe",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000]
+    )
+    parser.add_argument("--variants", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    print(
+        f"{'passages':>9} {'clusters':>9} {'planted':>8} {'merged':>7} "
+        f"{'compared':>9} {'all pairs':>12} {'seconds':>8}"
+    )
+    for size in args.sizes:
+        entries, planted = corpus(random.Random(size), size, args.variants)
+        dedupe = NearDuplicates(args.threshold)
+        started = time.perf_counter()
+        for start in range(0, len(entries), WRITE_BATCH):
+            dedupe.add(entries[start : start + WRITE_BATCH])
+        dedupe.finish()
+        elapsed = time.perf_counter() - started
+
+        clusters, merged = dedupe.counts()
+        pairs = len(entries) * (len(entries) - 1) // 2
+        print(
+            f"{len(entries):>9} {clusters:>9} {planted:>8} {merged:>7} "
+            f"{dedupe.compared:>9} {pairs:>12} {elapsed:>8.2f}"
+        )
+    print(f"(threshold {args.threshold}; {dedupe.bands}x{dedupe.rows} LSH bands)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+"""Prompt tokens and source spread per answer, plain top k against MMR.
+
+    python3 -m bench.diversity                    # synthetic corpus
+    python3 -m bench.diversity --index index/igbo_corpus   # a real local index
+    python3 -m bench.diversity --k 8 --fetch-k 32 --lambda 0.7 --per-source 2
+
+The synthetic corpus is shaped like the real one: works with a handful to a
+dozen chunks each, whose vectors sit close together, grouped under shared
+topics, with one passage in ten repeated almost verbatim in another work,
+as a proverb is. Queries are corpus vectors with noise added, as in
+`bench.ann`.
+
+For each selector, averaged per query: the prompt tokens of the composed
+turn (SYSTEM_PROMPT, passages and question), the tokens spent on passages
+from a work already in the prompt, the distinct works, the near-duplicate
+pairs sent, and the mean similarity of the passages to the query. Time is
+for the selection alone, after the pool is fetched. Tokens are counted as
+`api.ingest.extract.count_tokens` counts them: with tiktoken when its
+encoding loads, estimated otherwise.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from api.config import MAX_PER_SOURCE, MMR_LAMBDA, RETRIEVAL_K
+from api.diversify import MMR_DUPLICATE, mmr, source_of
+from api.ingest.extract import count_tokens
+from api.localstore import _normalized
+from api.routes.chat import SYSTEM_PROMPT, format_passages
+
+WORDS = (
+    "ọjị kola nut elders break share visitors arrive blessing ancestors "
+    "masquerade mmanwụ festival yam harvest market day eke orie afọ nkwọ title "
+    "ozo feast town umuada daughters lineage chi personal god ala earth shrine "
+    "proverb ilu wisdom speech palm oil with which words are eaten"
+).split()
+
+
+def synthetic(seed: int, dim: int = 256) -> tuple[np.ndarray, list[Document]]:
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    topics = rng.standard_normal((20, dim))
+    vectors, documents = [], []
+    for work in range(150):
+        centre = topics[work % len(topics)] + rng.standard_normal(dim) * 0.6
+        for _ in range(int(rng.integers(2, 13))):
+            vectors.append(centre + rng.standard_normal(dim) * 0.45)
+            text = " ".join(words.choices(WORDS, k=int(rng.integers(50, 160))))
+            metadata = {"work": f"W{work}"}
+            documents.append(Document(page_content=text, metadata=metadata))
+    for i in rng.choice(len(documents), len(documents) // 10, replace=False):
+        other = f"W{int(rng.integers(0, 150))}"
+        vectors.append(vectors[i] + rng.standard_normal(dim) * 0.05)
+        text = documents[i].page_content
+        documents.append(Document(page_content=text, metadata={"work": other}))
+    return _normalized(np.asarray(vectors, dtype=np.float32)), documents
+
+
+def load(path: Path) -> tuple[np.ndarray, list[Document]]:
+    vectors = np.asarray(np.load(path / "vectors.npy", mmap_mode="r"))
+    with open(path / "documents.jsonl", encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle]
+    documents = [
+        Document(page_content=r["page_content"], metadata=r["metadata"])
+        for r in records
+    ]
+    return vectors, documents
+
+
+def measure(picks, vectors, documents, query, question: str) -> dict:
+    chosen = [documents[i] for i in picks]
+    passages = format_passages(chosen)
+    prompt = f"{SYSTEM_PROMPT}\nPASSAGES:\n{passages}\n\nQUESTION: {question}"
+    seen, repeated = set(), 0
+    for document in chosen:
+        source = source_of(document)
+        if source in seen:
+            repeated += count_tokens(document.page_content)
+        seen.add(source)
+    picked = vectors[picks]
+    similarity = picked @ picked.T
+    copies = int((np.triu(similarity, 1) >= MMR_DUPLICATE).sum())
+    return {
+        "prompt": count_tokens(prompt),
+        "repeated": repeated,
+        "works": len(seen),
+        "copies": copies,
+        "relevance": float(np.mean(picked @ query)),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.diversity",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--index", help="a local index directory")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K)
+    parser.add_argument("--fetch-k", type=int, default=4 * RETRIEVAL_K)
+    parser.add_argument(
+        "--lambda", dest="lambda_mult", type=float, default=MMR_LAMBDA
+    )
+    parser.add_argument("--per-source", type=int, default=MAX_PER_SOURCE)
+    parser.add_argument(
+        "--mmr-k",
+        type=int,
+        nargs="+",
+        help="k values to run MMR at (default: k, 3k/4 and 5k/8)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    defaults = {args.k, 3 * args.k // 4, 5 * args.k // 8}
+    mmr_ks = args.mmr_k or sorted(defaults, reverse=True)
+
+    if args.index:
+        vectors, documents = load(Path(args.index))
+    else:
+        vectors, documents = synthetic(args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    # Noise of norm about 0.6, whatever the width.
+    dim = vectors.shape[1]
+    noise = rng.standard_normal((len(rows), dim)) * 0.6 / np.sqrt(dim)
+    queries = _normalized((vectors[rows] + noise).astype(np.float32))
+
+    results = {f"top {args.k}": []}
+    results.update({f"mmr {k}": [] for k in mmr_ks})
+    timings = []
+    for row, query in zip(rows, queries):
+        question = documents[row].page_content[:80]
+        scores = vectors @ query
+        pool = np.argsort(-scores)[: max(args.k, args.fetch_k)]
+        results[f"top {args.k}"].append(
+            measure(pool[: args.k], vectors, documents, query, question)
+        )
+
+        sources = [source_of(documents[i]) for i in pool]
+        for k in mmr_ks:
+            started = time.perf_counter()
+            chosen = mmr(
+                query, vectors[pool], k, args.lambda_mult, sources, args.per_source
+            )
+            timings.append((time.perf_counter() - started) * 1e6)
+            picks = pool[chosen]
+            results[f"mmr {k}"].append(
+                measure(picks, vectors, documents, query, question)
+            )
+
+    print(
+        f"{len(documents)} passages, {len(rows)} queries, "
+        f"pool {args.fetch_k}, λ={args.lambda_mult}, per source {args.per_source}"
+    )
+    print(
+        f"{'selector':<8} {'prompt tok':>10} {'repeat-work tok':>16} "
+        f"{'works':>6} {'copies':>7} {'relevance':>10}"
+    )
+    for name, rows_ in results.items():
+        mean = {key: statistics.mean(r[key] for r in rows_) for key in rows_[0]}
+        print(
+            f"{name:<8} {mean['prompt']:>10.0f} {mean['repeated']:>16.0f} "
+            f"{mean['works']:>6.1f} {mean['copies']:>7.2f} {mean['relevance']:>10.3f}"
+        )
+    print(f"MMR selection: median {statistics.median(timings):.0f} µs per query")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+"""Deterministic local stand-ins for OpenAI and Astra.
+
+`install()` patches the client getters in `api.config` and `api.routes.chat`
+so the serving path runs end to end with no credentials and no network. Each
+fake sleeps for a configurable latency, on the sync and the async paths
+alike, so concurrency behaves as it would against the real APIs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+DIMENSIONS = 64
+
+ANSWER = {
+    "answer": "Ọjị is the kola nut, nwa m, and breaking it opens every gathering.",
+    "detail": "The eldest man present breaks it and prays over it. "
+    "Ọjị na-ebute ndụ — kola brings life.",
+    "terms": [{"term": "Ọjị", "meaning": "kola nut"}],
+    "passage_ids": [1, 2],
+    "followups": ["Who may break kola?", "What is said over it?"],
+}
+
+
+# A fixed question set, so runs are comparable with each other.
+QUESTIONS = [
+    "What is ọjị?",
+    "Tell me about Nri",
+    "Why do we break kola nut?",
+    "What is Chi?",
+    "How are Igbo names chosen?",
+    "What happens at Igba Nkwu?",
+    "Who are the Umuada?",
+    "What is the meaning of Mmanwụ?",
+    "Tell me about the New Yam festival",
+    "What does ofo stand for?",
+    "How is a child named on the market days?",
+    "What is Ala?",
+]
+
+
+def _vector(text: str, dimensions: int = DIMENSIONS) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    return np.random.default_rng(seed).standard_normal(dimensions).tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return _vector(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return _vector(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        return [_vector(text) for text in texts]
+
+
+class FakeVectorStore:
+    def __init__(self, latency: float = 0.0, size: int = 200):
+        self.latency = latency
+        self.documents = [
+            Document(
+                id=f"doc{i}",
+                page_content=f"Passage {i} about Igbo custom, kola and the market day.",
+                metadata={
+                    "work": f"Work {i % 17}",
+                    "source_url": f"https://example.org/{i}",
+                    "summary": f"custom number {i}",
+                },
+            )
+            for i in range(size)
+        ]
+        self.vectors = [_vector(d.page_content) for d in self.documents]
+
+    def _rows(self, vector, k: int) -> list[int]:
+        start = int(abs(vector[0]) * 1000) % len(self.documents)
+        return [(start + i) % len(self.documents) for i in range(k)]
+
+    def _search(self, vector, k: int) -> list:
+        return [self.documents[row] for row in self._rows(vector, k)]
+
+    def _search_with_embedding(self, vector, k: int) -> list:
+        return [(self.documents[r], self.vectors[r]) for r in self._rows(vector, k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> list:
+        return self.similarity_search_by_vector(_vector(query), k)
+
+    def similarity_search_by_vector(self, embedding, k: int = 4) -> list:
+        time.sleep(self.latency)
+        return self._search(embedding, k)
+
+    async def asimilarity_search_by_vector(self, embedding, k: int = 4) -> list:
+        await asyncio.sleep(self.latency)
+        return self._search(embedding, k)
+
+    def similarity_search_with_embedding_by_vector(self, embedding, k: int = 4):
+        time.sleep(self.latency)
+        return self._search_with_embedding(embedding, k)
+
+    async def asimilarity_search_with_embedding_by_vector(self, embedding, k: int = 4):
+        await asyncio.sleep(self.latency)
+        return self._search_with_embedding(embedding, k)
+
+
+class FakeChatModel:
+    """Returns the canned JSON answer; `stream` yields it in small chunks.
+
+    Token usage is reported like the real API's, roughly four characters to
+    a token, so the metrics path sees realistic counts.
+    """
+
+    def __init__(
+        self, latency: float = 0.0, response: dict | None = None, chunk_size: int = 12
+    ):
+        self.latency = latency
+        self.content = json.dumps(response or ANSWER, ensure_ascii=False)
+        self.chunk_size = chunk_size
+
+    def _usage(self, messages) -> dict:
+        prompt = sum(len(str(getattr(m, "content", m))) for m in messages)
+        input_tokens, output_tokens = prompt // 4, len(self.content) // 4
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def invoke(self, messages) -> AIMessage:
+        time.sleep(self.latency)
+        return AIMessage(content=self.content, usage_metadata=self._usage(messages))
+
+    async def ainvoke(self, messages) -> AIMessage:
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=self.content, usage_metadata=self._usage(messages))
+
+    def stream(self, messages):
+        # Half the latency before the first token, the rest spread over the
+        # chunks, as a real streamed completion feels.
+        pieces = range(0, len(self.content), self.chunk_size)
+        time.sleep(self.latency / 2)
+        for start in pieces:
+            time.sleep(self.latency / 2 / len(pieces))
+            yield AIMessageChunk(content=self.content[start : start + self.chunk_size])
+        yield AIMessageChunk(content="", usage_metadata=self._usage(messages))
+
+
+def install(
+    embed_latency: float = 0.0,
+    search_latency: float = 0.0,
+    llm_latency: float = 0.0,
+    response: dict | None = None,
+) -> dict:
+    """Point the serving path at fakes; returns them by name.
+
+    The answer cache and the lexical index are switched off, so every request
+    exercises the full pipeline. `response` replaces the canned answer.
+    """
+    import api.config as config
+    import api.routes.chat as chat
+
+    fakes = {
+        "embeddings": FakeEmbeddings(embed_latency),
+        "vector_store": FakeVectorStore(search_latency),
+        "chat_model": FakeChatModel(llm_latency, response),
+    }
+    getters = {
+        "get_embeddings": lambda: fakes["embeddings"],
+        "get_vector_store": lambda *args, **kwargs: fakes["vector_store"],
+        "get_chat_model": lambda *args, **kwargs: fakes["chat_model"],
+        "get_answer_cache": lambda: None,
+        "get_lexical_index": lambda *args: None,
+    }
+    for module in (config, chat):
+        for name, getter in getters.items():
+            if hasattr(module, name):
+                setattr(module, name, getter)
+    return fakes
@@ -0,0 +1,242 @@
+"""Fetch engines compared against a local HTTP stand-in, no network.
+
+    python3 -m bench.fetch
+    python3 -m bench.fetch --wiki 120 --web 30 --latency 0.2
+
+The stand-in mirrors the registry's shape at a tenth of its timescale: one
+MediaWiki API holding most titles (en.wikipedia.org), a second with a few
+(ig.wikipedia.org), and a handful of slower web hosts. One web host enforces
+its own rate limit, stricter than our interval for it, answering with 429
+and `Retry-After`. Sources are ordered as in the registry — MediaWiki titles
+first — and fetched by the thread pool (`fetch()` under `ThreadPoolExecutor`)
+and by the asyncio engine (`fetch_many`), each from an empty cache.
+
+The busiest host's interval is a floor on any engine's wall time (printed as
+"floor"); the question is how close each engine gets to it, and how many
+429s it provokes on the way. "async, 1/query" sends one title per extract
+query, as before batching. "revalidate" re-runs the async engine over the
+cache the "async" row left behind: the web hosts answer conditional GETs with
+304 and the wikis report unchanged revisions, so it should take a handful of
+requests and no extracts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from api.ingest import cache as cache_module
+from api.ingest import fetch as fetch_module
+from api.ingest.fetch_async import fetch_many
+from api.ingest.sources import Source
+
+PARAGRAPH = (
+    "Ọjị, the kola nut, is broken and shared when visitors arrive. "
+    "The eldest man present blesses it before it is passed around.\n"
+)
+ETAG = '"v1"'
+
+
+def _extracts(query_string: str) -> dict:
+    """An extracts query answered as TextExtracts does: titles normalized,
+    missing ones flagged, and one whole-article extract per response with
+    `continue` for the rest."""
+    query = parse_qs(query_string)
+    info_only = query["prop"] == ["info"]
+    titles = query["titles"][0].split("|")
+    offset = int(query.get("excontinue", ["0"])[0])
+    normalized = [
+        {"from": title, "to": title[0].upper() + title[1:]}
+        for title in titles
+        if title[0].islower()
+    ]
+    pages = []
+    for title in titles:
+        title = title[0].upper() + title[1:]
+        if title.startswith("Missing"):
+            pages.append({"title": title, "missing": True})
+        else:
+            pages.append({"pageid": len(pages), "title": title, "lastrevid": 7})
+    existing = [page for page in pages if not page.get("missing")]
+    if info_only:
+        return {"query": {"normalized": normalized, "pages": pages}}
+    if offset < len(existing):
+        existing[offset]["extract"] = PARAGRAPH * 20
+    body: dict = {"query": {"normalized": normalized, "pages": pages}}
+    if offset + 1 < len(existing):
+        body["continue"] = {"excontinue": offset + 1, "continue": "||"}
+    return body
+
+
+class Host:
+    """Counters shared by one stand-in server's handler threads."""
+
+    def __init__(self, latency: float, min_gap: float = 0.0):
+        self.latency = latency
+        self.min_gap = min_gap
+        self.lock = threading.Lock()
+        self.last = 0.0
+        self.requests = 0
+        self.rejected = 0
+
+
+def _handler(host: Host):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: str, content_type: str, **headers):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name.replace("_", "-"), value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            with host.lock:
+                now = time.monotonic()
+                limited = now - host.last < host.min_gap
+                host.last = now
+                host.requests += 1
+                host.rejected += limited
+            if limited:
+                self._send(429, "slow down", "text/plain", Retry_After="1")
+                return
+
+            time.sleep(host.latency)
+            url = urlparse(self.path)
+            if url.path == "/w/api.php":
+                self._send(200, json.dumps(_extracts(url.query)), "application/json")
+                return
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            paragraphs = "".join(f"<p>{PARAGRAPH}</p>" for _ in range(10))
+            html = (
+                f"<html><head><title>{url.path}</title></head><body>"
+                f"<nav>menu</nav><article>{paragraphs}</article></body></html>"
+            )
+            self._send(200, html, "text/html; charset=utf-8", ETag=ETAG)
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.fetch",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--wiki", type=int, default=60, help="titles, main wiki")
+    parser.add_argument("--wiki-small", type=int, default=10, help="second wiki")
+    parser.add_argument("--web", type=int, default=14, help="web pages")
+    parser.add_argument("--web-hosts", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.08, help="wiki response")
+    parser.add_argument("--web-latency", type=float, default=0.3)
+    parser.add_argument("--interval", type=float, default=0.12, help="wiki hosts")
+    parser.add_argument("--web-interval", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=6, help="thread pool size")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    names = ["wiki", "wiki-small"] + [f"web{i}" for i in range(args.web_hosts)]
+    servers = {
+        name: ThreadingHTTPServer(("127.0.0.1", 0), _handler(Host(0)))
+        for name in names
+    }
+    for server in servers.values():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    hosts = {name: f"127.0.0.1:{s.server_port}" for name, s in servers.items()}
+
+    fetch_module.MEDIAWIKI_API = "http://{host}/w/api.php"
+    for name, host in hosts.items():
+        wiki = name.startswith("wiki")
+        fetch_module.HOST_INTERVAL[host] = args.interval if wiki else args.web_interval
+
+    # Like the registry: a few titles that need normalizing, a few missing.
+    titles = [
+        "Missing title {}" if i % 10 == 9 else "title {}" if i % 7 == 0 else "Title {}"
+        for i in range(args.wiki)
+    ]
+    sources = [
+        Source("mediawiki", title.format(i), "bench", hosts["wiki"])
+        for i, title in enumerate(titles)
+    ]
+    sources += [
+        Source("mediawiki", f"Isiokwu {i}", "bench", hosts["wiki-small"])
+        for i in range(args.wiki_small)
+    ]
+    sources += [
+        Source("web", f"http://{hosts[f'web{i % args.web_hosts}']}/page/{i}", "bench")
+        for i in range(args.web)
+    ]
+
+    def threads(sources: list[Source]) -> list:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            return list(pool.map(lambda s: fetch_module.fetch(s, True), sources))
+
+    # Engine, and the cache it runs over (empty unless named).
+    engines = {
+        f"threads x{args.workers}": (threads, None),
+        "async, 1/query": (
+            lambda sources: fetch_many(sources, refresh=True, titles_per_query=1),
+            None,
+        ),
+        "async": (lambda sources: fetch_many(sources, refresh=True), None),
+        "revalidate": (
+            lambda sources: fetch_many(sources, revalidate=True),
+            "async",
+        ),
+    }
+
+    floor = args.wiki * args.interval
+    print(f"{len(sources)} sources over {len(hosts)} hosts, floor {floor:.1f}s")
+    print(
+        f"{'engine':<15} {'pages':>6} {'seconds':>8} {'pages/s':>8} "
+        f"{'requests':>8} {'429s':>5}"
+    )
+    caches = tempfile.TemporaryDirectory()
+    for name, (engine, cache) in engines.items():
+        # Fresh counters per engine. web0 allows one request per 0.3s, three
+        # times stricter than the interval we have configured for it.
+        state = {
+            host: Host(
+                args.latency if host.startswith("wiki") else args.web_latency,
+                min_gap=0.3 if host == "web0" else 0.0,
+            )
+            for host in servers
+        }
+        for host, server in servers.items():
+            server.RequestHandlerClass = _handler(state[host])
+        cache_module.CACHE_PATH = Path(caches.name) / f"{cache or name}.sqlite3"
+        started = time.perf_counter()
+        pages = [page for page in engine(sources) if page is not None]
+        elapsed = time.perf_counter() - started
+        requests = sum(host.requests for host in state.values())
+        rejected = sum(host.rejected for host in state.values())
+        rate = len(pages) / elapsed
+        print(
+            f"{name:<15} {len(pages):>6} {elapsed:>8.2f} {rate:>8.1f} "
+            f"{requests:>8} {rejected:>5}"
+        )
+
+    caches.cleanup()
+    for server in servers.values():
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
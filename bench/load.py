@@ -0,0 +1,84 @@
+"""Concurrency scaling of the async chat pipeline against fake upstreams.
+
+    python3 -m bench.load
+    python3 -m bench.load --llm-latency 0.5 --concurrency 1 8 32 128
+
+Each level runs `--requests` turns through `answer_question_async` with at
+most `--concurrency` in flight, against fakes that sleep like the real APIs
+would (see `bench.fakes`). The synchronous pipeline is run once, serially, as
+the one-worker baseline. Throughput should scale with concurrency until the
+event loop itself becomes the bottleneck.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from bench import fakes
+from bench.fakes import QUESTIONS
+
+
+async def _run(concurrency: int, requests: int) -> tuple[float, list[float]]:
+    from api.routes.chat import answer_question_async
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        async with gate:
+            started = time.perf_counter()
+            await answer_question_async(QUESTIONS[i % len(QUESTIONS)])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - started, latencies
+
+
+def _report(label: str, elapsed: float, latencies: list[float]) -> None:
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+    else:
+        cuts = latencies * 99
+    print(
+        f"{label:<14} {len(latencies) / elapsed:>9.1f} "
+        f"{cuts[49] * 1000:>9.0f} {cuts[94] * 1000:>9.0f}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="bench.load", description=__doc__)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.08)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fakes.install(args.embed_latency, args.search_latency, args.llm_latency)
+    from api.routes.chat import answer_question
+
+    print(f"{'mode':<14} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+
+    serial = max(4, args.requests // 32)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(serial):
+        t = time.perf_counter()
+        answer_question(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append(time.perf_counter() - t)
+    _report("sync x1", time.perf_counter() - started, latencies)
+
+    for concurrency in args.concurrency:
+        elapsed, latencies = asyncio.run(_run(concurrency, args.requests))
+        _report(f"async x{concurrency}", elapsed, latencies)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+"""Prompt tokens per chat turn, unbudgeted against `api.budget`.
+
+    python3 -m bench.prompt
+    PROMPT_TOKEN_BUDGET=2500 PASSAGE_TOKENS=300 python3 -m bench.prompt
+
+Each scenario is a retrieved set and a history, as `answer_question` would
+see them. Passages are extracted ones (40-120 words), raw `--no-llm` chunks
+(about 3,500 characters) or a mix. Histories are empty, or six turns of
+questions and two-part answers, as the client sends them. "unbudgeted" is
+the prompt as it used to be composed: every passage and turn verbatim.
+"budgeted" is `_compose` now. Both are counted with `api.budget.count_tokens`,
+with tiktoken when its encoding loads and estimated otherwise. Time is
+`_compose` alone, median over `--repeat`, with the token counts cached as
+they are on a warm instance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from api import budget
+from api.routes import chat
+
+SENTENCES = [
+    "The kola nut is broken and shared when visitors arrive.",
+    "The eldest man present blesses it before it is passed around.",
+    "Ọjị bụ ndụ; onye wetara ọjị wetara ndụ.",
+    "Wrestling marked the end of the farming season in many towns.",
+    "Masquerades, mmanwụ, embody the spirits of the ancestors.",
+    "Titles were taken in stages, each marked by a feast for the town.",
+    "Nri's priests travelled to cleanse towns of abominations against Ala.",
+]
+
+
+def passage(rng: random.Random, words: int) -> str:
+    text = ""
+    while len(text.split()) < words:
+        text += rng.choice(SENTENCES) + " "
+    return text.strip()
+
+
+def documents(rng: random.Random, kind: str, k: int = 8) -> list[Document]:
+    docs = []
+    for i in range(k):
+        raw = kind == "raw" or (kind == "mixed" and i % 3 == 0)
+        words = rng.randint(520, 600) if raw else rng.randint(40, 120)
+        metadata = {"work": f"Work {i}", "summary": "a passage"}
+        docs.append(Document(page_content=passage(rng, words), metadata=metadata))
+    return docs
+
+
+def history(rng: random.Random, turns: int) -> list[dict]:
+    items = []
+    for _ in range(turns // 2):
+        items.append({"role": "user", "content": passage(rng, 12)})
+        items.append({"role": "assistant", "content": passage(rng, 90)})
+    return items
+
+
+def unbudgeted(query: str, turns: list[dict], docs: list[Document]) -> int:
+    """Tokens of the prompt as composed before budgeting."""
+    parts = [chat.SYSTEM_PROMPT]
+    parts += [content for _, content in chat._to_messages(turns)]
+    parts.append(f"PASSAGES:\n{chat.format_passages(docs)}\n\nQUESTION: {query}")
+    return sum(budget.count_tokens(part) for part in parts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.prompt",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    tokenizer = budget.encoding(budget.CHAT_MODEL, wait=True)
+    counted = f"tiktoken {tokenizer.name}" if tokenizer else "estimated"
+    print(
+        f"budget {budget.PROMPT_TOKEN_BUDGET}, history {budget.HISTORY_TOKENS}, "
+        f"{budget.PASSAGE_TOKENS} per passage; tokens {counted}"
+    )
+    print(
+        f"{'passages':<10} {'history':>7} {'unbudgeted':>11} {'budgeted':>9} "
+        f"{'saved':>6} {'sent':>5} {'cut':>4} {'compose ms':>11}"
+    )
+    query = "What is ọjị, and who may break it?"
+    for kind in ("extracted", "mixed", "raw"):
+        for turns in (0, 6):
+            rng = random.Random(f"{kind}{turns}")
+            docs, items = documents(rng, kind), history(rng, turns)
+            before = unbudgeted(query, items, docs)
+            messages, sent = chat._compose(query, items, docs)
+            after = sum(budget.count_tokens(content) for _, content in messages)
+            cut = sum(a.page_content != b.page_content for a, b in zip(sent, docs))
+
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                chat._compose(query, items, docs)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(
+                f"{kind:<10} {turns:>7} {before:>11} {after:>9} "
+                f"{1 - after / before:>6.0%} {len(sent):>5} {cut:>4} "
+                f"{statistics.median(timings):>11.2f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+"""Hot-path benchmark of the serving path, offline, for CI.
+
+    python3 -m bench.serving
+    python3 -m bench.serving --requests 500 --json results.json
+    python3 -m bench.serving --baseline bench/baseline.json
+
+Drives the fixed question set (`bench.fakes.QUESTIONS`) through three
+targets, serially, against the fakes from `bench.fakes`:
+
+    answer_question    the pipeline itself
+    flask /api/chat    the same through the Flask app (validation, JSON)
+    flask stream       /api/chat/stream, incremental parsing and SSE framing
+
+Upstream latencies default to zero, so the numbers are this repo's own
+overhead — prompt assembly, JSON handling, source mapping, the Flask layer —
+which is exactly what a change to `api/routes/chat.py` can make worse. Each
+target reports throughput and latency percentiles from a timed pass, then
+memory per request from a second pass under `tracemalloc` (which slows
+everything down, so it never overlaps the timing).
+
+`--baseline` compares against an earlier `--json` and exits 1 when any target
+is more than `--tolerance` worse on throughput or allocations, so CI can
+fail on a regression. Allocation figures are near-deterministic; throughput
+depends on the machine, so keep baselines per runner and tolerances loose.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+
+from bench import fakes
+from bench.fakes import QUESTIONS
+
+
+def _targets() -> dict[str, Callable[[str], object]]:
+    from api.index import app
+    from api.routes.chat import answer_question
+
+    client = app.test_client()
+
+    def flask_chat(question: str) -> object:
+        response = client.post("/api/chat", json={"prompt": question})
+        assert response.status_code == 200, response.status_code
+        return response.get_json()
+
+    def flask_stream(question: str) -> object:
+        response = client.post(
+            "/api/chat/stream", json={"prompt": question}, buffered=True
+        )
+        assert b"event: done" in response.data, response.data[-200:]
+        return response.data
+
+    return {
+        "answer_question": answer_question,
+        "flask /api/chat": flask_chat,
+        "flask stream": flask_stream,
+    }
+
+
+def _time(target: Callable[[str], object], requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t = time.perf_counter()
+        target(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+    else:
+        cuts = latencies * 99
+    return {
+        "requests_per_second": requests / elapsed,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+def _memory(target: Callable[[str], object], requests: int) -> dict:
+    """Mean peak allocation per request, and what stays allocated after."""
+    peaks = []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for i in range(requests):
+            tracemalloc.reset_peak()
+            floor, _ = tracemalloc.get_traced_memory()
+            target(QUESTIONS[i % len(QUESTIONS)])
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - floor)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib_per_request": statistics.fmean(peaks) / 1024,
+        "retained_bytes_per_request": max(0, after - before) / requests,
+    }
+
+
+def _regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    problems = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["requests_per_second"] < old["requests_per_second"] * (
+            1 - tolerance
+        ):
+            problems.append(
+                f"{name}: {result['requests_per_second']:.0f} req/s, "
+                f"baseline {old['requests_per_second']:.0f}"
+            )
+        if result["peak_kib_per_request"] > old["peak_kib_per_request"] * (
+            1 + tolerance
+        ):
+            problems.append(
+                f"{name}: {result['peak_kib_per_request']:.1f} KiB/request, "
+                f"baseline {old['peak_kib_per_request']:.1f}"
+            )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.serving",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--json", metavar="PATH", help="write results here")
+    parser.add_argument("--baseline", metavar="PATH", help="fail on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    # Before api.index configures INFO logging: a line per request would
+    # dominate the numbers.
+    logging.basicConfig(level=logging.WARNING)
+
+    fakes.install(args.embed_latency, args.search_latency, args.llm_latency)
+
+    print(
+        f"{'target':<17} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'KiB/req':>8} {'kept B':>7}"
+    )
+    results = {}
+    for name, target in _targets().items():
+        for i in range(args.warmup):
+            target(QUESTIONS[i % len(QUESTIONS)])
+        result = _time(target, args.requests)
+        result.update(_memory(target, max(1, args.requests // 4)))
+        results[name] = result
+        print(
+            f"{name:<17} {result['requests_per_second']:>9.0f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['peak_kib_per_request']:>8.1f} "
+            f"{result['retained_bytes_per_request']:>7.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            problems = _regressions(results, json.load(handle), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,245 @@
+"""Cold-start benchmark: import time and first-request time, per release.
+
+    python3 -m bench.startup
+    python3 -m bench.startup --runs 5 --json startup.json
+    python3 -m bench.startup --baseline startup.json
+
+Every measurement is a fresh interpreter, so every run is a real cold start.
+Unlike `bench.serving` nothing is patched: the real LangChain and OpenAI
+clients are imported and built, and talk to a stand-in OpenAI API on
+localhost; retrieval uses a local index built for the run. What is left out
+is only the network itself — DNS, TLS and the upstreams' own latency.
+
+Reports, as medians over `--runs`, with PREWARM off and on:
+
+    import        importing api.index (what the platform does before routing)
+    first chat    the first POST /api/chat on that instance
+    warm chat     the second, for comparison
+    first health  GET /api/health on a fresh instance
+
+then the modules that dominate a cold chat, from `python -X importtime`.
+`--baseline` fails (exit 1) when any figure is more than `--tolerance` worse.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from bench import fakes
+
+CHILD = """
+import json, sys, time
+
+started = time.perf_counter()
+import api.index
+timings = {"import": time.perf_counter() - started}
+client = api.index.app.test_client()
+
+def timed(name, method, path, **kwargs):
+    started = time.perf_counter()
+    response = client.open(path, method=method, **kwargs)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    timings[name] = time.perf_counter() - started
+
+if sys.argv[1] == "chat":
+    timed("first chat", "POST", "/api/chat", json={"prompt": "What is ọjị?"})
+    timed("warm chat", "POST", "/api/chat", json={"prompt": "What is Chi?"})
+else:
+    timed("first health", "GET", "/api/health")
+print(json.dumps(timings))
+"""
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    """Just enough of the OpenAI API for embeddings, chat and model lookup."""
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        model = self.path.rsplit("/", 1)[-1]
+        self._reply({"id": model, "object": "model", "created": 0, "owned_by": "x"})
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        usage = {"prompt_tokens": 8, "completion_tokens": 64, "total_tokens": 72}
+        if self.path.endswith("/embeddings"):
+            texts = request["input"]
+            texts = [texts] if isinstance(texts, str) else texts
+            data = []
+            for i, text in enumerate(texts):
+                vector = fakes._vector(str(text))
+                if request.get("encoding_format") == "base64":
+                    raw = np.asarray(vector, dtype=np.float32).tobytes()
+                    vector = base64.b64encode(raw).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            self._reply(
+                {
+                    "object": "list",
+                    "data": data,
+                    "model": request["model"],
+                    "usage": usage,
+                }
+            )
+            return
+        self._reply(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": json.dumps(fakes.ANSWER, ensure_ascii=False),
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+
+def _build_index(directory: Path) -> None:
+    from api.config import COLLECTION_NAME, EMBEDDING_MODEL
+    from api.localstore import LocalVectorStore
+
+    documents = fakes.FakeVectorStore().documents
+    store = LocalVectorStore(
+        directory / COLLECTION_NAME, None, EMBEDDING_MODEL, fakes.DIMENSIONS
+    )
+    store.add_vectors(
+        documents,
+        [document.id for document in documents],
+        [fakes._vector(document.page_content) for document in documents],
+    )
+    store.save()
+
+
+def _child(env: dict, kind: str, importtime: bool = False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    return subprocess.run(
+        command + ["-c", CHILD, kind],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _import_profile(stderr: str, top: int) -> list[tuple[str, float]]:
+    """Top-level imports by cumulative time, from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="bench.startup",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="modules to list")
+    parser.add_argument("--json", metavar="PATH", help="write results here")
+    parser.add_argument("--baseline", metavar="PATH", help="fail on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _build_index(Path(tmp))
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+            "OPENAI_EMBEDDING_DIMENSIONS": str(fakes.DIMENSIONS),
+            "VECTOR_BACKEND": "local",
+            "LOCAL_INDEX_DIR": tmp,
+            "ANSWER_CACHE": "off",
+            "EMBEDDING_CACHE_PATH": "",
+            "PYTHONPATH": os.getcwd(),
+        }
+
+        results = {}
+        for prewarm in ("off", "on"):
+            samples: dict[str, list[float]] = {}
+            for _ in range(args.runs):
+                for kind in ("chat", "health"):
+                    child = _child({**env, "PREWARM": prewarm}, kind)
+                    # api.index logs to stdout; the timings are the last line.
+                    last = child.stdout.strip().splitlines()[-1]
+                    for name, seconds in json.loads(last).items():
+                        samples.setdefault(name, []).append(seconds)
+            results[f"prewarm {prewarm}"] = {
+                name: statistics.median(values) * 1000
+                for name, values in samples.items()
+            }
+        profile = _import_profile(
+            _child({**env, "PREWARM": "off"}, "chat", importtime=True).stderr,
+            args.top,
+        )
+    server.shutdown()
+
+    names = ["import", "first chat", "warm chat", "first health"]
+    print(f"{'ms':<14}" + "".join(f"{name:>14}" for name in names))
+    for mode, timings in results.items():
+        print(f"{mode:<14}" + "".join(f"{timings[name]:>14.0f}" for name in names))
+    print("\nslowest imports on a cold chat (cumulative ms):")
+    for module, seconds in profile:
+        print(f"  {seconds * 1000:>8.0f}  {module}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        problems = [
+            f"{mode} {name}: {value:.0f}ms, baseline {baseline[mode][name]:.0f}ms"
+            for mode, timings in results.items()
+            for name, value in timings.items()
+            if name in baseline.get(mode, {})
+            and value > baseline[mode][name] * (1 + args.tolerance)
+        ]
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())